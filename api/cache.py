@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Dict, Hashable, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from api.executor import QueryExecutor
+from api.serialization import dumps
+
+
+class ResponseCache:
+    """
+    Response cache for read endpoints, keyed by request parameters and
+    invalidated by the data source's write generation.
+    
+    Entries carry an ETag (hash of the body) and Last-Modified (time of the
+    source's last write), so unchanged data is answered with 304. Misses
+    are computed and encoded on the query executor (Starlette's thread
+    pool without one), and concurrent misses for the same key share one
+    computation, which runs to completion even if its requesters go away.
+    """
+    
+    def __init__(self, max_entries: int = 256, executor: QueryExecutor = None):
+        self.max_entries = max_entries
+        self.executor = executor
+        self._entries: "OrderedDict[Hashable, Tuple[int, bytes, str]]" = OrderedDict()
+        self._inflight: Dict[Tuple[Hashable, int], asyncio.Task] = {}  # By key and generation
+    
+    async def _run(self, kind: str, fn: Callable):
+        if self.executor is None:
+            return await run_in_threadpool(fn)
+        return await self.executor.run(kind, fn)
+    
+    async def _lookup(
+        self, key: Hashable, generation: int, compute: Callable, kind: str
+    ) -> Tuple[bytes, str]:
+        entry = self._entries.get(key)
+        if entry and entry[0] == generation:
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+        
+        # The computation is a task of the cache's own, shared by every
+        # requester of the key; a requester that goes away only stops waiting
+        inflight = (key, generation)
+        task = self._inflight.get(inflight)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key, generation, compute, kind))
+            self._inflight[inflight] = task
+            task.add_done_callback(lambda done: self._finished(inflight, done))
+        return await asyncio.shield(task)
+    
+    async def _compute(
+        self, key: Hashable, generation: int, compute: Callable, kind: str
+    ) -> Tuple[bytes, str]:
+        def encode() -> bytes:
+            # Encoding a large result is as heavy as reading it; keep both off the loop
+            result = compute()
+            return result if isinstance(result, bytes) else dumps(result)
+        
+        body = await self._run(kind, encode)
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+        
+        current = self._entries.get(key)
+        if current is None or current[0] <= generation:
+            self._entries[key] = (generation, body, etag)  # Never replace a newer result
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return body, etag
+    
+    def _finished(self, inflight: Tuple[Hashable, int], task: asyncio.Task):
+        del self._inflight[inflight]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved when every requester has gone
+    
+    async def respond(
+        self,
+        request: Request,
+        key: Hashable,
+        source,
+        compute: Callable,
+        media_type: str = "application/json",
+        kind: str = "default"
+    ) -> Response:
+        """
+        Serve `compute()` from the cache, or 304 if the client's copy is current
+        
+        Args:
+            request: Incoming request, for If-None-Match / If-Modified-Since
+            key: Cache key covering every parameter the result depends on
+            source: Object with `generation` and `modified_at` (e.g. DataLogger)
+            compute: Blocking function returning encoded bytes or a JSON-serializable result
+            media_type: Content type of the body
+            kind: Query kind, selecting the executor's concurrency limit
+        
+        Raises:
+            QueryBusy, QueryTimeout: From the query executor
+        """
+        generation = source.generation
+        modified_at = int(source.modified_at)
+        body, etag = await self._lookup(key, generation, compute, kind)
+        
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(modified_at, usegmt=True),
+            "Cache-Control": "no-cache"  # Always revalidate; 304s are cheap
+        }
+        
+        if _not_modified(request, etag, modified_at):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type=media_type, headers=headers)
+
+
+def _not_modified(request: Request, etag: str, modified_at: int) -> bool:
+    """Conditional GET check; If-None-Match takes precedence over If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in tags or "*" in tags
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return modified_at <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
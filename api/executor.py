@@ -0,0 +1,141 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Set
+
+from services import metrics
+from services.cancellation import CancelToken, QueryCancelled, run_with_token
+
+QUERY_SECONDS = metrics.histogram(
+    "agri_query_seconds", "Worker time per offloaded read, by endpoint kind", ["kind"]
+)
+QUERY_WAIT_SECONDS = metrics.histogram(
+    "agri_query_wait_seconds", "Time a read waited for a free slot of its kind", ["kind"]
+)
+QUERIES_ACTIVE = metrics.gauge(
+    "agri_queries_active", "Reads holding a slot, by endpoint kind", ["kind"]
+)
+QUERIES_REJECTED = metrics.counter(
+    "agri_queries_rejected_total", "Reads refused (busy) or cancelled (timeout)", ["kind", "reason"]
+)
+
+
+class QueryBusy(Exception):
+    """No slot for this kind of read freed up in time"""
+
+
+class QueryTimeout(Exception):
+    """The read ran past its deadline and was cancelled"""
+
+
+class QueryExecutor:
+    """
+    Bounded thread pool for the API's blocking reads, kept apart from the
+    event loop and from Starlette's shared pool, so a burst of heavy
+    queries cannot hold up pump control or live data.
+    
+    Each kind of read (history, analytics, ...) has its own concurrency
+    limit. A read waits up to `queue_timeout` for a slot (else QueryBusy)
+    and runs for up to `timeout` (else QueryTimeout). On timeout or task
+    cancellation its CancelToken is set, and the data layer stops at its
+    next cancellation.check(). The slot is only freed once the worker
+    thread has actually finished.
+    
+    Reads share in-process state (buffers, locks, column caches) with the
+    logging threads, so they run on threads rather than processes; the
+    NumPy and storage code they spend most time in releases the GIL.
+    """
+    
+    def __init__(
+        self,
+        workers: int = 4,
+        limits: Dict[str, int] = None,
+        timeout: float = 30.0,
+        queue_timeout: float = 5.0
+    ):
+        self.workers = workers
+        self.limits = dict(limits or {})
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query")
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._tokens: Set[CancelToken] = set()
+    
+    def _slot(self, kind: str) -> asyncio.Semaphore:
+        slot = self._slots.get(kind)
+        if slot is None:
+            slot = self._slots[kind] = asyncio.Semaphore(self.limits.get(kind, self.workers))
+        return slot
+    
+    async def run(self, kind: str, fn: Callable, timeout: float = None):
+        """
+        Run blocking `fn()` on the pool
+        
+        Args:
+            kind: Endpoint kind, selecting the concurrency limit
+            fn: Function to call on a worker thread
+            timeout: Seconds before the read is cancelled (default: self.timeout)
+        
+        Raises:
+            QueryBusy: No slot freed up within queue_timeout
+            QueryTimeout: The read did not finish within the timeout
+        """
+        slot = self._slot(kind)
+        waited = time.perf_counter()
+        try:
+            await asyncio.wait_for(slot.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            QUERIES_REJECTED.labels(kind, "busy").inc()
+            raise QueryBusy(f"Too many concurrent {kind} queries")
+        QUERY_WAIT_SECONDS.labels(kind).observe(time.perf_counter() - waited)
+        
+        loop = asyncio.get_running_loop()
+        token = CancelToken()
+        active = QUERIES_ACTIVE.labels(kind)
+        active.inc()
+        self._tokens.add(token)
+        
+        def call():
+            started = time.perf_counter()
+            try:
+                return run_with_token(token, fn)
+            finally:
+                QUERY_SECONDS.labels(kind).observe(time.perf_counter() - started)
+        
+        def release(_):
+            # Runs on the worker thread; hand the slot back on the loop
+            try:
+                loop.call_soon_threadsafe(self._release, slot, token, active)
+            except RuntimeError:
+                pass  # Loop already closed at shutdown
+        
+        future = self._pool.submit(call)
+        future.add_done_callback(release)
+        result = asyncio.wrap_future(future)
+        try:
+            return await asyncio.wait_for(asyncio.shield(result), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self._abandon(token, result)
+            QUERIES_REJECTED.labels(kind, "timeout").inc()
+            raise QueryTimeout(f"{kind} query timed out")
+        except asyncio.CancelledError:
+            self._abandon(token, result)
+            raise
+        except QueryCancelled:
+            raise QueryTimeout(f"{kind} query was cancelled")
+    
+    def _abandon(self, token: CancelToken, result: asyncio.Future):
+        """Cancel a read nobody is waiting for, discarding its eventual outcome"""
+        token.cancel()
+        result.add_done_callback(lambda f: f.cancelled() or f.exception())
+    
+    def _release(self, slot: asyncio.Semaphore, token: CancelToken, active):
+        self._tokens.discard(token)
+        active.dec()
+        slot.release()
+    
+    def shutdown(self):
+        """Cancel running reads and stop the workers without waiting"""
+        for token in list(self._tokens):
+            token.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
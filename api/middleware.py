@@ -0,0 +1,46 @@
+import time
+
+from services import metrics
+
+HTTP_REQUESTS = metrics.counter(
+    "agri_http_requests_total", "HTTP requests by route template and status", ["method", "route", "status"]
+)
+HTTP_SECONDS = metrics.histogram(
+    "agri_http_request_seconds", "HTTP request duration until the response body is sent", ["method", "route"]
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request. Requests are labelled with
+    the matched route's path template (e.g. /api/history), so label
+    cardinality stays fixed however many distinct URLs are requested.
+    Streaming responses are timed until their last chunk.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        started = time.perf_counter()
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the shared scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_SECONDS.labels(method, path).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, path, status).inc()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class SensorData(BaseModel):
@@ -8,12 +8,14 @@ class SensorData(BaseModel):
     hum: Optional[float] = Field(None, description="Humidity percentage")
     soil: Optional[int] = Field(None, description="Soil moisture level (0-1023)")
     light: Optional[int] = Field(None, description="Light level (0-1023)")
+    quality: int = Field(0, description="Failed sensor checks as a bit mask (0 = clean)")
     timestamp: Optional[str] = Field(None, description="Reading timestamp")
 
 class PumpStatus(BaseModel):
     """Pump status response"""
     is_on: bool
     pin: int
+    auto_off_in: Optional[float] = None  # seconds until a timed run ends
 
 class PumpControl(BaseModel):
     """Pump control request"""
@@ -21,9 +23,13 @@ class PumpControl(BaseModel):
 
 class SystemStatus(BaseModel):
     """Complete system status"""
+    zone: Optional[str] = None
     sensors: SensorData
-    pump: PumpStatus
+    pump: Optional[PumpStatus] = None
     auto_water_enabled: bool
+    watering: Optional[dict] = None
+    logging: Optional[dict] = None
+    readiness: Optional[dict] = None  # startup progress of devices, storage and pumps
     settings: dict
 
 class HistoricalRecord(BaseModel):
@@ -34,6 +40,84 @@ class HistoricalRecord(BaseModel):
     soil_moisture: str
     light_level: str
     pump_status: str
+    quality: str = "0"
+
+class HistoryPoint(BaseModel):
+    """Aggregated history bucket (or a single raw record with count 1)"""
+    timestamp: str
+    count: int
+    pump_duty: Optional[float] = None
+    temp_min: Optional[float] = None
+    temp_max: Optional[float] = None
+    temp_mean: Optional[float] = None
+    humidity_min: Optional[float] = None
+    humidity_max: Optional[float] = None
+    humidity_mean: Optional[float] = None
+    soil_moisture_min: Optional[float] = None
+    soil_moisture_max: Optional[float] = None
+    soil_moisture_mean: Optional[float] = None
+    light_level_min: Optional[float] = None
+    light_level_max: Optional[float] = None
+    light_level_mean: Optional[float] = None
+
+class HistoryRange(BaseModel):
+    """Time-range history at a chosen resolution"""
+    resolution: str
+    start: str
+    end: str
+    points: List[HistoryPoint]
+
+class LiveSample(BaseModel):
+    """Raw sample captured at the full sensor rate"""
+    seq: int
+    timestamp: float = Field(..., description="Unix time in seconds")
+    temp: Optional[float] = None
+    hum: Optional[float] = None
+    soil: Optional[float] = None
+    light: Optional[float] = None
+    quality: int = 0  # Failed sensor checks as a bit mask
+
+class LiveSamples(BaseModel):
+    """Raw samples after a sequence number"""
+    next_seq: int = Field(..., description="Pass as `since` on the next poll")
+    samples: List[LiveSample]
+
+class ZoneInfo(BaseModel):
+    """Zone wiring and latest readings"""
+    id: str
+    device: str
+    serial_port: str
+    protocol: Optional[str] = None  # Wire format last received: json or binary
+    pump_pin: Optional[int] = None
+    pump_on: bool
+    sensors: SensorData
+
+class ZoneList(BaseModel):
+    """All configured zones"""
+    zones: List[ZoneInfo]
+
+class ActiveAlert(BaseModel):
+    """Sensor check currently failing on a zone's device"""
+    metric: str = Field(..., description="Reading: temp, hum, soil or light")
+    check: str = Field(..., description="range, stuck, rate or outlier")
+    since: str
+    last_seen: str
+    samples: int = Field(..., description="Samples flagged since the alert was raised")
+    value: float = Field(..., description="Latest flagged value")
+
+class AlertEpisode(BaseModel):
+    """Run of consecutive logged rows flagged by the same check"""
+    metric: str
+    check: str
+    start: str
+    end: str
+    rows: int
+
+class AlertList(BaseModel):
+    """Current and logged sensor alerts of a zone"""
+    zone: str
+    active: List[ActiveAlert]
+    episodes: List[AlertEpisode]
 
 class Response(BaseModel):
     """Generic API response"""
@@ -1,97 +1,482 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import List, Optional, Union
 from api.models import (
     SensorData, PumpStatus, PumpControl, 
-    SystemStatus, HistoricalRecord, Response
+    SystemStatus, HistoricalRecord, HistoryRange, LiveSamples, ZoneList, AlertList, Response
 )
+from api.cache import ResponseCache
+from api.executor import QueryBusy, QueryExecutor, QueryTimeout
+from api.serialization import (
+    PACKED_MEDIA_TYPE, dumps, encode_csv, encode_ndjson, gzip_chunks, pack_columns, to_columns
+)
+from config.settings import settings
+from services import metrics, quality
+from services.events import format_sse
+from services.rollups import normalize_timestamp
+from services.storage import FIELDNAMES, encode_row
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 # This will be injected by main.py
 sensor_service = None
 
+# Heavy reads run here, off the event loop, with per-kind limits and timeouts
+query_executor = QueryExecutor(
+    settings.QUERY_WORKERS,
+    settings.QUERY_LIMITS,
+    settings.QUERY_TIMEOUT,
+    settings.QUERY_QUEUE_TIMEOUT
+)
+
+# History and stats responses, valid until the zone's logger next writes
+response_cache = ResponseCache(settings.API_CACHE_SIZE, query_executor)
+
+# /api/history layouts and their content types
+HISTORY_FORMATS = {
+    "json": "application/json",
+    "columnar": "application/json",
+    "packed": PACKED_MEDIA_TYPE
+}
+
+# /api/export formats and their content types
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+
 def init_routes(service):
     """Initialize routes with sensor service dependency"""
     global sensor_service
     sensor_service = service
 
+def _zone(zone_id: Optional[str]):
+    """Resolve the `zone` query parameter (None selects the default zone)"""
+    try:
+        return sensor_service.zone(zone_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+def _logger(zone):
+    """The zone's DataLogger; 503 while its storage is still loading at startup"""
+    if zone.logger is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Storage of zone {zone.id} is {zone.storage_state}",
+            headers={"Retry-After": "1"}
+        )
+    return zone.logger
+
+def _query_failed(e: Exception) -> HTTPException:
+    """503 when reads of this kind are saturated, 504 when one timed out, else 500"""
+    if isinstance(e, QueryBusy):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    if isinstance(e, QueryTimeout):
+        return HTTPException(status_code=504, detail=str(e))
+    return HTTPException(status_code=500, detail=str(e))
+
+def _pump(zone_id: Optional[str]):
+    zone = _zone(zone_id)
+    if zone.pump is None:
+        raise HTTPException(status_code=404, detail=f"Zone {zone.id} has no pump")
+    return zone.pump
+
+@router.get("/api/zones", response_model=ZoneList)
+async def get_zones():
+    """List zones with their device, pump and latest readings"""
+    try:
+        return sensor_service.get_zones()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/api/data", response_model=SensorData)
-async def get_current_data():
+async def get_current_data(zone: Optional[str] = None):
     """Get current sensor readings"""
+    zone = _zone(zone)
     try:
-        data = sensor_service.get_current_data()
+        data = zone.get_current_data()
         return SensorData(**data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/api/live", response_model=LiveSamples)
+async def get_live_samples(
+    since: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    zone: Optional[str] = None
+):
+    """Raw samples captured since sequence number `since`"""
+    zone = _zone(zone)
+    try:
+        return zone.get_live_samples(since, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/api/stream")
+async def stream_events(request: Request, zone: Optional[str] = None):
+    """
+    Server-Sent Events for one zone: "sample" readings, "pump" state
+    changes, and a "record" plus updated "stats" for each logged row.
+    Starts with a snapshot of the current state.
+    """
+    zone = _zone(zone)
+    queue = sensor_service.events.subscribe(zone.id)
+    
+    async def events():
+        try:
+            yield format_sse("sample", zone.get_current_data())
+            yield format_sse("pump", {"is_on": zone.pump_on})
+            if zone.logger:
+                yield format_sse("stats", zone.logger.get_summary_stats())
+            
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), settings.STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                
+                if message is None:
+                    break  # Dropped as too slow, or shutting down
+                yield message
+        finally:
+            sensor_service.events.unsubscribe(zone.id, queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/api/status", response_model=SystemStatus)
-async def get_system_status():
+async def get_system_status(zone: Optional[str] = None):
     """Get complete system status"""
+    _zone(zone)
     try:
-        status = sensor_service.get_system_status()
+        status = sensor_service.get_system_status(zone)
         return SystemStatus(**status)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/api/alerts", response_model=AlertList)
+async def get_alerts(
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    limit: int = Query(100, ge=1, le=10000),
+    zone: Optional[str] = None
+):
+    """
+    Sensor faults and anomalies: checks failing now on the zone's device,
+    and the latest `limit` episodes of flagged rows logged in [from, to]
+    (the last 24 hours by default). A date-only `to` includes that day.
+    """
+    zone = _zone(zone)
+    data_logger = _logger(zone)
+    
+    try:
+        if end and len(end.strip()) == 10:
+            end = end.strip() + " 23:59:59"
+        now = datetime.now()
+        if not start:
+            start = (now - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+        start = normalize_timestamp(start)
+        end = normalize_timestamp(end) if end else now.strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        episodes = await query_executor.run(
+            "history", lambda: quality.episodes(data_logger.get_range(start, end), limit)
+        )
+    except Exception as e:
+        raise _query_failed(e)
+    
+    return {"zone": zone.id, "active": zone.arduino.quality.get_active(), "episodes": episodes}
+
 @router.post("/api/pump/on", response_model=Response)
-async def turn_pump_on(control: PumpControl = PumpControl()):
+async def turn_pump_on(control: PumpControl = PumpControl(), zone: Optional[str] = None):
     """Turn pump ON, optionally with auto-off duration"""
+    pump = _pump(zone)
     try:
         if control.duration:
-            sensor_service.pump.turn_on_for_duration(control.duration)
+            pump.turn_on_for_duration(control.duration)
             message = f"Pump turned ON for {control.duration} seconds"
         else:
-            sensor_service.pump.turn_on()
+            pump.turn_on()
             message = "Pump turned ON"
         
         return Response(
             success=True,
             message=message,
-            data={"is_on": sensor_service.pump.is_on}
+            data={"is_on": pump.is_on}
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/api/pump/off", response_model=Response)
-async def turn_pump_off():
+async def turn_pump_off(zone: Optional[str] = None):
     """Turn pump OFF"""
+    pump = _pump(zone)
     try:
-        sensor_service.pump.turn_off()
+        pump.turn_off()
         return Response(
             success=True,
             message="Pump turned OFF",
-            data={"is_on": sensor_service.pump.is_on}
+            data={"is_on": pump.is_on}
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/api/pump/status", response_model=PumpStatus)
-async def get_pump_status():
+async def get_pump_status(zone: Optional[str] = None):
     """Get current pump status"""
+    pump = _pump(zone)
     try:
-        status = sensor_service.pump.get_status()
+        status = pump.get_status()
         return PumpStatus(**status)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/api/history", response_model=List[HistoricalRecord])
-async def get_history(limit: int = 300):
-    """Get historical sensor data"""
+@router.get("/api/history", response_model=Union[List[HistoricalRecord], HistoryRange])
+async def get_history(
+    request: Request,
+    limit: int = 300,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    resolution: str = "auto",
+    points: int = Query(500, ge=3, le=10000),
+    format: str = "json",
+    zone: Optional[str] = None
+):
+    """
+    Get historical sensor data. With `from`/`to`, returns rollup buckets
+    at `resolution` (auto, raw, 1m, 15m, 1h, 1d) downsampled to `points`.
+    
+    `format` selects the layout: json (records; values as strings without
+    `from`/`to`), columnar (one typed array per field) or packed (binary
+    columns, see api.serialization).
+    """
+    if format not in HISTORY_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}")
+    
+    zone = _zone(zone)
+    data_logger = _logger(zone)
+    
+    if start or end:
+        if not (start and end):
+            raise HTTPException(status_code=400, detail="Both 'from' and 'to' are required")
+        
+        key = ("history", zone.id, format, start, end, resolution, points)
+        
+        def compute():
+            result = data_logger.query_history(start, end, resolution, points)
+            if format == "columnar":
+                result["points"] = to_columns(result["points"])
+            elif format == "packed":
+                meta = {k: result[k] for k in ("resolution", "start", "end")}
+                return pack_columns(result["points"], meta)
+            return result
+    else:
+        key = ("history", zone.id, format, limit)
+        
+        def compute():
+            history = data_logger.get_history(limit=limit)
+            if format == "columnar":
+                return to_columns(history)
+            if format == "packed":
+                return pack_columns(history)
+            
+            # Same shape as HistoricalRecord, without building a model per row
+            return [dict(zip(FIELDNAMES, encode_row(record))) for record in history]
+    
     try:
-        history = sensor_service.logger.get_history(limit=limit)
-        return [HistoricalRecord(**record) for record in history]
+        return await response_cache.respond(
+            request, key, data_logger, compute, HISTORY_FORMATS[format], kind="history"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _query_failed(e)
 
 @router.get("/api/stats")
-async def get_statistics():
+async def get_statistics(request: Request, zone: Optional[str] = None):
     """Get summary statistics"""
-    try:
-        stats = sensor_service.logger.get_summary_stats()
+    zone = _zone(zone)
+    data_logger = _logger(zone)
+    
+    def compute():
         return Response(
             success=True,
             message="Statistics retrieved",
-            data=stats
+            data=data_logger.get_summary_stats()
+        )
+    
+    try:
+        return await response_cache.respond(
+            request, ("stats", zone.id), data_logger, compute, kind="stats"
+        )
+    except Exception as e:
+        raise _query_failed(e)
+
+@router.get("/api/export")
+async def export_data(
+    request: Request,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    format: str = "csv",
+    zone: Optional[str] = None
+):
+    """
+    Download raw records in [from, to] (the whole log by default) as CSV
+    or NDJSON. A date-only `to` includes that day. The body is streamed
+    batch by batch, so memory use does not grow with the range, and it is
+    gzip-encoded when the client accepts it. A read failure partway
+    aborts the response (after an error line in NDJSON), so a cut-off
+    export never ends like a complete one.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}")
+    
+    zone = _zone(zone)
+    data_logger = _logger(zone)
+    
+    try:
+        if end and len(end.strip()) == 10:
+            end = end.strip() + " 23:59:59"
+        start = normalize_timestamp(start) if start else None
+        end = normalize_timestamp(end) if end else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    def body():
+        # Sync generator: Starlette drives it from the thread pool
+        if format == "csv":
+            yield encode_csv([], header=True)
+        try:
+            for batch in data_logger.iter_range(start, end):
+                yield encode_csv(batch) if format == "csv" else encode_ndjson(batch)
+        except Exception as e:
+            logger.error(f"Export of zone {zone.id} failed: {e}")
+            if format == "ndjson":
+                yield dumps({"error": f"Export failed: {e}"}) + b"\n"
+            raise
+    
+    filename = f"sensor_log_{zone.id}.{format}"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Vary": "Accept-Encoding"
+    }
+    content = body()
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        content = gzip_chunks(content, settings.EXPORT_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    
+    return StreamingResponse(content, media_type=EXPORT_FORMATS[format], headers=headers)
+
+async def _analytics(request: Request, zone_id: Optional[str], key: tuple, query):
+    """Serve an analytics query through the response cache (400 on bad parameters)"""
+    zone = _zone(zone_id)
+    data_logger = _logger(zone)
+    analytics = data_logger.analytics
+    try:
+        return await response_cache.respond(
+            request, ("analytics", zone.id) + key, data_logger, lambda: query(analytics),
+            kind="analytics"
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise _query_failed(e)
+
+@router.get("/api/analytics/summary")
+async def analytics_summary(
+    request: Request,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    percentiles: str = "5,25,50,75,95",
+    zone: Optional[str] = None
+):
+    """Per-metric count, mean, stddev, min/max and percentiles over [from, to]"""
+    try:
+        ranks = tuple(float(q) for q in percentiles.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Bad percentiles: {percentiles}")
+    if not all(0 <= q <= 100 for q in ranks):
+        raise HTTPException(status_code=400, detail="Percentiles must be within 0-100")
+    
+    return await _analytics(
+        request, zone, ("summary", start, end, ranks),
+        lambda analytics: analytics.summary(start, end, ranks)
+    )
+
+@router.get("/api/analytics/rolling")
+async def analytics_rolling(
+    request: Request,
+    metric: str = "temp",
+    window: int = Query(3600, gt=0),
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    points: int = Query(500, ge=2, le=10000),
+    zone: Optional[str] = None
+):
+    """Rolling mean of `metric` over the preceding `window` seconds"""
+    return await _analytics(
+        request, zone, ("rolling", metric, window, start, end, points),
+        lambda analytics: analytics.rolling_mean(metric, window, start, end, points)
+    )
+
+@router.get("/api/analytics/daily")
+async def analytics_daily(
+    request: Request,
+    metric: str = "temp",
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    zone: Optional[str] = None
+):
+    """Daily min/max/mean of `metric`"""
+    return await _analytics(
+        request, zone, ("daily", metric, start, end),
+        lambda analytics: analytics.daily(metric, start, end)
+    )
+
+@router.get("/api/analytics/drying-rate")
+async def analytics_drying_rate(
+    request: Request,
+    bucket: int = Query(3600, gt=0),
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    points: int = Query(500, ge=2, le=10000),
+    zone: Optional[str] = None
+):
+    """Soil moisture change per hour while the pump is off"""
+    return await _analytics(
+        request, zone, ("drying-rate", bucket, start, end, points),
+        lambda analytics: analytics.drying_rate(start, end, bucket, points)
+    )
+
+@router.get("/api/analytics/correlation")
+async def analytics_correlation(
+    request: Request,
+    x: str = "temp",
+    y: str = "humidity",
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    zone: Optional[str] = None
+):
+    """Pearson correlation between two metrics"""
+    return await _analytics(
+        request, zone, ("correlation", x, y, start, end),
+        lambda analytics: analytics.correlation(x, y, start, end)
+    )
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Counters, gauges and latency histograms in the Prometheus text format"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,153 @@
+"""
+Bulk encoders for history responses: plain JSON without per-row
+pydantic models, a columnar JSON layout and a packed binary layout;
+plus the CSV/NDJSON chunk encoders behind /api/export.
+
+Packed layout (little-endian), readable with JS typed arrays:
+    
+    uint32  header length H
+    H bytes JSON header {"rows": n, "columns": [[name, type], ...], ...meta},
+            padded with spaces to a multiple of 4
+    one block per column, in header order, each padded to 4 bytes:
+        "u4" uint32  timestamp, seconds (log wall-clock time read as UTC)
+        "f4" float32 numeric value, NaN when missing
+        "u1" uint8   pump_status, 1 = ON
+        "u2" uint16  quality, flags of failed sensor checks (services.quality)
+"""
+import csv
+import io
+import json
+import sys
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List
+
+from services.rollups import to_epoch
+from services.storage import FIELDNAMES, encode_row
+
+try:
+    import orjson
+except ImportError:  # Optional speedup
+    orjson = None
+
+PACKED_MEDIA_TYPE = "application/vnd.sensor-columns"
+
+_TYPECODES = {"u4": "I", "f4": "f", "u1": "B", "u2": "H"}
+
+# Items per encoder call for long lists (see dumps)
+DUMPS_CHUNK = 5000
+
+
+def _default(value):
+    # pydantic models (e.g. from query helpers) serialize as their fields
+    if hasattr(value, "dict"):
+        return value.dict()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, separators=(',', ':'), default=_default).encode()
+
+
+def _is_long_list(value) -> bool:
+    return isinstance(value, list) and len(value) > DUMPS_CHUNK
+
+
+def dumps(value) -> bytes:
+    """
+    Encode to compact JSON bytes, with orjson when it is installed.
+    
+    The C encoders hold the GIL for a whole call, so long lists (at the
+    top level or as values of a top-level dict) are encoded DUMPS_CHUNK
+    items at a time, letting other threads and the event loop run between.
+    """
+    if _is_long_list(value):
+        parts = [
+            _dumps(value[i:i + DUMPS_CHUNK])[1:-1]
+            for i in range(0, len(value), DUMPS_CHUNK)
+        ]
+        return b"[" + b",".join(parts) + b"]"
+    if isinstance(value, dict) and any(_is_long_list(item) for item in value.values()):
+        items = [_dumps(str(key)) + b":" + dumps(item) for key, item in value.items()]
+        return b"{" + b",".join(items) + b"}"
+    return _dumps(value)
+
+
+def to_columns(rows: List[Dict]) -> Dict[str, list]:
+    """Columnar layout: {"timestamp": [...], "temp": [...], ...} with typed values"""
+    if not rows:
+        return {}
+    return {name: [row.get(name) for row in rows] for name in rows[0]}
+
+
+def pack_columns(rows: List[Dict], meta: Dict = None) -> bytes:
+    """
+    Encode records or history points in the packed layout (see module docstring)
+    
+    Args:
+        rows: Dicts sharing the same keys
+        meta: Extra fields for the header (e.g. the history resolution)
+    """
+    names = list(rows[0]) if rows else []
+    columns = []
+    blocks = []
+    
+    for name in names:
+        if name == "timestamp":
+            kind = "u4"
+            values = [to_epoch(row[name]) for row in rows]
+        elif name == "pump_status":
+            kind = "u1"
+            values = [1 if row[name] == "ON" else 0 for row in rows]
+        elif name == "quality":
+            kind = "u2"
+            values = [row[name] or 0 for row in rows]
+        else:
+            kind = "f4"
+            values = [float("nan") if row[name] is None else row[name] for row in rows]
+        
+        data = array(_TYPECODES[kind], values)
+        if sys.byteorder != "little":
+            data.byteswap()
+        block = data.tobytes()
+        blocks.append(block + b"\0" * (-len(block) % 4))
+        columns.append([name, kind])
+    
+    header = json.dumps({**(meta or {}), "rows": len(rows), "columns": columns}).encode()
+    header += b" " * (-len(header) % 4)
+    return len(header).to_bytes(4, "little") + header + b"".join(blocks)
+
+
+def encode_csv(records: List[Dict], header: bool = False) -> bytes:
+    """CSV text for a batch of records, in the log file's column layout"""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if header:
+        writer.writerow(FIELDNAMES)
+    writer.writerows(encode_row(record) for record in records)
+    return out.getvalue().encode()
+
+
+def encode_ndjson(records: List[Dict]) -> bytes:
+    """One typed JSON object per line"""
+    return b"".join(dumps(record) + b"\n" for record in records)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Gzip a byte stream incrementally, yielding compressed data as it
+    fills. If the source fails, what it produced is flushed out but the
+    gzip trailer is not, so the client sees a truncated stream.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+    except Exception:
+        yield compressor.flush(zlib.Z_SYNC_FLUSH)
+        raise
+    yield compressor.flush()
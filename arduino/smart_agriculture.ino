@@ -1,7 +1,8 @@
 /*
  * Smart Agriculture System - Arduino Uno
  * 
- * Reads sensors and sends JSON data via Serial to Raspberry Pi
+ * Reads sensors and sends JSON data (or, with BINARY_PROTOCOL, compact
+ * binary frames) via Serial to Raspberry Pi
  * 
  * Sensors:
  * - DHT22: Temperature & Humidity (Pin D2)
@@ -21,12 +22,15 @@
 #define BAUD_RATE 9600     // Serial communication speed
 #define READ_INTERVAL 1000// Reading interval in milliseconds
 #define NUM_SAMPLES 5      // Number of samples for averaging
+#define BINARY_PROTOCOL 0  // 1 = send 15-byte binary frames instead of JSON lines
+                           // (layout in hardware/serial_protocol.py)
 
 // ===== SENSOR OBJECTS =====
 DHT dht(DHTPIN, DHTTYPE);
 
 // ===== GLOBAL VARIABLES =====
 unsigned long lastReadTime = 0;
+uint16_t frameSeq = 0;     // Binary frame sequence number, lets the Pi count lost samples
 
 // ===== SETUP =====
 void setup() {
@@ -62,8 +66,12 @@ void loop() {
     int soilMoisture = readSoilMoisture();
     int lightLevel = readLightLevel();
     
-    // Send JSON data
+    // Send data in the configured format
+#if BINARY_PROTOCOL
+    sendSensorFrame(temperature, humidity, soilMoisture, lightLevel);
+#else
     sendSensorData(temperature, humidity, soilMoisture, lightLevel);
+#endif
   }
 }
 
@@ -155,6 +163,58 @@ void sendSensorData(float temp, float hum, int soil, int light) {
   Serial.flush();
 }
 
+/**
+ * CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF)
+ */
+uint16_t crc16(const uint8_t *data, size_t len) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+/**
+ * Store a 16-bit value little-endian
+ */
+void putU16(uint8_t *buf, uint16_t value) {
+  buf[0] = value & 0xFF;
+  buf[1] = value >> 8;
+}
+
+/**
+ * Scale a reading to hundredths; error readings become -32768
+ */
+int16_t centi(float value) {
+  if (value <= -999.0) {
+    return -32768;
+  }
+  return (int16_t)round(value * 100);
+}
+
+/**
+ * Send sensor data as one binary frame:
+ * sync AA 55, version, seq, temp, hum, soil, light, CRC
+ */
+void sendSensorFrame(float temp, float hum, int soil, int light) {
+  uint8_t frame[15];
+  frame[0] = 0xAA;
+  frame[1] = 0x55;
+  frame[2] = 1;  // Protocol version
+  putU16(frame + 3, frameSeq++);
+  putU16(frame + 5, (uint16_t)centi(temp));
+  putU16(frame + 7, (uint16_t)centi(hum));
+  putU16(frame + 9, soil);
+  putU16(frame + 11, light);
+  putU16(frame + 13, crc16(frame + 2, 11));
+  
+  Serial.write(frame, sizeof(frame));
+  Serial.flush();
+}
+
 // ===== UTILITY FUNCTIONS =====
 
 /**
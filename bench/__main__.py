@@ -0,0 +1,50 @@
+"""
+Run the whole benchmark suite and write one JSON report.
+
+    python -m bench --output bench_results.json            # 10k and 100k row logs
+    python -m bench --rows 10000 1000000 10000000 --output full.json
+    python -m bench.compare old.json new.json
+"""
+import argparse
+
+from bench import bench_http, bench_log_writes, bench_parse, bench_queries
+from bench.common import write_results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="Log sizes for read benchmarks")
+    parser.add_argument("--backend", nargs="+", default=["csv", "sqlite", "segments"],
+                        choices=["csv", "sqlite", "segments"])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--skip", nargs="+", default=[], choices=["writes", "queries", "parse", "http"])
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args(argv)
+    
+    suites = {}
+    if "writes" not in args.skip:
+        print("== log_data throughput")
+        suites["writes"] = [
+            {"case": f"{backend}/{flush_rows}", **bench_log_writes.run_case(backend, 20000, flush_rows, False)}
+            for backend in args.backend
+            for flush_rows in (1, 100)
+        ]
+        for result in suites["writes"]:
+            print(f"{result['case']:>20}  {result['rows_per_sec']:>10.0f} rows/s")
+    if "queries" not in args.skip:
+        print("== read paths")
+        suites["queries"] = bench_queries.run(args.rows, args.backend, repeat=20)
+    if "parse" not in args.skip:
+        print("== serial ingest")
+        suites["parse"] = bench_parse.run(100000)
+    if "http" not in args.skip:
+        print("== HTTP")
+        suites["http"] = bench_http.run(max(args.rows), "csv", args.clients, 200, 256)
+    
+    results = [{"suite": suite, **result} for suite, items in suites.items() for result in items]
+    write_results(args.output, "suite", results)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+HTTP latency under concurrent clients for /api/data, /api/history and
+/api/stats, against a uvicorn server on simulated hardware and a
+synthetic log.
+    
+    python -m bench.bench_http --rows 100000 --clients 1 8 32 --output bench_http.json
+
+--cache-size 0 disables the response cache, so every request computes.
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Barrier, Thread
+from typing import Dict, List
+
+from bench.bench_log_writes import make_backend
+from bench.common import build_log, latency_stats, write_results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = ["/api/data", "/api/history?limit=300", "/api/stats"]
+
+# Env vars pointing each backend's file at the benchmark log
+BACKEND_PATHS = {
+    "csv": ("LOG_FILE", "sensor_log.csv"),
+    "sqlite": ("SQLITE_FILE", "sensor_log.db"),
+    "segments": ("SEGMENT_DIR", "segments")
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, backend_name: str, port: int, cache_size: int) -> subprocess.Popen:
+    """uvicorn on simulated hardware, logging into `workdir`"""
+    variable, name = BACKEND_PATHS[backend_name]
+    env = dict(
+        os.environ,
+        DEBUG="false",
+        HARDWARE_BACKEND="simulated",
+        STORAGE_BACKEND=backend_name,
+        API_CACHE_SIZE=str(cache_size),
+        **{variable: os.path.join(workdir, name)}
+    )
+    log_path = os.path.join(workdir, "server.log")
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app",
+             "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    
+    deadline = time.monotonic() + 120  # Storage replays stats over the whole log on first start
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            with open(log_path) as log:
+                output = log.read()[-2000:]
+            raise RuntimeError(f"Server exited with code {server.returncode}:\n{output}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/api/status")
+            response = connection.getresponse()
+            if response.status == 200:
+                zones = json.loads(response.read())["readiness"]["zones"]
+                if all(zone["storage"]["ready"] for zone in zones.values()):
+                    return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Server did not become ready")
+
+
+def load(port: int, path: str, clients: int, requests: int) -> Dict:
+    """`clients` keep-alive connections issuing `requests` GETs each"""
+    barrier = Barrier(clients + 1)
+    latencies: List[List[float]] = [[] for _ in range(clients)]
+    errors = [0] * clients
+    
+    def client(i: int):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        barrier.wait()
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors[i] += 1
+            except OSError:
+                errors[i] += 1
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                continue
+            latencies[i].append(time.perf_counter() - started)
+        connection.close()
+    
+    threads = [Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    samples = [latency for per_client in latencies for latency in per_client]
+    return {
+        **latency_stats(samples),
+        "errors": sum(errors),
+        "requests_per_sec": len(samples) / elapsed
+    }
+
+
+def run(rows: int, backend_name: str, client_counts: List[int], requests: int, cache_size: int) -> List[Dict]:
+    workdir = tempfile.mkdtemp(prefix="bench_http_")
+    server = None
+    try:
+        backend = make_backend(backend_name, workdir)
+        build_log(backend, rows)
+        backend.close()
+        
+        port = free_port()
+        server = start_server(workdir, backend_name, port, cache_size)
+        
+        results = []
+        for clients in client_counts:
+            for path in ENDPOINTS:
+                load(port, path, clients, min(requests, 20))  # Warm up
+                result = {
+                    "case": f"{backend_name}/{rows}/{path}/c{clients}",
+                    "backend": backend_name,
+                    "rows": rows,
+                    "endpoint": path,
+                    "clients": clients,
+                    "cache_size": cache_size,
+                    **load(port, path, clients, requests)
+                }
+                results.append(result)
+                print(
+                    f"{path:>24} c={clients:<3} p50 {result['p50_ms']:7.2f}ms  "
+                    f"p99 {result['p99_ms']:7.2f}ms  {result['requests_per_sec']:8.0f} req/s"
+                )
+        return results
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--backend", default="csv", choices=list(BACKEND_PATHS))
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per client")
+    parser.add_argument("--cache-size", type=int, default=256, help="API_CACHE_SIZE for the server")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+    
+    results = run(args.rows, args.backend, args.clients, args.requests, args.cache_size)
+    if args.output:
+        write_results(args.output, "http", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Compare sustained DataLogger.log_data throughput and write amplification
+for per-row writes versus the write-behind buffer.
+
+    python -m bench.bench_log_writes --rows 20000 --output bench_writes.json
+
+Write amplification is bytes the kernel charged for writeback
+(/proc/self/io write_bytes) divided by bytes the data directory
+(log, WAL and sidecar files) actually grew by.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from typing import Dict, Optional
+
+from config.settings import settings
+from services.data_logger import DataLogger
+from services.storage import CsvBackend, SegmentBackend, SqliteBackend
+
+SAMPLE = {"temp": 25.3, "hum": 54.0, "soil": 512, "light": 613}
+
+
+def read_proc_io() -> Optional[Dict[str, int]]:
+    """Per-process I/O counters, or None where /proc/self/io is unavailable"""
+    try:
+        with open("/proc/self/io") as f:
+            return {key: int(value) for key, value in (line.split(": ") for line in f)}
+    except OSError:
+        return None
+
+
+def disk_usage(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def make_backend(name: str, workdir: str):
+    if name == "csv":
+        return CsvBackend(os.path.join(workdir, "sensor_log.csv"), settings.LOG_INDEX_STRIDE)
+    if name == "sqlite":
+        return SqliteBackend(os.path.join(workdir, "sensor_log.db"))
+    if name == "segments":
+        return SegmentBackend(os.path.join(workdir, "segments"))
+    raise ValueError(f"Unknown backend: {name}")
+
+
+def run_case(backend_name: str, rows: int, flush_rows: int, fsync: bool) -> Dict:
+    """Log `rows` samples with the given buffering and report throughput"""
+    workdir = tempfile.mkdtemp(prefix="bench_writes_")
+    settings.LOG_FLUSH_ROWS = flush_rows
+    settings.LOG_FLUSH_INTERVAL = 3600.0  # Only row count triggers flushes
+    settings.LOG_FSYNC = fsync
+    
+    try:
+        data_logger = DataLogger(make_backend(backend_name, workdir))
+        size_before = disk_usage(workdir)
+        io_before = read_proc_io()
+        
+        start = time.perf_counter()
+        for i in range(rows):
+            data_logger.log_data(SAMPLE, pump_status=i % 10 == 0)
+        data_logger.flush()
+        elapsed = time.perf_counter() - start
+        
+        io_after = read_proc_io()
+        logical = disk_usage(workdir) - size_before
+        data_logger.close()
+        
+        result = {
+            "backend": backend_name,
+            "mode": "per-row" if flush_rows == 1 else f"buffered({flush_rows})",
+            "fsync": fsync,
+            "rows": rows,
+            "seconds": elapsed,
+            "rows_per_sec": rows / elapsed,
+            "logical_bytes": logical
+        }
+        
+        if io_before and io_after:
+            written = io_after["write_bytes"] - io_before["write_bytes"]
+            result["write_syscalls_per_row"] = (io_after["syscw"] - io_before["syscw"]) / rows
+            result["device_bytes"] = written
+            result["write_amplification"] = written / logical if logical else None
+        
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--backend", default="csv", choices=["csv", "sqlite", "segments"])
+    parser.add_argument("--batch", type=int, default=100, help="Buffered flush size")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+    
+    results = []
+    for flush_rows in (1, args.batch):
+        for fsync in (False, True):
+            result = run_case(args.backend, args.rows, flush_rows, fsync)
+            results.append(result)
+            print(
+                f"{result['mode']:>14} fsync={str(fsync):5} "
+                f"{result['rows_per_sec']:>10.0f} rows/s  "
+                f"amplification={result.get('write_amplification') or 0:.1f}x"
+            )
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "log_writes",
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+ArduinoReader ingest rate for the sketch's JSON lines and binary frames:
+parsing alone, and end to end from a pty through pyserial into the
+sample ring.
+    
+    python -m bench.bench_parse --lines 200000 --output bench_parse.json
+"""
+import argparse
+import os
+import select
+import time
+from threading import Event, Thread
+from typing import Dict, List
+
+from bench.common import write_results
+from hardware.arduino_reader import ArduinoReader
+from hardware.serial_protocol import FrameParser
+from hardware.simulated import VirtualBoard
+
+
+# Bytes per read() from the in-memory feed, about what a busy port returns
+CHUNK_BYTES = 4096
+
+
+class _ChunkFeed:
+    """Serial stand-in whose read() returns a prepared byte stream in chunks"""
+    
+    is_open = True
+    
+    def __init__(self, payload: bytes):
+        self._view = memoryview(payload)
+    
+    @property
+    def in_waiting(self) -> int:
+        return min(len(self._view), CHUNK_BYTES)
+    
+    def read(self, size: int = 1) -> bytes:
+        chunk = bytes(self._view[:size])
+        self._view = self._view[size:]
+        return chunk
+    
+    def close(self):
+        self.is_open = False
+
+
+def sample_lines(count: int, protocol: str = "json") -> List[bytes]:
+    """`count` readings in the sketch's wire format, one bytes object each"""
+    board = VirtualBoard("bench", seed=1, protocol=protocol)
+    try:
+        return [board.encode(board.reading()) for _ in range(count)]
+    finally:
+        board.close()
+
+
+def parse_rate(lines: List[bytes], protocol: str = "json") -> Dict:
+    """ArduinoReader._read_chunk over an in-memory stream (no serial I/O)"""
+    reader = ArduinoReader.__new__(ArduinoReader)  # No port, no reader thread
+    reader.port = "bench"
+    reader.parser = FrameParser()
+    reader._init_metrics()
+    reader._stopping = Event()
+    reader.ser = _ChunkFeed(b"".join(lines))
+    reader._reader_thread = Thread()  # Never started, so close() has nothing to join
+    
+    parsed = 0
+    started = time.perf_counter()
+    while reader.ser.in_waiting:
+        parsed += len(reader._read_chunk())
+    elapsed = time.perf_counter() - started
+    
+    return {
+        "case": f"parse/{protocol}",
+        "lines": len(lines),
+        "parsed": parsed,
+        "lines_per_sec": len(lines) / elapsed,
+        "us_per_line": elapsed / len(lines) * 1e6
+    }
+
+
+def pty_rate(lines: List[bytes], protocol: str = "json", timeout: float = 60.0) -> Dict:
+    """Readings written to a pty as fast as the reader drains them, until all are in the ring"""
+    board = VirtualBoard("bench", seed=1, protocol=protocol)
+    reader = ArduinoReader(board.port)
+    payload = b"".join(lines)
+    
+    def write_all():
+        view = memoryview(payload)
+        while view:
+            select.select([], [board.master], [], 1.0)
+            try:
+                view = view[os.write(board.master, view[:4096]):]
+            except BlockingIOError:
+                pass
+    
+    try:
+        # Wait for the reader thread to open the port
+        deadline = time.monotonic() + 10
+        while not (reader.ser and reader.ser.is_open) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        
+        started = time.perf_counter()
+        writer = Thread(target=write_all, daemon=True)
+        writer.start()
+        
+        deadline = time.monotonic() + timeout
+        while reader.buffer.seq < len(lines) and time.monotonic() < deadline:
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - started
+        
+        return {
+            "case": f"pty/{protocol}",
+            "lines": len(lines),
+            "received": reader.buffer.seq,
+            "lines_per_sec": reader.buffer.seq / elapsed,
+            "seconds": elapsed
+        }
+    finally:
+        reader.close()
+        board.close()
+
+
+def run(count: int) -> List[Dict]:
+    results = []
+    for protocol in ("json", "binary"):
+        lines = sample_lines(count, protocol)
+        results += [parse_rate(lines, protocol), pty_rate(lines, protocol)]
+    for result in results:
+        print(f"{result['case']:>12}  {result['lines_per_sec']:>10.0f} lines/s")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+    
+    results = run(args.lines)
+    if args.output:
+        write_results(args.output, "parse", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Read-path latency against log size: DataLogger startup, get_history,
+get_summary_stats, rollup range queries, NumPy analytics and export scans.
+
+    python -m bench.bench_queries --rows 10000 100000 1000000 --output bench_queries.json
+
+Each log is synthetic (see bench.common) and rebuilt per backend.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+from bench.bench_log_writes import disk_usage, make_backend
+from bench.common import LOG_START, LOG_STEP, build_log, time_calls, write_results
+from services.data_logger import DataLogger
+from services.rollups import from_epoch, to_epoch
+
+
+def run_case(backend_name: str, rows: int, repeat: int) -> Dict:
+    """Build a `rows` log on one backend and time each read path"""
+    workdir = tempfile.mkdtemp(prefix="bench_queries_")
+    try:
+        backend = make_backend(backend_name, workdir)
+        build_seconds = build_log(backend, rows)
+        
+        started = time.perf_counter()
+        data_logger = DataLogger(backend)
+        startup = time.perf_counter() - started
+        
+        end = from_epoch(to_epoch(LOG_START) + (rows - 1) * LOG_STEP)
+        week_ago = from_epoch(to_epoch(end) - 7 * 86400)
+        
+        timings = {
+            "history_300": time_calls(lambda: data_logger.get_history(limit=300), repeat),
+            "history_10000": time_calls(lambda: data_logger.get_history(limit=10000), repeat),
+            "summary_stats": time_calls(data_logger.get_summary_stats, repeat),
+            "range_week": time_calls(lambda: data_logger.query_history(week_ago, end), repeat),
+            "range_all": time_calls(lambda: data_logger.query_history(LOG_START, end), repeat)
+        }
+        
+        started = time.perf_counter()
+        data_logger.analytics.summary()
+        analytics_load = time.perf_counter() - started
+        timings["analytics_summary"] = time_calls(data_logger.analytics.summary, repeat)
+        
+        started = time.perf_counter()
+        exported = sum(len(batch) for batch in data_logger.iter_range())
+        scan = time.perf_counter() - started
+        
+        result = {
+            "case": f"{backend_name}/{rows}",
+            "backend": backend_name,
+            "rows": rows,
+            "disk_bytes": disk_usage(workdir),
+            "build_seconds": build_seconds,
+            "startup_seconds": startup,
+            "analytics_load_seconds": analytics_load,
+            "scan_rows_per_sec": exported / scan if scan else None,
+            "latency": timings
+        }
+        data_logger.close()
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(sizes: List[int], backends: List[str], repeat: int) -> List[Dict]:
+    results = []
+    for rows in sizes:
+        for backend_name in backends:
+            result = run_case(backend_name, rows, repeat)
+            results.append(result)
+            latency = result["latency"]
+            print(
+                f"{result['case']:>20}  startup {result['startup_seconds']:7.2f}s  "
+                f"history(300) p50 {latency['history_300']['p50_ms']:7.2f}ms  "
+                f"stats p50 {latency['summary_stats']['p50_ms']:6.3f}ms  "
+                f"range(week) p50 {latency['range_week']['p50_ms']:7.2f}ms"
+            )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--backend", nargs="+", default=["csv", "sqlite", "segments"],
+                        choices=["csv", "sqlite", "segments"])
+    parser.add_argument("--repeat", type=int, default=20, help="Calls timed per path")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+    
+    results = run(args.rows, args.backend, args.repeat)
+    if args.output:
+        write_results(args.output, "queries", results)
+
+
+if __name__ == "__main__":
+    main()
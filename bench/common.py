@@ -0,0 +1,105 @@
+"""Shared helpers for the benchmark suite: synthetic logs, timing and JSON output."""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Callable, Dict, Iterator, List
+
+from services.rollups import from_epoch, to_epoch
+
+# Synthetic logs start here and advance LOG_STEP seconds per row
+LOG_START = "2024-01-01 00:00:00"
+LOG_STEP = 5
+APPEND_CHUNK = 100000
+
+
+def synthetic_records(rows: int, start: str = LOG_START, step: int = LOG_STEP) -> Iterator[Dict]:
+    """Deterministic typed records with daily cycles and a drying soil sawtooth"""
+    t0 = to_epoch(start)
+    for i in range(rows):
+        day = (i * step) % 86400
+        yield {
+            "timestamp": from_epoch(t0 + i * step),
+            "temp": round(20 + 8 * abs(day - 43200) / 43200, 1),
+            "humidity": round(50 + (i % 37) / 2, 1),
+            "soil_moisture": 800 - (i % 5000) // 10,
+            "light_level": 900 - abs(day - 43200) * 900 // 43200,
+            "pump_status": "ON" if i % 5000 < 6 else "OFF"
+        }
+
+
+def build_log(backend, rows: int) -> float:
+    """
+    Fill a backend with `rows` synthetic records in large batches
+    
+    Returns:
+        Seconds taken
+    """
+    started = time.perf_counter()
+    chunk = []
+    for record in synthetic_records(rows):
+        chunk.append(record)
+        if len(chunk) >= APPEND_CHUNK:
+            backend.append(chunk)
+            chunk = []
+    if chunk:
+        backend.append(chunk)
+    return time.perf_counter() - started
+
+
+def latency_stats(samples: List[float]) -> Dict:
+    """p50/p90/p99/max/mean of latencies given in seconds, reported in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    
+    return {
+        "count": len(ordered),
+        "p50_ms": rank(0.50),
+        "p90_ms": rank(0.90),
+        "p99_ms": rank(0.99),
+        "max_ms": ordered[-1] * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000
+    }
+
+
+def time_calls(fn: Callable, repeat: int) -> Dict:
+    """Call `fn` `repeat` times and summarize the latencies"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return latency_stats(samples)
+
+
+def git_revision() -> str:
+    """Commit the benchmarked tree is at, so runs can be compared across versions"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment() -> Dict:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def write_results(path: str, benchmark: str, results: List[Dict], **extra):
+    """Write results in the suite's JSON layout"""
+    with open(path, "w") as f:
+        json.dump({"benchmark": benchmark, **environment(), **extra, "results": results}, f, indent=2)
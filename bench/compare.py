@@ -0,0 +1,85 @@
+"""
+Compare two benchmark JSON files and flag regressions.
+
+    python -m bench.compare baseline.json candidate.json --threshold 0.10
+
+Metrics ending in _per_sec count as higher-is-better; _ms and _seconds
+as lower-is-better. Exits with status 1 if any metric regressed by more
+than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Tuple
+
+
+def flatten(result: Dict, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of a result as dotted keys"""
+    values = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def index(report: Dict) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """Results keyed by (suite, case)"""
+    suite = report.get("benchmark", "")
+    return {
+        (result.get("suite", suite), result.get("case", "")): flatten(result)
+        for result in report["results"]
+    }
+
+
+def change(metric: str, old: float, new: float):
+    """Relative change where positive means worse, or None for non-score metrics"""
+    if not old:
+        return None
+    if metric.endswith("_per_sec"):
+        return (old - new) / old
+    if metric.endswith("_ms") or metric.endswith("_seconds"):
+        return (new - old) / old
+    return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args(argv)
+    
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    
+    print(f"baseline {baseline.get('revision')}  candidate {candidate.get('revision')}")
+    old_results = index(baseline)
+    new_results = index(candidate)
+    
+    regressions = 0
+    for key in sorted(old_results.keys() & new_results.keys()):
+        old = old_results[key]
+        new = new_results[key]
+        for metric in sorted(old.keys() & new.keys()):
+            delta = change(metric, old[metric], new[metric])
+            if delta is None or abs(delta) < args.threshold:
+                continue
+            regressed = delta > 0
+            regressions += regressed
+            label = "REGRESSION" if regressed else "improved"
+            print(
+                f"{label:>10}  {'/'.join(key)}  {metric}: "
+                f"{old[metric]:.4g} -> {new[metric]:.4g} ({abs(delta):.0%} {'worse' if regressed else 'better'})"
+            )
+    
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
+import re
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # Server Configuration
@@ -7,19 +8,78 @@ class Settings(BaseSettings):
     PORT: int = 8000
     DEBUG: bool = True
     
+    # Hardware backend: "real" (serial ports and RPi.GPIO), "simulated"
+    # (virtual boards on ptys emitting random readings) or "replay"
+    # (virtual boards replaying REPLAY_FILE); the last two use in-memory GPIO
+    HARDWARE_BACKEND: str = "real"
+    SIM_RATE: float = 1.0  # lines per second per virtual board
+    SIM_PROTOCOL: str = "json"  # wire format of virtual boards: json or binary
+    REPLAY_FILE: str = "data/sensor_log.csv"  # CSV log replayed by the "replay" backend
+    
     # Arduino Configuration
     SERIAL_PORT: str = "/dev/ttyACM0"
     BAUD_RATE: int = 9600
     SERIAL_TIMEOUT: int = 1
+    SERIAL_RECONNECT_INTERVAL: float = 5.0  # seconds before the first reconnect attempt
+    SERIAL_RECONNECT_MAX: float = 60.0  # ceiling for the doubling delay between reconnect attempts
+    SENSOR_STALE_AFTER: float = 15.0  # seconds without a new reading before a device is reported not ready
+    SAMPLE_BUFFER_SIZE: int = 4096  # raw samples kept in memory at full sensor rate
+    STREAM_INTERVAL: float = 1.0  # seconds between /api/stream pushes
+    STREAM_QUEUE_SIZE: int = 100  # messages a slow stream viewer may lag before being dropped
+    STREAM_KEEPALIVE: float = 15.0  # seconds between SSE keep-alive comments
+    API_CACHE_SIZE: int = 256  # cached /api/history and /api/stats responses
+    EXPORT_BATCH_ROWS: int = 5000  # records read per lock hold during /api/export
+    EXPORT_GZIP_LEVEL: int = 6  # zlib level for gzip-encoded exports
+    QUERY_WORKERS: int = 4  # threads running heavy API reads (history, stats, analytics)
+    QUERY_LIMITS: Dict[str, int] = {"history": 2, "analytics": 2}  # concurrent reads per kind (others: QUERY_WORKERS)
+    QUERY_TIMEOUT: float = 30.0  # seconds before a read is cancelled (504)
+    QUERY_QUEUE_TIMEOUT: float = 5.0  # seconds a read waits for a free slot (else 503)
+    METRICS_ENABLED: bool = True  # serve /metrics and time every HTTP request
+    
+    # Sensor quality checks on every raw sample (see services.quality)
+    QUALITY_ENABLED: bool = True
+    QUALITY_RANGES: Dict[str, List[float]] = {  # valid [min, max] per reading
+        "temp": [-40.0, 80.0],
+        "hum": [0.0, 100.0],
+        "soil": [0.0, 1015.0],  # a disconnected probe floats to ~1023
+        "light": [0.0, 1023.0]
+    }
+    QUALITY_STUCK_SECONDS: Dict[str, float] = {"temp": 3600, "hum": 3600}  # unchanged this long = frozen sensor
+    QUALITY_MAX_RATE: Dict[str, float] = {"temp": 2.0, "hum": 5.0, "soil": 100.0}  # max change per second
+    QUALITY_MIN_SCALE: Dict[str, float] = {"temp": 0.5, "hum": 1.0, "soil": 5.0}  # outlier noise floor (readings not listed are not checked)
+    QUALITY_Z_LIMIT: float = 6.0  # robust z-score above which a sample is an outlier
+    QUALITY_WINDOW: int = 120  # samples in the outlier check's moving mean and deviation
     
     # GPIO Configuration
     PUMP_PIN: int = 17
     GPIO_MODE: str = "BCM"  # BCM or BOARD
     
+    # Multi-zone setup (JSON in .env). Empty means one "default" zone
+    # reading SERIAL_PORT and driving PUMP_PIN.
+    DEVICES: Dict[str, str] = {}  # device id -> serial port
+    ZONES: Dict[str, Dict] = {}  # zone id -> {"device": id, "pump_pin": pin or null}
+    
     # Data Logging
+    STORAGE_BACKEND: str = "csv"  # csv, sqlite or segments
     LOG_INTERVAL: int = 5  # seconds (10 minutes)
     LOG_FILE: str = "data/sensor_log.csv"
+    SQLITE_FILE: str = "data/sensor_log.db"
+    SEGMENT_DIR: str = "data/segments"
     MAX_HISTORY_RECORDS: int = 1000
+    LOG_INDEX_STRIDE: int = 1000  # rows between byte-offset index entries
+    STATS_CHECKPOINT_INTERVAL: int = 100  # rows between stats checkpoints
+    LOG_FLUSH_ROWS: int = 12  # buffered rows that trigger a write
+    LOG_FLUSH_INTERVAL: float = 60.0  # max seconds a row stays buffered
+    LOG_FSYNC: bool = False  # fsync once per flushed batch (group commit)
+    LOG_ROTATION: str = "daily"  # CSV segment rotation: none, daily or size
+    LOG_ROTATION_SIZE_MB: int = 16  # segment size when LOG_ROTATION is "size"
+    LOG_COMPRESS_SEGMENTS: bool = True  # gzip rotated CSV segments
+    LOG_RETENTION_DAYS: int = 0  # delete data older than this (0 keeps everything)
+    JOURNAL_ENABLED: bool = True  # write-ahead journal of buffered rows and pump commands
+    JOURNAL_SYNC_INTERVAL: float = 30.0  # max seconds a journaled row waits for a group fsync (0: left to the OS)
+    JOURNAL_FSYNC: bool = False  # fsync every journal record instead (more SD-card writes)
+    JOURNAL_MAX_BYTES: int = 1024 * 1024  # compact the journal past this size, bounding recovery time
+    PUMP_RESUME_ON_RESTART: bool = True  # resume timed runs a crash interrupted (False cancels them)
     
     # Sensor Thresholds (for automation)
     SOIL_DRY_THRESHOLD: int = 300  # Below this = dry soil
@@ -29,7 +89,40 @@ class Settings(BaseSettings):
     
     # Auto-watering settings
     AUTO_WATER_ENABLED: bool = False
-    AUTO_WATER_DURATION: int = 30  # seconds
+    AUTO_WATER_MODE: str = "predictive"  # predictive or threshold (fixed pulse below the dry threshold)
+    AUTO_WATER_DURATION: int = 30  # seconds per threshold pulse
+    WATER_MIN_DURATION: int = 5  # shortest run the predictive scheduler starts
+    WATER_MAX_DURATION: int = 300  # longest run the predictive scheduler starts
+    WATER_MIN_GAP: int = 1800  # seconds between runs, for water to soak in
+    WATER_LEAD_TIME: int = 3600  # start a cycle this long before soil is predicted to be dry
+    WATER_RATE_WINDOW: int = 10800  # seconds of readings per drying-rate fit
+    WATER_RATE_HISTORY_DAYS: int = 3  # history used to seed the drying rate at startup
+    SOIL_FILTER_WINDOW: int = 5  # readings in the soil median filter
+    SOIL_FILTER_ALPHA: float = 0.3  # EMA weight of each new filtered reading
+    
+    def device_ports(self) -> Dict[str, str]:
+        """Serial port per device id"""
+        return self.DEVICES or {"default": self.SERIAL_PORT}
+    
+    def hardware_backend(self) -> str:
+        """Validated HARDWARE_BACKEND"""
+        if self.HARDWARE_BACKEND not in ("real", "simulated", "replay"):
+            raise ValueError(f"Unknown hardware backend: {self.HARDWARE_BACKEND}")
+        return self.HARDWARE_BACKEND
+    
+    def zone_configs(self) -> Dict[str, Dict]:
+        """Device and pump pin per zone id"""
+        if not self.ZONES:
+            return {"default": {"device": "default", "pump_pin": self.PUMP_PIN}}
+        
+        devices = self.device_ports()
+        for zone_id, zone in self.ZONES.items():
+            # Zone ids name the zone's data directory
+            if not re.fullmatch(r"[A-Za-z0-9_-]+", zone_id):
+                raise ValueError(f"Invalid zone id: {zone_id!r}")
+            if zone.get("device") not in devices:
+                raise ValueError(f"Zone {zone_id} uses unknown device: {zone.get('device')}")
+        return self.ZONES
     
     class Config:
         env_file = ".env"
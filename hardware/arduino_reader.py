@@ -1,69 +1,271 @@
 import serial
-import json
+import time
 import logging
-from typing import Optional, Dict
+from threading import Event, Lock, Thread
+from typing import Optional, Dict, List
 from config.settings import settings
+from hardware.sample_buffer import FIELDS, SampleRing
+from hardware.serial_protocol import FrameParser
+from services import metrics
+from services.quality import CHECKS, QualityMonitor
 
 logger = logging.getLogger(__name__)
 
+SERIAL_READ_SECONDS = metrics.histogram(
+    "agri_serial_read_seconds", "Time blocked per serial read", ["port"]
+)
+SERIAL_PARSE_SECONDS = metrics.histogram(
+    "agri_serial_parse_seconds", "Time parsing each chunk read from the port", ["port"]
+)
+SERIAL_FRAMES = metrics.counter(
+    "agri_serial_frames_total", "Valid readings received, by wire format (json or binary)", ["port", "format"]
+)
+SERIAL_DROPPED = metrics.counter(
+    "agri_serial_dropped_samples_total", "Samples lost in transit, from binary frame sequence gaps", ["port"]
+)
+SERIAL_SKIPPED_BYTES = metrics.counter(
+    "agri_serial_skipped_bytes_total", "Bytes discarded while resynchronizing to a frame start", ["port"]
+)
+SERIAL_ERRORS = metrics.counter(
+    "agri_serial_errors_total",
+    "Frames or reads that failed (json, unicode, incomplete, crc, disconnect, other)",
+    ["port", "kind"]
+)
+SERIAL_CONNECTED = metrics.gauge(
+    "agri_serial_connected", "1 while the serial port is open", ["port"]
+)
+SERIAL_LAST_SAMPLE = metrics.gauge(
+    "agri_serial_last_sample_timestamp_seconds", "Unix time of the latest valid reading", ["port"]
+)
+SENSOR_FLAGS = metrics.counter(
+    "agri_sensor_flagged_samples_total", "Samples failing a quality check, by reading and check",
+    ["port", "metric", "check"]
+)
+
 class ArduinoReader:
-    """Handles serial communication with Arduino"""
+    """
+    Handles serial communication with Arduino. A background thread reads
+    every sample the Arduino sends, as JSON lines or binary frames (see
+    hardware.serial_protocol), runs the quality checks on it (see
+    services.quality) and stores it in a latest-value cache and a ring of
+    raw samples, so callers never block on the serial port.
+    
+    The port is opened on that thread too, so a missing or resetting board
+    never holds up startup; failed attempts are retried with a doubling
+    delay, from SERIAL_RECONNECT_INTERVAL up to SERIAL_RECONNECT_MAX.
+    """
     
-    def __init__(self):
+    def __init__(self, port: str = None):
+        self.port = port or settings.SERIAL_PORT
         self.ser: Optional[serial.Serial] = None
-        self.connect()
+        
+        # Connection state for readiness: connecting, connected, disconnected or closed
+        self.state = "connecting"
+        self.attempts = 0  # Failed connects since the last success
+        self.last_error: Optional[str] = None
+        self._retry_at: Optional[float] = None  # time.monotonic of the next attempt
+        
+        # Latest parsed reading, guarded by `lock`
+        self.lock = Lock()
+        self._latest: Optional[Dict] = None
+        self._latest_at: Optional[float] = None
+        
+        # Every sample at the full sensor rate, for interval aggregates and /api/live
+        self.buffer = SampleRing(settings.SAMPLE_BUFFER_SIZE)
+        self.parser = FrameParser()
+        self.quality = QualityMonitor(self.port)
+        
+        self._init_metrics()
+        
+        # The reader thread opens the port, so a missing board never blocks startup
+        self._stopping = Event()
+        self._reader_thread = Thread(target=self._read_loop, daemon=True)
+        self._reader_thread.start()
+    
+    def _init_metrics(self):
+        """Resolve this port's metric series once, off the read path"""
+        port = self.port
+        self._read_seconds = SERIAL_READ_SECONDS.labels(port)
+        self._parse_seconds = SERIAL_PARSE_SECONDS.labels(port)
+        self._errors = {
+            kind: SERIAL_ERRORS.labels(port, kind)
+            for kind in ("json", "unicode", "incomplete", "crc", "disconnect", "other")
+        }
+        self._frames = {fmt: SERIAL_FRAMES.labels(port, fmt) for fmt in ("json", "binary")}
+        self._dropped = SERIAL_DROPPED.labels(port)
+        self._skipped = SERIAL_SKIPPED_BYTES.labels(port)
+        self._counted: Dict[tuple, int] = {}  # Parser counter totals already in the metrics
+        self._connected = SERIAL_CONNECTED.labels(port)
+        self._last_sample = SERIAL_LAST_SAMPLE.labels(port)
+        self._flags = [
+            (4 * i + j, SENSOR_FLAGS.labels(port, key, check))
+            for i, key in enumerate(FIELDS)
+            for j, check in enumerate(CHECKS)
+        ]
     
     def connect(self) -> bool:
         """Establish serial connection to Arduino"""
         try:
             self.ser = serial.Serial(
-                settings.SERIAL_PORT,
+                self.port,
                 settings.BAUD_RATE,
                 timeout=settings.SERIAL_TIMEOUT
             )
-            logger.info(f"Connected to Arduino on {settings.SERIAL_PORT}")
+            logger.info(f"Connected to Arduino on {self.port}")
+            self._connected.set(1)
+            self.parser.reset()  # A partial frame from before is gone
+            self.state = "connected"
+            self.attempts = 0
+            self.last_error = None
             return True
         except serial.SerialException as e:
-            logger.error(f"Failed to connect to Arduino: {e}")
+            self.attempts += 1
+            self.last_error = str(e)
+            logger.error(f"Failed to connect to Arduino on {self.port} (attempt {self.attempts}): {e}")
             return False
     
-    def read_sensor_data(self) -> Optional[Dict]:
-        """
-        Read and parse JSON sensor data from Arduino
-        Returns dict with keys: temp, hum, soil, light
+    def _retry_delay(self) -> float:
+        """Seconds before the next connect attempt, doubling per failure up to SERIAL_RECONNECT_MAX"""
+        delay = settings.SERIAL_RECONNECT_INTERVAL * 2 ** min(self.attempts - 1, 16)
+        return min(delay, settings.SERIAL_RECONNECT_MAX)
+    
+    def _read_loop(self):
+        """Background loop that caches every reading and reconnects on failure"""
+        while not self._stopping.is_set():
+            if not self.ser or not self.ser.is_open:
+                if not self.connect():
+                    delay = self._retry_delay()
+                    self._retry_at = time.monotonic() + delay
+                    self._stopping.wait(delay)
+                    self._retry_at = None
+                    continue
+            
+            readings = self._read_chunk()
+            if readings:
+                now = time.time()
+                for data in readings:
+                    quality = self.quality.check(data, now)
+                    if quality:
+                        self._count_flags(quality)
+                    self.buffer.append(data, now, quality)
+                self._last_sample.set(now)
+                with self.lock:
+                    self._latest = {
+                        **readings[-1],
+                        "quality": quality,
+                        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+                    }
+                    self._latest_at = time.monotonic()
+    
+    def _read_chunk(self) -> List[Dict]:
         """
-        if not self.ser or not self.ser.is_open:
-            logger.warning("Serial connection not open")
-            return None
+        Read whatever the port has buffered (waiting up to SERIAL_TIMEOUT
+        for the first byte) and parse it as JSON lines or binary frames
         
+        Returns:
+            Readings with keys temp, hum, soil, light, oldest first
+        """
         try:
-            line = self.ser.readline().decode('utf-8').strip()
+            started = time.perf_counter()
+            chunk = self.ser.read(self.ser.in_waiting or 1)
+            read_at = time.perf_counter()
+            self._read_seconds.observe(read_at - started)
+            if not chunk:
+                return []
             
-            # Look for JSON data
-            if line.startswith("{") and line.endswith("}"):
-                data = json.loads(line)
-                
-                # Validate data structure
-                required_keys = ["temp", "hum", "soil", "light"]
-                if all(key in data for key in required_keys):
-                    return data
-                else:
-                    logger.warning(f"Incomplete data received: {data}")
-                    
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}")
-        except UnicodeDecodeError as e:
-            logger.error(f"Unicode decode error: {e}")
+            readings = self.parser.feed(chunk)
+            self._parse_seconds.observe(time.perf_counter() - read_at)
+            self._publish_counts()
+            return readings
+        
+        except (serial.SerialException, OSError, TypeError, AttributeError) as e:
+            # Device unplugged or port closed under us; reconnect on the next pass
+            if not self._stopping.is_set():
+                self._errors["disconnect"].inc()
+                logger.error(f"Serial connection lost on {self.port}: {e}")
+                self._close_port()
+                self.state = "disconnected"
+                self.last_error = str(e)
+                self._stopping.wait(settings.SERIAL_RECONNECT_INTERVAL)
         except Exception as e:
+            self._errors["other"].inc()
             logger.error(f"Error reading from Arduino: {e}")
         
-        return None
+        return []
     
-    def close(self):
-        """Close serial connection"""
+    def _publish_counts(self):
+        """Add the parser's counter increments to the metrics, warning about bad frames"""
+        parser = self.parser
+        counts = [
+            *((("error", kind), total, self._errors[kind]) for kind, total in parser.errors.items()),
+            *((("frames", fmt), total, self._frames[fmt]) for fmt, total in parser.frames.items()),
+            (("dropped",), parser.dropped, self._dropped),
+            (("skipped",), parser.skipped, self._skipped)
+        ]
+        for key, total, series in counts:
+            new = total - self._counted.get(key, 0)
+            if new:
+                series.inc(new)
+                self._counted[key] = total
+                if key[0] == "error":
+                    logger.warning(f"Discarded {new} frame(s) on {self.port}: {key[1]} error")
+                elif key[0] == "dropped":
+                    logger.warning(f"{new} sample(s) lost in transit on {self.port}")
+    
+    def _count_flags(self, quality: int):
+        for shift, series in self._flags:
+            if quality >> shift & 1:
+                series.inc()
+    
+    def get_latest(self, max_age: Optional[float] = None) -> Optional[Dict]:
+        """
+        Latest cached reading, without touching the serial port
+        
+        Args:
+            max_age: Ignore readings older than this many seconds
+        
+        Returns:
+            Dict with keys temp, hum, soil, light, quality, timestamp, or None
+        """
+        with self.lock:
+            if self._latest is None:
+                return None
+            if max_age is not None and time.monotonic() - self._latest_at > max_age:
+                return None
+            return dict(self._latest)
+    
+    def get_status(self) -> Dict:
+        """
+        Connection state for readiness reporting
+        
+        Returns:
+            Dict with port, state, ready (connected with a fresh reading),
+            attempts, last_error and retry_in seconds
+        """
+        retry_at = self._retry_at
+        return {
+            "port": self.port,
+            "state": self.state,
+            "ready": self.state == "connected" and self.get_latest(settings.SENSOR_STALE_AFTER) is not None,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "retry_in": None if retry_at is None else max(0.0, round(retry_at - time.monotonic(), 1))
+        }
+    
+    def _close_port(self):
         if self.ser and self.ser.is_open:
             self.ser.close()
-            logger.info("Arduino connection closed")
+            self._connected.set(0)
+            logger.info(f"Arduino connection closed on {self.port}")
+    
+    def close(self):
+        """Stop the reader thread and close serial connection"""
+        self._stopping.set()
+        self._close_port()
+        self.state = "closed"
+        
+        if self._reader_thread.is_alive():
+            self._reader_thread.join(timeout=settings.SERIAL_TIMEOUT + 1)
     
     def __del__(self):
-        self.close()
\ No newline at end of file
+        self.close()
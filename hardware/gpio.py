@@ -0,0 +1,64 @@
+import logging
+from threading import Lock
+from typing import Dict, Optional
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatedGPIO:
+    """Stand-in for the RPi.GPIO module that keeps pin levels in memory"""
+    
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+    
+    def __init__(self):
+        self.lock = Lock()
+        self.mode: Optional[int] = None
+        self.pins: Dict[int, int] = {}
+    
+    def setmode(self, mode: int):
+        self.mode = mode
+    
+    def setwarnings(self, flag: bool):
+        pass
+    
+    def setup(self, pin: int, direction: int):
+        with self.lock:
+            self.pins.setdefault(pin, self.LOW)
+    
+    def output(self, pin: int, value: int):
+        with self.lock:
+            if pin not in self.pins:
+                raise RuntimeError(f"Pin {pin} has not been set up")
+            self.pins[pin] = value
+        logger.debug(f"Simulated GPIO pin {pin} -> {value}")
+    
+    def input(self, pin: int) -> int:
+        with self.lock:
+            return self.pins.get(pin, self.LOW)
+    
+    def cleanup(self, pin: int = None):
+        with self.lock:
+            if pin is None:
+                self.pins.clear()
+            else:
+                self.pins.pop(pin, None)
+
+
+_simulated = SimulatedGPIO()
+
+
+def get_gpio():
+    """
+    GPIO module for settings.HARDWARE_BACKEND: RPi.GPIO on real hardware
+    (imported only then), otherwise the in-memory simulation
+    """
+    if settings.HARDWARE_BACKEND == "real":
+        import RPi.GPIO as GPIO
+        return GPIO
+    return _simulated
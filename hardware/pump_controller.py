@@ -1,81 +1,257 @@
-import RPi.GPIO as GPIO
 import logging
 import time
-from threading import Timer
+from threading import Lock
+from typing import Optional
 from config.settings import settings
+from hardware.gpio import get_gpio
+from hardware.pump_scheduler import get_scheduler
+from services import metrics
 
 logger = logging.getLogger(__name__)
 
+# Seconds cleanup() waits for queued GPIO commands
+CLEANUP_TIMEOUT = 2.0
+
+# Seconds between GPIO setup attempts while the pin cannot be configured
+GPIO_RETRY_INTERVAL = 30.0
+
+PUMP_SWITCHES = metrics.counter(
+    "agri_pump_switches_total", "Pin writes that switched a pump", ["pin", "state"]
+)
+PUMP_SWITCH_SECONDS = metrics.histogram(
+    "agri_pump_switch_seconds", "GPIO write time per pump switch", ["pin"]
+)
+PUMP_COMMAND_DELAY = metrics.histogram(
+    "agri_pump_command_delay_seconds", "Time from a pump command to its pin write", ["pin"]
+)
+PUMP_ERRORS = metrics.counter(
+    "agri_pump_errors_total", "Failed pump pin writes", ["pin"]
+)
+PUMP_ON = metrics.gauge(
+    "agri_pump_on", "1 while the pump pin is driven high", ["pin"]
+)
+
 class PumpController:
-    """Controls water pump via GPIO relay"""
+    """
+    Controls water pump via GPIO relay.
     
-    def __init__(self):
-        self.is_on = False
-        self.auto_timer: Optional[Timer] = None
-        self.setup_gpio()
+    Commands update the requested state and return at once; the shared
+    PumpScheduler thread writes the pin in order and switches the pump
+    off when its deadline passes. Each command supersedes any pending
+    auto-off, so a stale deadline can never cut a newer run short.
+    
+    GPIO setup is the scheduler's first command for the pin, so creating
+    a controller never blocks and commands queue behind it. A failed setup
+    is retried every GPIO_RETRY_INTERVAL seconds; until then commands fail
+    and the pump stays off. With a journal
+    attached (see services.journal), every command is journaled so a
+    crash can be picked up after.
+    """
+    
+    def __init__(self, pin: int = None):
+        self.pin = settings.PUMP_PIN if pin is None else pin
+        self.is_on = False  # Requested state; the pin follows in queue order
+        self.off_at: Optional[float] = None  # Auto-off deadline (time.monotonic)
+        self.lock = Lock()
+        self._token = 0  # Bumped per command; deadlines carry the token they were set under
+        self._requested_at = 0.0  # perf_counter of the latest command, for PUMP_COMMAND_DELAY
+        self._pin_on = False
+        self._closed = False
+        self.scheduler = get_scheduler()
+        self.gpio = None  # GPIO module, loaded by setup_gpio()
+        self.journal = None  # See attach_journal()
+        self.ready = False  # Set once the pin is configured
+        self.error: Optional[str] = None  # Why GPIO setup failed
+        
+        self._switches = {state: PUMP_SWITCHES.labels(self.pin, state) for state in ("on", "off")}
+        self._switch_seconds = PUMP_SWITCH_SECONDS.labels(self.pin)
+        self._command_delay = PUMP_COMMAND_DELAY.labels(self.pin)
+        self._errors = PUMP_ERRORS.labels(self.pin)
+        self._pin_gauge = PUMP_ON.labels(self.pin)
+        
+        self.scheduler.submit(self.setup_gpio)
     
     def setup_gpio(self):
-        """Initialize GPIO for pump control"""
+        """Initialize GPIO for pump control (runs on the scheduler thread)"""
+        if self._closed:
+            return
+        
         try:
+            GPIO = self.gpio = get_gpio()
             if settings.GPIO_MODE == "BCM":
                 GPIO.setmode(GPIO.BCM)
             else:
                 GPIO.setmode(GPIO.BOARD)
             
-            GPIO.setup(settings.PUMP_PIN, GPIO.OUT)
-            GPIO.output(settings.PUMP_PIN, GPIO.LOW)
-            self.is_on = False
-            logger.info(f"GPIO initialized - Pump on pin {settings.PUMP_PIN}")
+            GPIO.setup(self.pin, GPIO.OUT)
+            GPIO.output(self.pin, GPIO.LOW)
+            self._pin_on = False
+            self.ready = True
+            self.error = None
+            logger.info(f"GPIO initialized - Pump on pin {self.pin}")
         except Exception as e:
-            logger.error(f"GPIO setup failed: {e}")
+            self.error = str(e)
+            logger.error(f"GPIO setup failed, retrying in {GPIO_RETRY_INTERVAL:.0f}s: {e}")
+            self.scheduler.call_at(time.monotonic() + GPIO_RETRY_INTERVAL, self.setup_gpio)
     
-    def turn_on(self) -> bool:
-        """Turn pump ON"""
-        try:
-            GPIO.output(settings.PUMP_PIN, GPIO.HIGH)
-            self.is_on = True
-            logger.info("Pump turned ON")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to turn pump ON: {e}")
-            return False
+    def _set(self, on: bool, duration: float = None):
+        """Record the requested state and queue the pin write"""
+        with self.lock:
+            self.is_on = on
+            self._token += 1
+            token = self._token
+            self.off_at = time.monotonic() + duration if duration else None
+            off_at = self.off_at
+            self._requested_at = time.perf_counter()
+            if self.journal:
+                self.journal.append_pump(on, duration)
+        
+        done = self.scheduler.submit(self._apply)
+        if off_at is not None:
+            self.scheduler.call_at(off_at, lambda: self._expire(token))
+        return done
     
-    def turn_off(self) -> bool:
-        """Turn pump OFF"""
+    def _apply(self):
+        """Drive the pin to the requested state (runs on the scheduler thread)"""
+        with self.lock:
+            on = self.is_on
+            requested_at = self._requested_at
+        if on == self._pin_on:
+            return
+        
         try:
-            GPIO.output(settings.PUMP_PIN, GPIO.LOW)
-            self.is_on = False
-            logger.info("Pump turned OFF")
+            started = time.perf_counter()
+            self.gpio.output(self.pin, self.gpio.HIGH if on else self.gpio.LOW)
+            done = time.perf_counter()
+            self._pin_on = on
             
-            # Cancel any auto-off timer
-            if self.auto_timer:
-                self.auto_timer.cancel()
-                self.auto_timer = None
-            
-            return True
+            self._switch_seconds.observe(done - started)
+            self._command_delay.observe(done - requested_at)
+            self._switches["on" if on else "off"].inc()
+            self._pin_gauge.set(1 if on else 0)
+            logger.info(f"Pump on pin {self.pin} turned {'ON' if on else 'OFF'}")
         except Exception as e:
-            logger.error(f"Failed to turn pump OFF: {e}")
-            return False
+            self._errors.inc()
+            logger.error(f"Failed to turn pump {'ON' if on else 'OFF'}: {e}")
+            with self.lock:
+                self.is_on = self._pin_on
+    
+    def _expire(self, token: int):
+        """Auto-off deadline reached; ignored if a later command replaced it"""
+        with self.lock:
+            if token != self._token:
+                return
+            self.is_on = False
+            self.off_at = None
+            self._requested_at = time.perf_counter()
+        self._apply()
     
-    def turn_on_for_duration(self, seconds: int):
-        """Turn pump on for specified duration, then auto-off"""
-        if self.turn_on():
-            self.auto_timer = Timer(seconds, self.turn_off)
-            self.auto_timer.start()
-            logger.info(f"Pump will auto-off in {seconds} seconds")
+    def turn_on(self) -> bool:
+        """Turn pump ON until turned off (cancels any pending auto-off)"""
+        self._set(True)
+        return True
+    
+    def turn_off(self) -> bool:
+        """Turn pump OFF (cancels any pending auto-off)"""
+        self._set(False)
+        return True
+    
+    def turn_on_for_duration(self, seconds: float):
+        """Turn pump on for specified duration, then auto-off. A repeat call restarts the countdown."""
+        self._set(True, seconds)
+        logger.info(f"Pump will auto-off in {seconds:.0f} seconds")
+    
+    def attach_journal(self, journal):
+        """
+        Journal commands from now on. The journal's last command is resumed
+        (see resume()) unless the pump has been commanded since startup,
+        in which case the current state is journaled in its place.
+        """
+        with self.lock:
+            self.journal = journal
+            commanded = self._token > 0
+            if commanded:
+                remaining = None if self.off_at is None else max(0.0, self.off_at - time.monotonic())
+                journal.append_pump(self.is_on, remaining)
+        
+        if not commanded:
+            self.resume(journal.pump_state)
+    
+    def resume(self, state: Optional[dict]):
+        """
+        Apply the last journaled command after a restart. A timed run
+        whose deadline has not passed runs on for the time left (never
+        longer than it was started for, should the clock have stepped)
+        if PUMP_RESUME_ON_RESTART is set; any other run is cancelled, so
+        a pump is never left on without a deadline.
+        
+        Args:
+            state: Dict with on, duration and wall-clock deadline, or None
+        """
+        if not state or not state["on"]:
+            return
+        
+        if state["duration"] is None:
+            logger.warning(f"Pump on pin {self.pin} was on without a timer before restart, keeping it off")
+            self.turn_off()
+            return
+        
+        remaining = min(state["deadline"] - time.time(), state["duration"])
+        if remaining <= 0:
+            logger.info(f"Timed run of pump on pin {self.pin} ended while the system was down")
+            self.turn_off()
+        elif not settings.PUMP_RESUME_ON_RESTART:
+            logger.warning(f"Cancelling interrupted run of pump on pin {self.pin} ({remaining:.0f}s left)")
+            self.turn_off()
+        else:
+            logger.warning(f"Resuming interrupted run of pump on pin {self.pin} for {remaining:.0f}s")
+            self.turn_on_for_duration(remaining)
     
     def get_status(self) -> dict:
         """Get current pump status"""
+        with self.lock:
+            off_at = self.off_at
+            is_on = self.is_on
         return {
-            "is_on": self.is_on,
-            "pin": settings.PUMP_PIN
+            "is_on": is_on,
+            "pin": self.pin,
+            "auto_off_in": None if off_at is None else max(0.0, round(off_at - time.monotonic(), 1))
         }
     
+    def _release(self):
+        """Pin LOW and released, leaving other zones' pins alone"""
+        if self.gpio is None:
+            return  # GPIO was never set up
+        self.gpio.output(self.pin, self.gpio.LOW)
+        self._pin_on = False
+        self._pin_gauge.set(0)
+        self.gpio.cleanup(self.pin)
+    
     def cleanup(self):
-        """Clean up GPIO on shutdown"""
-        self.turn_off()
-        GPIO.cleanup()
-        logger.info("GPIO cleanup completed")
+        """Switch the pump off and release its pin on shutdown"""
+        if self._closed:
+            return
+        self._closed = True
+        
+        with self.lock:
+            self.is_on = False
+            self.off_at = None
+            self._token += 1  # Disarm any pending auto-off
+            if self.journal:
+                self.journal.append_pump(False)  # A clean shutdown resumes nothing
+        
+        # Queued behind earlier commands, so nothing switches the pump back on
+        if self.scheduler.submit(self._release).wait(CLEANUP_TIMEOUT):
+            logger.info("GPIO cleanup completed")
+        else:
+            logger.error(f"Timed out cleaning up pump pin {self.pin}")
     
     def __del__(self):
-        self.cleanup()
\ No newline at end of file
+        # Pending commands hold a reference, so none remain by now; at
+        # interpreter exit the scheduler thread may already be gone
+        if not getattr(self, "_closed", True):
+            self._closed = True
+            try:
+                self._release()
+            except Exception:
+                pass
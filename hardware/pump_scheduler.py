@@ -0,0 +1,87 @@
+import heapq
+import itertools
+import logging
+import queue
+import time
+from threading import Event, Lock, Thread
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PumpScheduler:
+    """
+    One thread serving every pump: GPIO commands run in submission order
+    off a queue, and auto-off deadlines wait in a heap, so a pending
+    timeout costs no thread of its own.
+    """
+    
+    def __init__(self):
+        self.lock = Lock()
+        self._commands: "queue.Queue[Tuple[Optional[Callable], Optional[Event]]]" = queue.Queue()
+        self._deadlines: List[Tuple[float, int, Callable]] = []
+        self._order = itertools.count()  # Tie-breaker for equal deadlines
+        self._thread = Thread(target=self._run, name="pump-scheduler", daemon=True)
+        self._thread.start()
+    
+    def submit(self, command: Callable) -> Event:
+        """
+        Queue a command for the scheduler thread
+        
+        Returns:
+            Event set once the command has run
+        """
+        done = Event()
+        self._commands.put((command, done))
+        return done
+    
+    def call_at(self, deadline: float, command: Callable):
+        """Run `command` on the scheduler thread at `deadline` (time.monotonic)"""
+        with self.lock:
+            heapq.heappush(self._deadlines, (deadline, next(self._order), command))
+        self._commands.put((None, None))  # Wake up to re-arm the wait
+    
+    def _run(self):
+        while True:
+            with self.lock:
+                timeout = self._deadlines[0][0] - time.monotonic() if self._deadlines else None
+            
+            try:
+                command, done = self._commands.get(
+                    timeout=None if timeout is None else max(0.0, timeout)
+                )
+            except queue.Empty:
+                command, done = None, None
+            
+            if command is not None:
+                self._execute(command)
+            if done is not None:
+                done.set()
+            
+            # Fire every deadline that is due
+            while True:
+                with self.lock:
+                    if not self._deadlines or self._deadlines[0][0] > time.monotonic():
+                        break
+                    _, _, expired = heapq.heappop(self._deadlines)
+                self._execute(expired)
+    
+    @staticmethod
+    def _execute(command: Callable):
+        try:
+            command()
+        except Exception as e:
+            logger.error(f"Pump command failed: {e}")
+
+
+_scheduler: Optional[PumpScheduler] = None
+_scheduler_lock = Lock()
+
+
+def get_scheduler() -> PumpScheduler:
+    """The process-wide pump scheduler, started on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PumpScheduler()
+        return _scheduler
@@ -0,0 +1,149 @@
+import math
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# Sample fields as stored in the ring, in SensorData key names
+FIELDS = ["temp", "hum", "soil", "light"]
+
+NAN = float("nan")
+
+
+def _value(data: Dict, key: str) -> float:
+    value = data.get(key)
+    return NAN if value is None else float(value)
+
+
+class SampleRing:
+    """
+    Fixed-size ring of raw sensor samples in parallel `array('d')`
+    columns (missing values as NaN) plus each sample's quality mask (see
+    services.quality), addressed by a global sequence number.
+    
+    There is a single writer. It fills a slot before publishing it by
+    advancing `seq`, and readers re-check `seq` after copying to drop
+    slots overwritten meanwhile, so neither side takes a lock.
+    """
+    
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.seq = 0  # Sequence number of the next sample
+        self._time = array('d', [0.0]) * capacity
+        self._columns = {key: array('d', [NAN]) * capacity for key in FIELDS}
+        self._quality = array('H', [0]) * capacity
+    
+    def append(self, data: Dict, timestamp: float = None, quality: int = 0):
+        """
+        Store one sample
+        
+        Args:
+            data: Dict with temp, hum, soil, light
+            timestamp: Unix time of the sample (defaults to now)
+            quality: Quality mask, 4 flag bits per field in FIELDS order
+        """
+        slot = self.seq % self.capacity
+        self._time[slot] = time.time() if timestamp is None else timestamp
+        for key in FIELDS:
+            self._columns[key][slot] = _value(data, key)
+        self._quality[slot] = quality
+        self.seq += 1
+    
+    def _window(self, since: int) -> Tuple[int, int]:
+        """Clamp [since, seq) to the samples still held in the ring"""
+        end = self.seq
+        return max(since, end - self.capacity, 0), end
+    
+    def _copy(self, start: int, end: int) -> Tuple[int, array, Dict[str, array], array]:
+        """
+        Copy columns for sequence numbers [start, end)
+        
+        Returns:
+            Tuple of (first valid sequence number, times, columns, quality masks)
+        """
+        slots = [seq % self.capacity for seq in range(start, end)]
+        times = array('d', (self._time[slot] for slot in slots))
+        columns = {
+            key: array('d', (column[slot] for slot in slots))
+            for key, column in self._columns.items()
+        }
+        quality = array('H', (self._quality[slot] for slot in slots))
+        
+        # The writer may have lapped the copy; drop overwritten samples. It
+        # fills slot `seq` before advancing `seq`, so the slot it may be
+        # writing right now holds sequence number seq - capacity as well
+        first = max(start, self.seq + 1 - self.capacity)
+        skip = first - start
+        if skip:
+            times = times[skip:]
+            columns = {key: column[skip:] for key, column in columns.items()}
+            quality = quality[skip:]
+        return first, times, columns, quality
+    
+    def since(self, seq: int, limit: int = None) -> Tuple[List[Dict], int]:
+        """
+        Raw samples from sequence number `seq` on (oldest still held if
+        `seq` has been overwritten)
+        
+        Args:
+            seq: First sequence number wanted
+            limit: Maximum number of samples (the oldest ones)
+        
+        Returns:
+            Tuple of (samples, sequence number to pass next time)
+        """
+        start, end = self._window(seq)
+        if limit is not None:
+            end = min(end, start + limit)
+        
+        first, times, columns, quality = self._copy(start, end)
+        samples = []
+        for i, timestamp in enumerate(times):
+            sample = {"seq": first + i, "timestamp": timestamp}
+            for key in FIELDS:
+                value = columns[key][i]
+                sample[key] = None if math.isnan(value) else value
+            sample["quality"] = quality[i]
+            samples.append(sample)
+        return samples, end
+    
+    def aggregate(self, seq: int) -> Tuple[Optional[Dict], int]:
+        """
+        Mean, min and max of each field over samples from `seq` on.
+        Samples flagged for a field are left out of its statistics, unless
+        every sample of the field was flagged ("clean" is then False).
+        
+        Returns:
+            Tuple of (dict with count, the OR of the quality masks and
+            {field: {mean, min, max, clean}} or None if there are no new
+            samples, next sequence number)
+        """
+        start, end = self._window(seq)
+        if start >= end:
+            return None, end
+        
+        _, times, columns, quality = self._copy(start, end)
+        mask = 0
+        for flags in set(quality):
+            mask |= flags
+        
+        result = {"count": len(times), "quality": mask}
+        for i, key in enumerate(FIELDS):
+            column = columns[key]
+            values = [value for value in column if not math.isnan(value)]
+            clean = values
+            if mask >> (4 * i) & 0xF:
+                clean = [
+                    value for value, flags in zip(column, quality)
+                    if not math.isnan(value) and not flags >> (4 * i) & 0xF
+                ]
+            if values:
+                values = clean or values
+                result[key] = {
+                    "mean": sum(values) / len(values),
+                    "min": min(values),
+                    "max": max(values),
+                    "clean": bool(clean)
+                }
+            else:
+                result[key] = None
+        return result, end
@@ -0,0 +1,190 @@
+"""
+Wire formats the Arduino sketch can send, and an incremental parser that
+accepts either on the same port.
+
+JSON lines (the default):
+    
+    {"temp":24.50,"hum":61.00,"soil":512,"light":730}\\r\\n
+
+Binary frames (BINARY_PROTOCOL in the sketch), 15 bytes, little-endian:
+    
+    offset  size  field
+    0       2     sync, AA 55
+    2       1     version (1)
+    3       2     sequence number, uint16, wraps
+    5       2     temp, int16, 1/100 degree C (-32768 = sensor error)
+    7       2     hum, int16, 1/100 % (-32768 = sensor error)
+    9       2     soil, uint16, raw ADC (65535 = missing)
+    11      2     light, uint16, raw ADC (65535 = missing)
+    13      2     CRC-16/CCITT-FALSE of bytes 2..12
+
+Frames carry their own sequence number, so samples lost on the wire show
+up as gaps.
+"""
+import json
+import struct
+from binascii import crc_hqx
+from typing import Dict, List, Optional
+
+SYNC = b"\xaa\x55"
+VERSION = 1
+FRAME = struct.Struct("<2sBHhhHHH")
+FRAME_SIZE = FRAME.size
+MISSING = -32768  # int16 sentinel for a failed sensor read
+MISSING_ADC = 0xFFFF  # uint16 sentinel; the ADC never exceeds 1023
+
+REQUIRED_KEYS = ("temp", "hum", "soil", "light")
+
+# A '{' with no newline within this many bytes is noise, not a JSON line
+MAX_LINE = 256
+
+def crc16(data) -> int:
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), as computed by the sketch"""
+    return crc_hqx(data, 0xFFFF)
+
+def _scaled(value: int) -> Optional[float]:
+    return None if value == MISSING else value / 100
+
+def encode_frame(seq: int, reading: Dict) -> bytes:
+    """
+    Binary frame for one reading (for simulated boards and tests)
+    
+    Args:
+        seq: Sequence number (taken modulo 2**16)
+        reading: Dict with temp, hum, soil, light (temp/hum may be None)
+    """
+    def centi(value) -> int:
+        return MISSING if value is None else max(-32767, min(32767, round(value * 100)))
+    
+    def adc(value) -> int:
+        return MISSING_ADC if value is None else max(0, min(0xFFFE, int(value)))
+    
+    body = FRAME.pack(
+        SYNC, VERSION, seq & 0xFFFF,
+        centi(reading.get("temp")), centi(reading.get("hum")),
+        adc(reading.get("soil")), adc(reading.get("light")), 0
+    )[:-2]
+    return body + struct.pack("<H", crc16(body[2:]))
+
+class FrameParser:
+    """
+    Incremental parser for a serial byte stream carrying JSON lines,
+    binary frames or a mix (e.g. the sketch's JSON startup message
+    followed by binary samples). Frames are told apart by their first
+    byte, so no mode needs configuring.
+    
+    Bytes accumulate in one bytearray; frames are unpacked in place with
+    struct.unpack_from and the consumed prefix is dropped once per feed().
+    Counters (frames, errors, dropped, skipped) are running totals.
+    """
+    
+    def __init__(self):
+        self.buffer = bytearray()
+        self.mode: Optional[str] = None  # Format of the last good frame: "json" or "binary"
+        self.last_seq: Optional[int] = None
+        
+        self.frames = {"json": 0, "binary": 0}
+        self.errors = {"json": 0, "unicode": 0, "incomplete": 0, "crc": 0}
+        self.dropped = 0  # Samples missing from binary sequence gaps
+        self.skipped = 0  # Bytes discarded while resynchronizing
+    
+    def reset(self):
+        """Forget partial input and sequence state (after a reconnect)"""
+        self.buffer.clear()
+        self.last_seq = None
+    
+    def feed(self, data: bytes) -> List[Dict]:
+        """
+        Add received bytes and parse every complete frame
+        
+        Returns:
+            Readings with temp, hum, soil, light, oldest first
+        """
+        buf = self.buffer
+        buf += data
+        readings = []
+        pos = 0
+        end = len(buf)
+        
+        while pos < end:
+            first = buf[pos]
+            
+            if first == 0xAA and buf[pos + 1:pos + 2] in (b"\x55", b""):
+                if end - pos < FRAME_SIZE:
+                    break  # Wait for the rest of the frame
+                reading = self._binary(buf, pos)
+                if reading is None:
+                    pos += 1  # Bad frame; resync on the next sync pattern
+                    self.skipped += 1
+                    continue
+                readings.append(reading)
+                pos += FRAME_SIZE
+            
+            elif first == 0x7B:  # "{"
+                newline = buf.find(b"\n", pos, pos + MAX_LINE)
+                if newline < 0:
+                    if end - pos < MAX_LINE:
+                        break  # Wait for the rest of the line
+                    pos += 1
+                    self.skipped += 1
+                    continue
+                reading = self._json(buf, pos, newline)
+                if reading is not None:
+                    readings.append(reading)
+                pos = newline + 1
+            
+            else:
+                # Line endings, boot noise or a lost partial frame
+                pos = self._next_start(buf, pos + 1, end)
+        
+        del buf[:pos]
+        return readings
+    
+    def _next_start(self, buf: bytearray, pos: int, end: int) -> int:
+        """Position of the next byte that could start a frame"""
+        candidates = [i for i in (buf.find(b"{", pos), buf.find(b"\xaa", pos)) if i >= 0]
+        start = min(candidates) if candidates else end
+        skipped = buf[pos - 1:start].translate(None, b"\r\n")  # Line endings are not noise
+        self.skipped += len(skipped)
+        return start
+    
+    def _binary(self, buf: bytearray, pos: int) -> Optional[Dict]:
+        sync, version, seq, temp, hum, soil, light, crc = FRAME.unpack_from(buf, pos)
+        if sync != SYNC or version != VERSION or crc16(memoryview(buf)[pos + 2:pos + FRAME_SIZE - 2]) != crc:
+            self.errors["crc"] += 1
+            return None
+        
+        if self.last_seq is not None and seq != 0:
+            # Sequence 0 means the board restarted, not that samples were lost
+            self.dropped += (seq - self.last_seq - 1) & 0xFFFF
+        self.last_seq = seq
+        self.frames["binary"] += 1
+        self.mode = "binary"
+        return {
+            "temp": _scaled(temp),
+            "hum": _scaled(hum),
+            "soil": None if soil == MISSING_ADC else soil,
+            "light": None if light == MISSING_ADC else light
+        }
+    
+    def _json(self, buf: bytearray, start: int, newline: int) -> Optional[Dict]:
+        try:
+            line = buf[start:newline].decode("utf-8").strip()
+            if not line.endswith("}"):
+                self.errors["json"] += 1
+                return None
+            data = json.loads(line)
+        except UnicodeDecodeError:
+            self.errors["unicode"] += 1
+            return None
+        except ValueError:
+            self.errors["json"] += 1
+            return None
+        
+        if not isinstance(data, dict) or not all(key in data for key in REQUIRED_KEYS):
+            self.errors["incomplete"] += 1
+            return None
+        
+        self.frames["json"] += 1
+        self.mode = "json"
+        return data
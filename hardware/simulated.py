@@ -0,0 +1,238 @@
+"""
+Simulated Arduino boards on pseudo-terminals, for load testing many zones.
+    
+    python -m hardware.simulated --boards 100 --rate 2 --env-file .env.sim
+
+Each board gets its own pty that emits the sketch's JSON lines (or, with
+--binary, its binary frames), either a random walk or (--replay) the
+readings of a recorded CSV log. The
+DEVICES/ZONES settings for the boards are printed (or written to
+--env-file) so the server can be started against them, e.g.
+`env $(cat .env.sim) uvicorn main:app`.
+
+The server can also run the boards itself: see HARDWARE_BACKEND.
+"""
+import argparse
+import csv
+import gzip
+import json
+import math
+import os
+import pty
+import random
+import sys
+import time
+import tty
+import logging
+from threading import Event, Thread
+from typing import Dict, Iterator, List, Optional
+
+from hardware.serial_protocol import encode_frame
+
+logger = logging.getLogger(__name__)
+
+
+class VirtualBoard:
+    """One simulated Arduino writing JSON sensor lines or binary frames to a pty"""
+    
+    def __init__(self, device_id: str, seed: int = None, protocol: str = "json"):
+        self.device_id = device_id
+        self.random = random.Random(seed)
+        self.protocol = protocol
+        self.seq = 0
+        
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)  # No echo or newline translation
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        
+        self.temp = self.random.uniform(18, 30)
+        self.hum = self.random.uniform(40, 70)
+        self.soil = self.random.uniform(300, 800)
+        self.dropped = 0
+    
+    def reading(self) -> Dict:
+        """Next reading: a random walk with slow drying and a daily light cycle"""
+        self.temp += self.random.gauss(0, 0.05)
+        self.hum += self.random.gauss(0, 0.1)
+        self.soil = max(0.0, self.soil - 0.01 + self.random.gauss(0, 0.5))
+        daylight = max(0.0, math.sin(time.time() / 86400 * 2 * math.pi))
+        
+        return {
+            "temp": round(self.temp, 1),
+            "hum": round(self.hum, 1),
+            "soil": int(self.soil),
+            "light": int(900 * daylight + self.random.uniform(0, 20))
+        }
+    
+    def encode(self, reading: Dict) -> bytes:
+        """One reading in the board's wire format"""
+        self.seq += 1
+        if self.protocol == "binary":
+            return encode_frame(self.seq, reading)
+        return (json.dumps(reading) + "\r\n").encode()
+    
+    def emit(self):
+        """Write one reading; drop it if nobody is draining the pty"""
+        try:
+            os.write(self.master, self.encode(self.reading()))
+        except (BlockingIOError, OSError):
+            self.dropped += 1
+    
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def _number(value: Optional[str], cast):
+    """CSV cell to a number, None when empty"""
+    return cast(float(value)) if value else None
+
+
+class ReplayBoard(VirtualBoard):
+    """A virtual board that replays the readings of a CSV sensor log, looping at the end"""
+    
+    def __init__(self, device_id: str, path: str, skip: int = 0, protocol: str = "json"):
+        super().__init__(device_id, protocol=protocol)
+        self.path = path
+        self.rows = self._rows()
+        # Boards replaying the same log start at different rows
+        for _ in range(skip):
+            next(self.rows)
+    
+    def _rows(self) -> Iterator[Dict]:
+        while True:
+            opener = gzip.open if self.path.endswith(".gz") else open
+            count = 0
+            with opener(self.path, 'rt', newline='') as f:
+                for row in csv.DictReader(f):
+                    count += 1
+                    yield row
+            if not count:
+                raise ValueError(f"No rows to replay in {self.path}")
+    
+    def reading(self) -> Dict:
+        row = next(self.rows)
+        return {
+            "temp": _number(row.get("temp"), float),
+            "hum": _number(row.get("humidity"), float),
+            "soil": _number(row.get("soil_moisture"), int),
+            "light": _number(row.get("light_level"), int)
+        }
+
+
+class SimulatedFarm:
+    """
+    A set of virtual boards driven by one writer thread, each emitting
+    `rate` lines per second
+    """
+    
+    def __init__(
+        self,
+        boards: int = 100,
+        rate: float = 1.0,
+        prefix: str = "sim",
+        device_ids: Optional[List[str]] = None,
+        replay: Optional[str] = None,
+        protocol: str = "json"
+    ):
+        """
+        Args:
+            boards: Number of boards, named prefix000, prefix001, ...
+            rate: Lines per second per board
+            prefix: Device id prefix
+            device_ids: Explicit device ids (overrides boards/prefix)
+            replay: CSV log to replay instead of random readings
+            protocol: Wire format, "json" or "binary"
+        """
+        if device_ids is None:
+            width = len(str(boards - 1))
+            device_ids = [f"{prefix}{i:0{width}d}" for i in range(boards)]
+        
+        self.boards: List[VirtualBoard] = [
+            ReplayBoard(device_id, replay, skip=i * 97, protocol=protocol) if replay
+            else VirtualBoard(device_id, seed=i, protocol=protocol)
+            for i, device_id in enumerate(device_ids)
+        ]
+        self.rate = rate
+        self._stopping = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+    
+    def devices(self) -> Dict[str, str]:
+        """DEVICES setting: device id -> serial port"""
+        return {board.device_id: board.port for board in self.boards}
+    
+    def zones(self) -> Dict[str, Dict]:
+        """ZONES setting: one sensor-only zone per board"""
+        return {
+            board.device_id: {"device": board.device_id, "pump_pin": None}
+            for board in self.boards
+        }
+    
+    def start(self):
+        self._thread.start()
+        logger.info(f"Simulating {len(self.boards)} boards at {self.rate} Hz")
+    
+    def _run(self):
+        """Emit from every board once per period, spread across the period"""
+        period = 1.0 / self.rate
+        step = period / len(self.boards)
+        next_time = time.monotonic()
+        while not self._stopping.is_set():
+            for board in self.boards:
+                board.emit()
+                next_time += step
+                delay = next_time - time.monotonic()
+                if delay > 0 and self._stopping.wait(delay):
+                    return
+    
+    def stop(self):
+        self._stopping.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2)
+        for board in self.boards:
+            board.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Drive simulated Arduino boards over ptys")
+    parser.add_argument("--boards", type=int, default=100, help="Number of boards")
+    parser.add_argument("--rate", type=float, default=1.0, help="Lines per second per board")
+    parser.add_argument("--env-file", help="Write DEVICES/ZONES settings to this file")
+    parser.add_argument("--replay", help="Replay readings from this CSV sensor log")
+    parser.add_argument("--binary", action="store_true", help="Send binary frames instead of JSON lines")
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    
+    farm = SimulatedFarm(
+        args.boards, args.rate, replay=args.replay, protocol="binary" if args.binary else "json"
+    )
+    env = (
+        f"DEVICES={json.dumps(farm.devices(), separators=(',', ':'))}\n"
+        f"ZONES={json.dumps(farm.zones(), separators=(',', ':'))}\n"
+    )
+    if args.env_file:
+        with open(args.env_file, 'w') as f:
+            f.write(env)
+        logger.info(f"Wrote settings for {args.boards} boards to {args.env_file}")
+    else:
+        print(env, end="", flush=True)
+    
+    farm.start()
+    try:
+        while True:
+            time.sleep(10)
+            dropped = sum(board.dropped for board in farm.boards)
+            if dropped:
+                logger.info(f"{dropped} lines dropped on ptys nobody reads")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        farm.stop()
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,7 @@ from contextlib import asynccontextmanager
 from config.settings import settings
 from services.sensor_service import SensorService
 from api import routes
+from api.middleware import MetricsMiddleware
 
 # Configure logging
 logging.basicConfig(
@@ -31,12 +32,14 @@ async def lifespan(app: FastAPI):
     sensor_service = SensorService()
     sensor_service.start_logging_loop()
     routes.init_routes(sensor_service)
-    logger.info("System ready!")
+    # Serial ports, GPIO and zone storage finish starting in the background
+    logger.info("API ready, devices and storage starting (see /api/status)")
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
+    routes.query_executor.shutdown()
     sensor_service.stop()
     logger.info("Shutdown complete")
 
@@ -48,6 +51,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Time every request for /metrics
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Mount static files and templates
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
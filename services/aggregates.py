@@ -0,0 +1,177 @@
+import json
+import math
+import os
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Numeric log columns tracked by the aggregate store
+METRICS = ["temp", "humidity", "soil_moisture", "light_level"]
+
+
+class RunningStat:
+    """Count, sum, min, max and Welford variance for one metric"""
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.mean = 0.0
+        self.m2 = 0.0
+    
+    def add(self, value: float):
+        """Fold a single value into the running aggregate"""
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        
+        # Welford's online update
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+    
+    @property
+    def stddev(self) -> float:
+        """Sample standard deviation"""
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.m2 / (self.count - 1))
+    
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean": self.mean if self.count else 0,
+            "min": self.min if self.min is not None else 0,
+            "max": self.max if self.max is not None else 0,
+            "stddev": self.stddev
+        }
+    
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean,
+            "m2": self.m2
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RunningStat":
+        stat = cls()
+        stat.count = data["count"]
+        stat.total = data["total"]
+        stat.min = data["min"]
+        stat.max = data["max"]
+        stat.mean = data["mean"]
+        stat.m2 = data["m2"]
+        return stat
+
+
+class AggregateStore:
+    """
+    Running aggregates over every logged row, so summary statistics
+    are O(1) instead of a rescan of the log
+    """
+    
+    def __init__(self, checkpoint_file: str):
+        self.checkpoint_file = checkpoint_file
+        self.reset()
+    
+    def reset(self):
+        """Drop all aggregates"""
+        self.rows = 0
+        self.pump_on_rows = 0
+        self.stats: Dict[str, RunningStat] = {name: RunningStat() for name in METRICS}
+    
+    def update(self, record: Dict):
+        """
+        Fold one log record into the aggregates
+        
+        Args:
+            record: Dict keyed by log column names, values as numbers or CSV strings
+        """
+        self.rows += 1
+        
+        for name in METRICS:
+            value = record.get(name)
+            if value is None or value == "":
+                continue
+            try:
+                self.stats[name].add(float(value))
+            except ValueError:
+                logger.warning(f"Skipping non-numeric {name} value: {value!r}")
+        
+        if record.get("pump_status") == "ON":
+            self.pump_on_rows += 1
+    
+    def summary(self) -> Dict:
+        """Summary statistics for the API"""
+        if not self.rows:
+            return {}
+        
+        temp = self.stats["temp"].summary()
+        soil = self.stats["soil_moisture"].summary()
+        
+        return {
+            "total_records": self.rows,
+            "avg_temperature": temp["mean"],
+            "avg_soil_moisture": soil["mean"],
+            "min_temperature": temp["min"],
+            "max_temperature": temp["max"],
+            "pump_duty_cycle": self.pump_on_rows / self.rows,
+            "metrics": {name: stat.summary() for name, stat in self.stats.items()}
+        }
+    
+    def save_checkpoint(self, cursor: int):
+        """
+        Persist the aggregates atomically
+        
+        Args:
+            cursor: Storage cursor just past the last aggregated row
+        """
+        state = {
+            "rows": self.rows,
+            "cursor": cursor,
+            "pump_on_rows": self.pump_on_rows,
+            "stats": {name: stat.to_dict() for name, stat in self.stats.items()}
+        }
+        
+        tmp_file = f"{self.checkpoint_file}.tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_file, self.checkpoint_file)
+        except OSError as e:
+            logger.error(f"Failed to save stats checkpoint: {e}")
+    
+    def load_checkpoint(self) -> Optional[int]:
+        """
+        Restore aggregates from the checkpoint file
+        
+        Returns:
+            Storage cursor to resume replay from, or None if no usable checkpoint
+        """
+        self.reset()
+        
+        if not os.path.isfile(self.checkpoint_file):
+            return None
+        
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                state = json.load(f)
+            
+            self.rows = state["rows"]
+            self.pump_on_rows = state["pump_on_rows"]
+            for name in METRICS:
+                self.stats[name] = RunningStat.from_dict(state["stats"][name])
+            
+            return state["cursor"]
+        
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Discarding unreadable stats checkpoint: {e}")
+            self.reset()
+            return None
@@ -0,0 +1,371 @@
+import logging
+from threading import Lock
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from services import cancellation
+from services.aggregates import METRICS
+from services.rollups import from_epoch, normalize_timestamp, to_epoch
+
+logger = logging.getLogger(__name__)
+
+# Rows decoded per chunk while loading or extending the column cache
+LOAD_CHUNK = 50000
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _values(array: np.ndarray, digits: int = 3) -> List[Optional[float]]:
+    """JSON-ready list: rounded floats, NaN as None"""
+    return [None if v != v else v for v in np.round(array, digits).tolist()]
+
+
+def _number(value: float, digits: int = 3) -> Optional[float]:
+    return None if value != value else round(float(value), digits)
+
+
+def _percentiles(ordered: np.ndarray, percentiles: Sequence[float]) -> np.ndarray:
+    """Linear-interpolated percentiles of sorted data (as np.percentile, without re-partitioning)"""
+    positions = np.asarray(percentiles, dtype=np.float64) / 100 * (len(ordered) - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (positions - lower)
+
+
+def _spread(start: int, stop: int, points: int) -> np.ndarray:
+    """At most `points` evenly spaced indices in [start, stop), always ending at stop - 1"""
+    if stop - start <= points:
+        return np.arange(start, stop)
+    return np.unique(np.linspace(start, stop - 1, points).astype(np.int64))
+
+
+class ColumnCache:
+    """
+    A zone's log as typed NumPy columns: timestamp (epoch seconds, see
+    rollups.to_epoch), one float64 column per metric (NaN when missing)
+    and pump state.
+    
+    Columns are loaded once, then extended from the storage cursor where
+    the last refresh stopped. Unflushed rows are appended as a tail that
+    the next refresh replaces, and any deletion (retention, clear_old_logs)
+    triggers a full reload.
+    """
+    
+    def __init__(self, data_logger):
+        self.data_logger = data_logger
+        self.lock = Lock()
+        self.size = 0  # Rows in use, including the unflushed tail
+        self._stored = 0  # Rows read from the backend
+        self._cursor: Optional[int] = None
+        self._truncations = None
+        self._generation = None
+        self._columns: Dict[str, np.ndarray] = {}
+        self._reserve(0)
+    
+    def _reserve(self, capacity: int):
+        """Grow the backing arrays geometrically, keeping the first `size` rows"""
+        current = len(self._columns.get("timestamp", ()))
+        if capacity <= current and self._columns:
+            return
+        capacity = max(capacity, current * 2, 1024)
+        
+        columns = {"timestamp": np.zeros(capacity, np.int64), "pump": np.zeros(capacity, np.bool_)}
+        for metric in METRICS:
+            columns[metric] = np.full(capacity, np.nan)
+        for name, column in self._columns.items():
+            columns[name][:self.size] = column[:self.size]
+        self._columns = columns
+    
+    def _append(self, records: List[Dict]):
+        if not records:
+            return
+        n = len(records)
+        self._reserve(self.size + n)
+        end = self.size + n
+        
+        columns = self._columns
+        columns["timestamp"][self.size:end] = [to_epoch(r["timestamp"]) for r in records]
+        columns["pump"][self.size:end] = [r["pump_status"] == "ON" for r in records]
+        for metric in METRICS:
+            columns[metric][self.size:end] = [
+                np.nan if r[metric] is None else r[metric] for r in records
+            ]
+        self.size = end
+    
+    def refresh(self):
+        """
+        Bring the columns up to date with the logger (call with `lock`
+        held). `flush_lock` is taken per chunk, so a first load of a long
+        log does not hold up flushing.
+        """
+        data_logger = self.data_logger
+        if self._generation == data_logger.generation:
+            return
+        
+        while True:
+            # Loaded chunks are kept, so a cancelled first load resumes next time
+            cancellation.check()
+            with data_logger.flush_lock:
+                if self._truncations != data_logger.truncations:
+                    self._stored = 0
+                    self._cursor = None
+                    self._truncations = data_logger.truncations
+                
+                # Drop the previous unflushed tail; those rows may be stored by now
+                self.size = self._stored
+                
+                chunk = []
+                records = data_logger.backend.iter_from(self._cursor)
+                try:
+                    for record, cursor in records:
+                        chunk.append(record)
+                        self._cursor = cursor
+                        if len(chunk) >= LOAD_CHUNK:
+                            break
+                finally:
+                    records.close()
+                self._append(chunk)
+                self._stored = self.size
+                
+                if len(chunk) < LOAD_CHUNK:
+                    with data_logger.lock:
+                        self._append(list(data_logger._pending))
+                        self._generation = data_logger.generation
+                    return
+    
+    def window(self, start: Optional[str], end: Optional[str]) -> Dict[str, np.ndarray]:
+        """
+        Column views for rows with timestamps in [start, end]. Call with
+        `lock` held; the views are only valid until the next refresh.
+        """
+        self.refresh()
+        timestamps = self._columns["timestamp"][:self.size]
+        lo = 0 if not start else np.searchsorted(timestamps, to_epoch(start), "left")
+        hi = self.size if not end else np.searchsorted(timestamps, to_epoch(end), "right")
+        return {name: column[lo:hi] for name, column in self._columns.items()}
+
+
+class Analytics:
+    """Vectorized queries over a zone's history, backed by a ColumnCache"""
+    
+    def __init__(self, data_logger):
+        self.cache = ColumnCache(data_logger)
+    
+    def _window(self, start: Optional[str], end: Optional[str]) -> Dict[str, np.ndarray]:
+        start = normalize_timestamp(start) if start else None
+        end = normalize_timestamp(end) if end else None
+        return self.cache.window(start, end)
+    
+    @staticmethod
+    def _metric(metric: str):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+    
+    def summary(
+        self,
+        start: str = None,
+        end: str = None,
+        percentiles: Sequence[float] = DEFAULT_PERCENTILES
+    ) -> Dict:
+        """
+        Count, mean, stddev, min, max and percentiles per metric
+        
+        Args:
+            start: Window start, date or timestamp (first record if None)
+            end: Window end, date or timestamp (last record if None)
+            percentiles: Percentiles to report, 0-100
+        """
+        with self.cache.lock:
+            columns = self._window(start, end)
+            timestamps = columns["timestamp"]
+            result = {
+                "rows": int(len(timestamps)),
+                "start": from_epoch(int(timestamps[0])) if len(timestamps) else None,
+                "end": from_epoch(int(timestamps[-1])) if len(timestamps) else None,
+                "pump_duty_cycle": _number(columns["pump"].mean()) if len(timestamps) else None,
+                "metrics": {}
+            }
+            
+            for metric in METRICS:
+                values = columns[metric]
+                values = np.sort(values[~np.isnan(values)])
+                if not len(values):
+                    result["metrics"][metric] = {"count": 0}
+                    continue
+                
+                # One sort serves every percentile plus min/max
+                ranks = _percentiles(values, percentiles)
+                result["metrics"][metric] = {
+                    "count": int(len(values)),
+                    "mean": _number(values.mean()),
+                    "stddev": _number(values.std(ddof=1)) if len(values) > 1 else 0.0,
+                    "min": _number(values[0]),
+                    "max": _number(values[-1]),
+                    "percentiles": {f"p{q:g}": _number(v) for q, v in zip(percentiles, ranks)}
+                }
+            return result
+    
+    def rolling_mean(
+        self,
+        metric: str,
+        window: int,
+        start: str = None,
+        end: str = None,
+        points: int = 500
+    ) -> Dict:
+        """
+        Time-based rolling mean: at each sample, the mean of `metric` over
+        the preceding `window` seconds. Computed from prefix sums in O(n),
+        then sampled down to `points` evenly spaced rows.
+        """
+        self._metric(metric)
+        if window <= 0:
+            raise ValueError("window must be positive")
+        
+        with self.cache.lock:
+            columns = self._window(start, end)
+            timestamps = columns["timestamp"]
+            values = columns[metric]
+            
+            valid = ~np.isnan(values)
+            sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+            counts = np.concatenate(([0], np.cumsum(valid)))
+            
+            idx = _spread(0, len(timestamps), points)
+            left = np.searchsorted(timestamps, timestamps[idx] - window, "right")
+            n = counts[idx + 1] - counts[left]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = (sums[idx + 1] - sums[left]) / n
+            
+            return {
+                "metric": metric,
+                "window": window,
+                "timestamps": [from_epoch(t) for t in timestamps[idx].tolist()],
+                "values": _values(means)
+            }
+    
+    def daily(self, metric: str, start: str = None, end: str = None) -> Dict:
+        """Per-day count, min, max and mean of `metric`"""
+        self._metric(metric)
+        
+        with self.cache.lock:
+            columns = self._window(start, end)
+            days = columns["timestamp"] // 86400
+            values = columns[metric]
+            if not len(days):
+                return {"metric": metric, "days": []}
+            
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(days)) + 1))
+            valid = ~np.isnan(values)
+            counts = np.add.reduceat(valid, starts)
+            totals = np.add.reduceat(np.where(valid, values, 0.0), starts)
+            # fmin/fmax skip NaN unless the whole day is missing
+            lows = np.fmin.reduceat(values, starts)
+            highs = np.fmax.reduceat(values, starts)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = totals / counts
+            
+            return {
+                "metric": metric,
+                "days": [
+                    {"date": from_epoch(day * 86400)[:10], "count": count,
+                     "min": low, "max": high, "mean": mean}
+                    for day, count, low, high, mean in zip(
+                        days[starts].tolist(), counts.tolist(),
+                        _values(lows), _values(highs), _values(means)
+                    )
+                ]
+            }
+    
+    def drying_rate(
+        self, start: str = None, end: str = None, bucket: int = 3600, points: int = 500
+    ) -> Dict:
+        """
+        Soil moisture change per hour while the pump is off
+        
+        Returns:
+            Dict with the least-squares slope within dry runs (split at
+            each watering, so refills do not flatten it) and a derivative
+            series between consecutive `bucket`-second means; buckets with
+            any pump activity are left out of both
+        """
+        if bucket <= 0:
+            raise ValueError("bucket must be positive")
+        
+        with self.cache.lock:
+            columns = self._window(start, end)
+            timestamps = columns["timestamp"]
+            soil = columns["soil_moisture"]
+            
+            buckets = timestamps // bucket
+            if not len(buckets):
+                return {"rate_per_hour": None, "samples": 0, "bucket": bucket, "series": []}
+            
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+            sizes = np.diff(np.append(starts, len(buckets)))
+            watered = np.add.reduceat(columns["pump"], starts) > 0
+            keep = ~np.repeat(watered, sizes)
+            keep &= ~np.isnan(soil)
+            
+            # Slope of soil vs time with each dry run centred on its own
+            # means, i.e. one common slope fitted across the runs
+            rate = None
+            run = np.repeat(np.cumsum(watered), sizes)[keep]
+            t = timestamps[keep].astype(np.float64)
+            y = soil[keep]
+            if len(t) > 1:
+                n = np.bincount(run)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    t -= (np.bincount(run, t) / n)[run]
+                    y = y - (np.bincount(run, y) / n)[run]
+                spread = (t * t).sum()
+                if spread > 0:
+                    rate = _number((t * y).sum() / spread * 3600)
+            
+            # Derivative between adjacent dry bucket means
+            valid = ~np.isnan(soil)
+            counts = np.add.reduceat(valid, starts)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = np.add.reduceat(np.where(valid, soil, 0.0), starts) / counts
+                centers = np.add.reduceat(timestamps, starts) / sizes
+                rates = np.diff(means) / np.diff(centers) * 3600
+            usable = ~(watered[1:] | watered[:-1]) & (buckets[starts][1:] - buckets[starts][:-1] == 1)
+            series_t = centers[1:][usable]
+            series_v = rates[usable]
+            idx = _spread(0, len(series_t), points)
+            
+            return {
+                "rate_per_hour": rate,
+                "samples": int(keep.sum()),
+                "bucket": bucket,
+                "series": [
+                    {"timestamp": from_epoch(int(ts)), "rate_per_hour": v}
+                    for ts, v in zip(series_t[idx].tolist(), _values(series_v[idx]))
+                ]
+            }
+    
+    def correlation(
+        self, x: str = "temp", y: str = "humidity", start: str = None, end: str = None
+    ) -> Dict:
+        """Pearson correlation between two metrics over rows where both are present"""
+        self._metric(x)
+        self._metric(y)
+        
+        with self.cache.lock:
+            columns = self._window(start, end)
+            a = columns[x]
+            b = columns[y]
+            both = ~(np.isnan(a) | np.isnan(b))
+            a = a[both]
+            b = b[both]
+            
+            r = None
+            if len(a) > 1:
+                a = a - a.mean()
+                b = b - b.mean()
+                denominator = np.sqrt((a * a).sum() * (b * b).sum())
+                if denominator:
+                    r = _number((a * b).sum() / denominator, 4)
+            
+            return {"x": x, "y": y, "samples": int(len(a)), "r": r}
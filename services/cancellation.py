@@ -0,0 +1,47 @@
+"""
+Cooperative cancellation for long reads running on worker threads.
+
+The API's query executor runs each read under a CancelToken; long loops
+in the data layer call check() every so often and stop with
+QueryCancelled once the caller has given up (timeout or shutdown).
+Outside the executor check() is a no-op, so the same code serves the
+logging threads and CLI tools unchanged.
+"""
+from threading import Event, local
+from typing import Callable
+
+# Records between check() calls in per-record loops
+CHECK_EVERY = 10000
+
+_current = local()
+
+class QueryCancelled(Exception):
+    """The read was cancelled by whoever started it"""
+
+class CancelToken:
+    def __init__(self):
+        self._cancelled = Event()
+    
+    def cancel(self):
+        self._cancelled.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+def run_with_token(token: CancelToken, fn: Callable):
+    """Call `fn()` on this thread with `token` as the current cancellation token"""
+    _current.token = token
+    try:
+        return fn()
+    finally:
+        _current.token = None
+
+def check():
+    """
+    Raises:
+        QueryCancelled: The current thread's read was cancelled
+    """
+    token = getattr(_current, "token", None)
+    if token is not None and token.cancelled:
+        raise QueryCancelled()
@@ -1,139 +1,608 @@
-import csv
-import os
 import logging
+import time
 from datetime import datetime
-from typing import Dict, List
-from threading import Lock
+from typing import Dict, Iterator, List, Optional
+from threading import Event, Lock, Thread
 from config.settings import settings
+from services.aggregates import AggregateStore
+from services import cancellation, metrics
+from services.analytics import Analytics
+from services.journal import Journal
+from services.rollups import (
+    RollupStore, downsample_lttb, normalize_timestamp, raw_to_point
+)
+from services.storage import StorageBackend, create_backend
 
 logger = logging.getLogger(__name__)
 
+# Seconds between retention passes in the flush thread
+RETENTION_CHECK_INTERVAL = 3600
+
+LOG_DATA_SECONDS = metrics.histogram(
+    "agri_log_data_seconds", "DataLogger.log_data duration, lock wait included", ["zone"]
+)
+HISTORY_SECONDS = metrics.histogram(
+    "agri_history_read_seconds", "DataLogger.get_history duration, lock wait included", ["zone"]
+)
+LOCK_WAIT_SECONDS = metrics.histogram(
+    "agri_logger_lock_wait_seconds", "Time waiting for a DataLogger lock",
+    ["zone", "lock"], buckets=metrics.WAIT_BUCKETS
+)
+STORAGE_WRITE_SECONDS = metrics.histogram(
+    "agri_storage_write_seconds", "Backend append time per flushed batch", ["zone"]
+)
+ROWS_WRITTEN = metrics.counter(
+    "agri_log_rows_written_total", "Rows flushed to the storage backend", ["zone"]
+)
+WRITE_ERRORS = metrics.counter(
+    "agri_storage_write_errors_total", "Failed batch flushes (rows kept for retry)", ["zone"]
+)
+PENDING_ROWS = metrics.gauge(
+    "agri_log_pending_rows", "Rows buffered and not yet flushed", ["zone"]
+)
+
+def _typed(value, cast):
+    """Coerce a sensor value to the stored type, keeping missing values as None"""
+    return None if value is None or value == "" else cast(value)
+
 class DataLogger:
-    """Handles CSV logging of sensor data"""
+    """Handles logging of sensor data to the configured storage backend"""
     
-    def __init__(self):
-        self.log_file = settings.LOG_FILE
+    def __init__(self, backend: Optional[StorageBackend] = None, zone: str = "default"):
+        self.backend = backend or create_backend()
         self.lock = Lock()
-        self._ensure_file_exists()
+        
+        # Metric series for this zone, resolved once
+        self._log_seconds = LOG_DATA_SECONDS.labels(zone)
+        self._history_seconds = HISTORY_SECONDS.labels(zone)
+        self._lock_wait = LOCK_WAIT_SECONDS.labels(zone, "lock")
+        self._flush_lock_wait = LOCK_WAIT_SECONDS.labels(zone, "flush_lock")
+        self._write_seconds = STORAGE_WRITE_SECONDS.labels(zone)
+        self._rows_written = ROWS_WRITTEN.labels(zone)
+        self._write_errors = WRITE_ERRORS.labels(zone)
+        self._pending_rows = PENDING_ROWS.labels(zone)
+        
+        # Write-behind buffer. `lock` guards it and the in-memory aggregates;
+        # `flush_lock` serializes backend writes against buffer-merging reads.
+        self.flush_lock = Lock()
+        self._pending: List[Dict] = []
+        self._pending_since: Optional[float] = None
+        self._journal_seq = 0  # Journal sequence number of the latest buffered row
+        self.last_record: Optional[Dict] = None
+        
+        # Bumped on every change to readable data, for API response caching
+        self.generation = 0
+        self.modified_at = time.time()
+        self.truncations = 0  # Bumped when stored rows are deleted
+        
+        # Running aggregates for summary stats, checkpointed next to the data
+        self.stats = AggregateStore(f"{self.backend.path}.stats")
+        self._restore_stats()
+        
+        # Time-bucketed rollup tiers for long-range history queries
+        self.rollups = RollupStore(self.backend.path)
+        self._restore_rollups()
+        
+        # NumPy column cache for /api/analytics, loaded on first use
+        self.analytics = Analytics(self)
+        
+        # Write-ahead journal of buffered rows (and the zone's pump commands)
+        self.journal: Optional[Journal] = None
+        if settings.JOURNAL_ENABLED:
+            self.journal = Journal(
+                f"{self.backend.path}.journal",
+                zone,
+                fsync=settings.JOURNAL_FSYNC,
+                sync_interval=settings.JOURNAL_SYNC_INTERVAL,
+                max_bytes=settings.JOURNAL_MAX_BYTES
+            )
+            self._journal_seq = self.journal.seq
+        
+        # Flushes rows that have waited LOG_FLUSH_INTERVAL when logging goes quiet
+        self._closing = Event()
+        self._flush_due = Event()  # Set by log_data once LOG_FLUSH_ROWS are pending
+        self._flush_thread = Thread(target=self._flush_loop, daemon=True)
+        self._flush_thread.start()
+        
+        if self.journal:
+            self._recover_rows()
+    
+    def _restore_stats(self):
+        """
+        Load the stats checkpoint and replay only rows written after it.
+        Falls back to a full replay if the checkpoint does not match the log.
+        """
+        cursor = self.stats.load_checkpoint()
+        row_count = self.backend.count()
+        
+        if (
+            cursor is None
+            or cursor > self.backend.end_cursor()
+            or self.stats.rows > row_count
+        ):
+            self.stats.reset()
+            cursor = None
+        
+        end = self._replay_stats(cursor)
+        
+        if self.stats.rows != row_count:
+            logger.warning("Stats checkpoint out of sync with log, rebuilding")
+            self.stats.reset()
+            end = self._replay_stats(None)
+        
+        self.stats.save_checkpoint(end)
     
-    def _ensure_file_exists(self):
-        """Create CSV file with headers if it doesn't exist"""
-        os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+    def _replay_stats(self, cursor: int = None) -> int:
+        """
+        Fold records from `cursor` (first record if None) into the aggregates
         
-        if not os.path.isfile(self.log_file):
-            with open(self.log_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    "timestamp", 
-                    "temp", 
-                    "humidity", 
-                    "soil_moisture", 
-                    "light_level",
-                    "pump_status"
-                ])
-            logger.info(f"Created log file: {self.log_file}")
+        Returns:
+            Cursor just past the last replayed record
+        """
+        end = cursor
+        for record, end in self.backend.iter_from(cursor):
+            self.stats.update(record)
+        
+        if end is None:
+            end = self.backend.end_cursor()
+        return end
+    
+    def _restore_rollups(self):
+        """Replay raw rows the rollup tiers have not closed buckets for yet"""
+        resume = self.rollups.resume_timestamp()
+        cursor = self.backend.cursor_for_timestamp(resume) if resume else None
+        
+        for record, _ in self.backend.iter_from(cursor):
+            self.rollups.add(record)
+        self.rollups.persist()
     
-    def log_data(self, sensor_data: Dict, pump_status: bool = False):
+    def _recover_rows(self):
+        """Buffer journaled rows that never reached storage (lost with the buffer on a crash)"""
+        rows = self.journal.rows
+        if not rows:
+            return
+        
+        # A crash between a batch write and its checkpoint leaves rows in
+        # both: the batch's first rows are as many as storage holds past
+        # the cursor it was written at (timestamps can't tell, the clock
+        # may have stepped back)
+        unfinished = self.journal.unfinished_store
+        if unfinished:
+            seq, cursor = unfinished
+            landed = sum(1 for _ in self.backend.iter_from(cursor))
+            landed = min(landed, sum(1 for row_seq, _ in rows if row_seq <= seq))
+            if landed:
+                self.journal.checkpoint(rows[landed - 1][0])
+                rows = rows[landed:]
+        
+        with self.lock:
+            for _, record in rows:
+                self._buffer(record)
+        if rows:
+            logger.warning(f"Recovered {len(rows)} unflushed rows from {self.journal.path}")
+            self._flush_due.set()
+    
+    def _buffer(self, record: Dict):
+        """Queue a record for the flush thread and fold it into the aggregates (call with `lock` held)"""
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        self._pending.append(record)
+        self._pending_rows.set(len(self._pending))
+        self.last_record = record
+        self._touch()
+        
+        self.stats.update(record)
+        self.rollups.add(record)
+    
+    def log_data(
+        self, sensor_data: Dict, pump_status: bool = False, timestamp: str = None, quality: int = 0
+    ):
         """
-        Append sensor data to CSV log
+        Buffer sensor data for the log. The flush thread writes rows to
+        storage in batches, once LOG_FLUSH_ROWS are pending or the oldest
+        is LOG_FLUSH_INTERVAL old, so callers never wait on disk I/O.
+        Rows are also journaled, so a crash cannot lose the buffer.
         
         Args:
             sensor_data: Dict with temp, hum, soil, light
             pump_status: Current pump on/off state
+            timestamp: Row time, "YYYY-MM-DD HH:MM:SS" (now if None)
+            quality: Quality flags of the row's samples (see services.quality)
         """
+        started = time.perf_counter()
         with self.lock:
+            self._lock_wait.observe(time.perf_counter() - started)
             try:
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                
-                row = [
-                    timestamp,
-                    sensor_data.get("temp", ""),
-                    sensor_data.get("hum", ""),
-                    sensor_data.get("soil", ""),
-                    sensor_data.get("light", ""),
-                    "ON" if pump_status else "OFF"
-                ]
-                
-                with open(self.log_file, 'a', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(row)
+                record = {
+                    "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "temp": _typed(sensor_data.get("temp"), float),
+                    "humidity": _typed(sensor_data.get("hum"), float),
+                    "soil_moisture": _typed(sensor_data.get("soil"), int),
+                    "light_level": _typed(sensor_data.get("light"), int),
+                    "pump_status": "ON" if pump_status else "OFF",
+                    "quality": quality
+                }
                 
-                logger.debug(f"Data logged: {row}")
+                self._buffer(record)
+                if self.journal:
+                    self._journal_seq = self.journal.append_row(record)
                 
+                logger.debug(f"Data logged: {record}")
+            
             except Exception as e:
                 logger.error(f"Failed to log data: {e}")
+                return
+            
+            due = len(self._pending) >= settings.LOG_FLUSH_ROWS
+        
+        if due:
+            self._flush_due.set()
+        self._log_seconds.observe(time.perf_counter() - started)
     
-    def get_history(self, limit: int = None) -> List[Dict]:
+    def _touch(self):
+        """Record a data change (call with `lock` held)"""
+        self.generation += 1
+        self.modified_at = time.time()
+    
+    def flush(self, blocking: bool = True) -> bool:
         """
-        Read historical data from CSV
+        Write buffered rows to the backend as one batch
         
         Args:
-            limit: Maximum number of records to return (most recent)
+            blocking: Wait for readers holding the flush lock
         
         Returns:
-            List of dictionaries containing sensor readings
+            False if the flush lock was busy and nothing was written
         """
-        if not os.path.isfile(self.log_file):
-            return []
+        started = time.perf_counter()
+        if not self.flush_lock.acquire(blocking=blocking):
+            return False
+        if blocking:
+            self._flush_lock_wait.observe(time.perf_counter() - started)
         
-        data = []
         try:
-            with open(self.log_file, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    data.append(row)
+            with self.lock:
+                batch = self._pending
+                self._pending = []
+                self._pending_since = None
+                seq = self._journal_seq
+            
+            if not batch:
+                return True
+            
+            if self.journal:
+                self.journal.storing(seq, self.backend.end_cursor(), sync=settings.LOG_FSYNC)
+            try:
+                with self._write_seconds.time():
+                    self.backend.append(batch, sync=settings.LOG_FSYNC)
+            except Exception as e:
+                self._write_errors.inc()
+                logger.error(f"Failed to flush {len(batch)} rows: {e}")
+                with self.lock:
+                    # Keep the rows for the next attempt
+                    self._pending = batch + self._pending
+                    self._pending_since = time.monotonic()
+                return False
+            
+            self._rows_written.inc(len(batch))
+            if self.journal:
+                self.journal.checkpoint(seq)
+            
+            # Closed rollup buckets are written here, off the logging path
+            self.rollups.persist()
+            
+            with self.lock:
+                self._pending_rows.set(len(self._pending))
+                # The checkpoint is only valid when nothing is left unflushed
+                checkpoint_due = (
+                    not self._pending
+                    and self.stats.rows % settings.STATS_CHECKPOINT_INTERVAL < len(batch)
+                )
+                if checkpoint_due:
+                    self.stats.save_checkpoint(self.backend.end_cursor())
+            
+            logger.debug(f"Flushed {len(batch)} rows")
+            return True
+        finally:
+            self.flush_lock.release()
+    
+    def _flush_loop(self):
+        """Background flushing (by row count or age) and hourly retention"""
+        interval = settings.LOG_FLUSH_INTERVAL
+        next_retention = time.monotonic()
+        while not self._closing.is_set():
+            due = self._flush_due.wait(min(interval, 1.0))
+            if self._closing.is_set():
+                break
+            self._flush_due.clear()
             
-            # Return most recent records
-            if limit:
-                data = data[-limit:]
+            with self.lock:
+                since = self._pending_since
+            if due or (since is not None and time.monotonic() - since >= interval):
+                self.flush()
             
+            if settings.LOG_RETENTION_DAYS > 0 and time.monotonic() >= next_retention:
+                self.apply_retention()
+                next_retention = time.monotonic() + RETENTION_CHECK_INTERVAL
+    
+    def _pending_snapshot(self) -> List[Dict]:
+        with self.lock:
+            return list(self._pending)
+    
+    def get_history(self, limit: int = None) -> List[Dict]:
+        """
+        Read historical data
+        
+        Args:
+            limit: Maximum number of records to return (most recent)
+        
+        Returns:
+            List of typed record dicts (see StorageBackend)
+        """
+        started = time.perf_counter()
+        try:
+            with self.flush_lock:
+                self._flush_lock_wait.observe(time.perf_counter() - started)
+                if limit:
+                    # Only decode the most recent records
+                    data = self.backend.tail(limit) + self._pending_snapshot()
+                    data = data[-limit:]
+                else:
+                    data = []
+                    for record, _ in self.backend.iter_from(None):
+                        data.append(record)
+                        if len(data) % cancellation.CHECK_EVERY == 0:
+                            cancellation.check()
+                    data += self._pending_snapshot()
+            
+            self._history_seconds.observe(time.perf_counter() - started)
             logger.debug(f"Retrieved {len(data)} historical records")
             return data
-            
+        
+        except cancellation.QueryCancelled:
+            raise
         except Exception as e:
             logger.error(f"Failed to read history: {e}")
             return []
     
-    def get_summary_stats(self) -> Dict:
-        """Calculate summary statistics from historical data"""
-        history = self.get_history()
+    def get_records(self, start: int, limit: int) -> List[Dict]:
+        """
+        Read a range of rows by position
         
-        if not history:
-            return {}
+        Args:
+            start: Zero-based row number of the first record
+            limit: Maximum number of records to return
         
+        Returns:
+            List of typed record dicts (see StorageBackend)
+        """
         try:
-            temps = [float(r["temp"]) for r in history if r["temp"]]
-            soils = [int(r["soil_moisture"]) for r in history if r["soil_moisture"]]
-            
-            return {
-                "total_records": len(history),
-                "avg_temperature": sum(temps) / len(temps) if temps else 0,
-                "avg_soil_moisture": sum(soils) / len(soils) if soils else 0,
-                "min_temperature": min(temps) if temps else 0,
-                "max_temperature": max(temps) if temps else 0,
-            }
+            with self.flush_lock:
+                data = self.backend.read_rows(start, limit)
+                if len(data) < limit:
+                    # The range runs past stored rows into the buffer
+                    skip = max(0, start - self.backend.count())
+                    data += self._pending_snapshot()[skip:skip + limit - len(data)]
+            return data
         except Exception as e:
-            logger.error(f"Failed to calculate stats: {e}")
-            return {}
+            logger.error(f"Failed to read records: {e}")
+            return []
     
-    def clear_old_logs(self, keep_last_n: int = 10000):
-        """Keep only the most recent N records"""
-        history = self.get_history()
+    def get_range(self, start: str, end: str, limit: int = None) -> List[Dict]:
+        """
+        Read raw records with timestamps in [start, end]
         
-        if len(history) <= keep_last_n:
-            return
+        Args:
+            start: Earliest timestamp, "YYYY-MM-DD HH:MM:SS"
+            end: Latest timestamp, "YYYY-MM-DD HH:MM:SS"
+            limit: Maximum number of records to return (oldest first)
+        
+        Returns:
+            List of typed record dicts (see StorageBackend)
+        """
+        data = []
+        try:
+            with self.flush_lock:
+                for record in self.backend.iter_range(start, end):
+                    data.append(record)
+                    if limit and len(data) >= limit:
+                        return data
+                    if len(data) % cancellation.CHECK_EVERY == 0:
+                        cancellation.check()
+                
+                for record in self._pending_snapshot():
+                    if start <= record["timestamp"] <= end:
+                        data.append(record)
+                        if limit and len(data) >= limit:
+                            break
+            return data
         
+        except cancellation.QueryCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to read range: {e}")
+            return []
+    
+    def iter_range(
+        self, start: str = None, end: str = None, batch_size: int = None
+    ) -> Iterator[List[Dict]]:
+        """
+        Stream records with timestamps in [start, end] in batches, for
+        exports of any size. `flush_lock` is only held while a batch is
+        read, so flushing carries on between batches; storage cursors stay
+        valid across appends, rotation and compaction.
+        
+        Args:
+            start: Earliest timestamp (first record if None)
+            end: Latest timestamp (last record if None)
+            batch_size: Records per batch (settings.EXPORT_BATCH_ROWS)
+        
+        Yields:
+            Non-empty lists of typed record dicts, oldest first
+        """
+        batch_size = batch_size or settings.EXPORT_BATCH_ROWS
+        with self.flush_lock:
+            cursor = self.backend.cursor_for_timestamp(start) if start else None
+        
+        while True:
+            batch = []
+            done = True
+            with self.flush_lock:
+                records = self.backend.iter_from(cursor)
+                try:
+                    for record, cursor in records:
+                        timestamp = record["timestamp"]
+                        if end and timestamp > end:
+                            break
+                        if start and timestamp < start:
+                            continue
+                        
+                        batch.append(record)
+                        if len(batch) >= batch_size:
+                            done = False
+                            break
+                    else:
+                        # Stored rows exhausted; buffered rows follow them
+                        batch += [
+                            record for record in self._pending_snapshot()
+                            if (not start or record["timestamp"] >= start)
+                            and (not end or record["timestamp"] <= end)
+                        ]
+                finally:
+                    records.close()
+            
+            if batch:
+                yield batch
+            if done:
+                return
+    
+    def query_history(
+        self, start: str, end: str, resolution: str = "auto", points: int = 500
+    ) -> Dict:
+        """
+        Time-range history at a rollup resolution
+        
+        Args:
+            start: Range start, date or timestamp
+            end: Range end, date or timestamp
+            resolution: "auto", "raw" or a rollup tier name (1m, 15m, 1h, 1d)
+            points: Target number of points; output is LTTB downsampled to it
+        
+        Returns:
+            Dict with the resolution used and a list of points holding
+            count, pump duty and min/max/mean per metric
+        """
+        start = normalize_timestamp(start)
+        end = normalize_timestamp(end)
+        
+        if resolution == "auto":
+            resolution = self.rollups.pick_resolution(start, end, points)
+        
+        if resolution == "raw":
+            data = [raw_to_point(record) for record in self.get_range(start, end)]
+        else:
+            data = self.rollups.tier(resolution).read(start, end)
+        
+        return {
+            "resolution": resolution,
+            "start": start,
+            "end": end,
+            "points": downsample_lttb(data, points)
+        }
+    
+    def get_summary_stats(self) -> Dict:
+        """Summary statistics from the running aggregates"""
         with self.lock:
+            return self.stats.summary()
+    
+    def _rebuild_stats(self):
+        """
+        Recompute the aggregates after old rows were removed. The replay
+        runs under `flush_lock` only, so log_data keeps buffering meanwhile.
+        """
+        stats = AggregateStore(self.stats.checkpoint_file)
+        for record, _ in self.backend.iter_from(None):
+            stats.update(record)
+        stats.save_checkpoint(self.backend.end_cursor())
+        
+        with self.lock:
+            # Rows buffered during the replay are not in the backend yet
+            for record in self._pending:
+                stats.update(record)
+            self.stats = stats
+            self.truncations += 1
+            self._touch()
+    
+    def _prune_rollups(self, cutoff: str = None):
+        """
+        Drop rollup buckets older than the oldest stored row, so the tiers
+        cover what the backend kept (down to `cutoff` if nothing is left)
+        """
+        records = self.backend.iter_from(None)
+        try:
+            first = next(records, None)
+        finally:
+            records.close()
+        
+        if first is not None:
+            cutoff = first[0]["timestamp"]
+        if cutoff is not None:
+            self.rollups.prune(cutoff)
+    
+    def clear_old_logs(self, keep_last_n: int = 10000):
+        """Keep only the most recent N records"""
+        self.flush()
+        
+        with self.flush_lock:
             try:
-                # Keep only recent records
-                recent = history[-keep_last_n:]
+                if self.backend.count() <= keep_last_n:
+                    return
                 
-                with open(self.log_file, 'w', newline='') as f:
-                    if recent:
-                        writer = csv.DictWriter(f, fieldnames=recent[0].keys())
-                        writer.writeheader()
-                        writer.writerows(recent)
+                self.backend.keep_last(keep_last_n)
+                self._prune_rollups()
+                self._rebuild_stats()
                 
-                logger.info(f"Cleared old logs, kept {len(recent)} records")
+                logger.info(f"Cleared old logs, kept {self.backend.count()} records")
+            except Exception as e:
+                logger.error(f"Failed to clear old logs: {e}")
+    
+    def apply_retention(self, days: int = None):
+        """
+        Delete stored data older than `days` (settings.LOG_RETENTION_DAYS)
+        
+        Returns:
+            Number of records dropped
+        """
+        days = days or settings.LOG_RETENTION_DAYS
+        if days <= 0:
+            return 0
+        
+        cutoff = datetime.fromtimestamp(time.time() - days * 86400)
+        cutoff = cutoff.strftime("%Y-%m-%d %H:%M:%S")
+        
+        with self.flush_lock:
+            try:
+                dropped = self.backend.drop_before(cutoff)
+                if dropped:
+                    self._prune_rollups(cutoff)
+                    self._rebuild_stats()
+                    logger.info(f"Retention dropped {dropped} records before {cutoff}")
+                return dropped
             except Exception as e:
-                logger.error(f"Failed to clear old logs: {e}")
\ No newline at end of file
+                logger.error(f"Failed to apply retention: {e}")
+                return 0
+    
+    def close(self):
+        """Flush buffered rows, checkpoint aggregates and release the backend"""
+        self._closing.set()
+        self._flush_due.set()
+        self._flush_thread.join(timeout=2)
+        
+        self.flush()
+        with self.lock:
+            if not self._pending:
+                self.stats.save_checkpoint(self.backend.end_cursor())
+            self.backend.close()
+        
+        if self.journal:
+            self.journal.close()
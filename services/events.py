@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+from threading import Lock
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event: str, data) -> str:
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class EventBroker:
+    """
+    Fans messages from publisher threads out to SSE subscribers on the
+    asyncio loop. Each message is encoded once, whatever the number of
+    subscribers; a subscriber that falls `max_queue` messages behind
+    is disconnected rather than buffered without bound.
+    """
+    
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self.lock = Lock()
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+    
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        """
+        Register a subscriber; must be called from the event loop
+        
+        Returns:
+            Queue of encoded messages, ending with None when the
+            subscriber is dropped or the broker closes
+        """
+        queue = asyncio.Queue(self.max_queue)
+        with self.lock:
+            self._subscribers.setdefault(channel, []).append(
+                (asyncio.get_running_loop(), queue)
+            )
+        return queue
+    
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        with self.lock:
+            subscribers = self._subscribers.get(channel, [])
+            self._subscribers[channel] = [s for s in subscribers if s[1] is not queue]
+    
+    def has_subscribers(self, channel: str) -> bool:
+        with self.lock:
+            return bool(self._subscribers.get(channel))
+    
+    def publish(self, channel: str, event: str, data):
+        """Send an event to every subscriber of `channel` (thread-safe)"""
+        with self.lock:
+            subscribers = list(self._subscribers.get(channel, []))
+        if not subscribers:
+            return
+        
+        message = format_sse(event, data)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, channel, queue, message)
+            except RuntimeError:
+                self.unsubscribe(channel, queue)  # Loop already closed
+    
+    def _offer(self, channel: str, queue: asyncio.Queue, message: str):
+        """Runs on the subscriber's loop"""
+        if queue.full():
+            logger.warning(f"Dropping slow stream subscriber on {channel}")
+            self.unsubscribe(channel, queue)
+            self._end(queue)
+        else:
+            queue.put_nowait(message)
+    
+    @staticmethod
+    def _end(queue: asyncio.Queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+    
+    def close(self):
+        """End every subscriber's stream"""
+        with self.lock:
+            subscribers = [s for channel in self._subscribers.values() for s in channel]
+            self._subscribers = {}
+        
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._end, queue)
+            except RuntimeError:
+                pass
@@ -0,0 +1,398 @@
+"""
+Write-ahead journal of a zone's logged rows and pump commands.
+
+Rows are buffered in memory for up to LOG_FLUSH_INTERVAL before they
+reach storage, and pump state otherwise lives only in memory. Each row
+and each pump command is also appended here, so after a crash or power
+cut the unflushed rows are logged again and an interrupted timed
+watering is resumed or cancelled.
+
+File layout: the magic bytes AGJ2, then records of
+
+    offset  size  field
+    0       4     CRC-32 of bytes 4.. of the record
+    4       1     type (ROW, CHECKPOINT, PUMP, STORING)
+    5       2     payload length, uint16
+    7       n     payload
+
+ROW payloads are a sequence number and a packed row (see ROW). Sequence
+numbers only grow, so unlike timestamps they survive the clock stepping
+back (a Pi without RTC syncing NTP after boot). CHECKPOINT holds the
+sequence number of the last row written to storage, STORING the last
+sequence number of a batch about to be written and the storage end
+cursor before it, PUMP holds (on, duration, wall-clock deadline).
+Recovery stops at the first torn or corrupt record and truncates the
+file there.
+
+Records are written as they come, so they survive the process dying.
+Against power loss they are fsynced in groups, at most
+JOURNAL_SYNC_INTERVAL seconds after they were written (JOURNAL_FSYNC
+syncs every record instead). Pump commands are always synced at once.
+
+Once the file outgrows JOURNAL_MAX_BYTES it is rewritten with just the
+latest pump command and the rows not yet in storage, so recovery time is
+bounded by that size rather than by how much history has been logged.
+"""
+import logging
+import os
+import struct
+import time
+import zlib
+from threading import Condition, Event, Lock, Thread
+from typing import Dict, List, Optional, Tuple
+
+from services import metrics
+from services.rollups import from_epoch, to_epoch
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AGJ2"
+HEADER = struct.Struct("<IBH")
+
+ROW_RECORD = 1
+CHECKPOINT_RECORD = 2
+PUMP_RECORD = 3
+STORING_RECORD = 4
+
+# seq, timestamp, temp, humidity, soil_moisture, light_level, pump on, quality
+ROW = struct.Struct("<QIddhhBH")
+CHECKPOINT = struct.Struct("<Q")
+STORING = struct.Struct("<QQ")
+PUMP = struct.Struct("<Bdd")
+
+# Seconds storing() waits for its record to reach the file
+STORING_TIMEOUT = 5.0
+
+INT16_NULL = -32768
+
+JOURNAL_SYNC_SECONDS = metrics.histogram(
+    "agri_journal_sync_seconds", "Journal fsync time per group commit", ["zone"]
+)
+JOURNAL_BYTES = metrics.gauge(
+    "agri_journal_bytes", "Size of the write-ahead journal file", ["zone"]
+)
+
+
+def _frame(kind: int, payload: bytes) -> bytes:
+    body = HEADER.pack(0, kind, len(payload))[4:] + payload
+    return struct.pack("<I", zlib.crc32(body)) + body
+
+
+def _pack_row(seq: int, record: Dict) -> bytes:
+    def real(value) -> float:
+        return float("nan") if value is None else value
+    
+    def int16(value) -> int:
+        return INT16_NULL if value is None else value
+    
+    return ROW.pack(
+        seq, to_epoch(record["timestamp"]),
+        real(record.get("temp")), real(record.get("humidity")),
+        int16(record.get("soil_moisture")), int16(record.get("light_level")),
+        1 if record.get("pump_status") == "ON" else 0,
+        record.get("quality") or 0
+    )
+
+
+def _unpack_row(payload: bytes) -> Tuple[int, Dict]:
+    seq, timestamp, temp, humidity, soil, light, pump, quality = ROW.unpack(payload)
+    return seq, {
+        "timestamp": from_epoch(timestamp),
+        "temp": None if temp != temp else temp,
+        "humidity": None if humidity != humidity else humidity,
+        "soil_moisture": None if soil == INT16_NULL else soil,
+        "light_level": None if light == INT16_NULL else light,
+        "pump_status": "ON" if pump else "OFF",
+        "quality": quality
+    }
+
+
+class Journal:
+    """
+    Append-only, checksummed journal file with a writer thread. Appends
+    only encode and queue the record, so the logging thread and the API
+    never wait on the disk. The writer thread writes everything queued
+    and fsyncs what it has written once `sync_interval` has passed
+    (group commit), or at once with `fsync` set or for pump commands.
+    
+    Opening the journal recovers its contents: `rows` holds the rows
+    after the last checkpoint as (seq, record), `unfinished_store` the
+    (seq, storage cursor) of a batch write that was never checkpointed,
+    and `pump_state` the last pump command.
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        zone: str = "default",
+        fsync: bool = False,
+        sync_interval: float = 30.0,
+        max_bytes: int = 1024 * 1024
+    ):
+        self.path = path
+        self.fsync = fsync
+        self.sync_interval = sync_interval
+        self.max_bytes = max_bytes
+        self._sync_seconds = JOURNAL_SYNC_SECONDS.labels(zone)
+        self._bytes = JOURNAL_BYTES.labels(zone)
+        
+        # Records still needed after a compaction, guarded by `_lock`: rows
+        # not yet in storage as (seq, frame), the STORING record of a batch
+        # not yet checkpointed, and the last pump command
+        self._lock = Lock()
+        self._tail: List[Tuple[int, bytes]] = []
+        self._storing_frame: Optional[bytes] = None
+        self._pump_frame: Optional[bytes] = None
+        self._queue = bytearray()  # Frames waiting for the writer thread
+        self._urgent = False  # The queue holds a frame to sync at once
+        
+        # Bytes ever queued and written, so storing() can wait for its record
+        self._queued_bytes = 0
+        self._written_bytes = 0
+        self._written = Condition(self._lock)
+        
+        self.seq = 0  # Sequence number of the latest row
+        self.unfinished_store: Optional[Tuple[int, int]] = None
+        self.pump_state: Optional[Dict] = None
+        self.recovery_seconds = 0.0
+        
+        started = time.perf_counter()
+        self._size = self._recover()
+        self.rows = [_unpack_row(frame[HEADER.size:]) for _, frame in self._tail]
+        self.recovery_seconds = time.perf_counter() - started
+        self._bytes.set(self._size)
+        
+        self._file = open(self.path, 'ab')
+        self._closing = False
+        self._wake = Event()
+        self._thread = Thread(target=self._write_loop, name="journal", daemon=True)
+        self._thread.start()
+    
+    def _recover(self) -> int:
+        """
+        Read the journal back, truncating a torn or corrupt tail
+        
+        Returns:
+            Size of the valid journal in bytes
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if not os.path.isfile(self.path):
+            self._rewrite([])
+            return len(MAGIC)
+        
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        
+        if data[:len(MAGIC)] != MAGIC:
+            logger.error(f"Journal {self.path} has an unknown format, starting a new one")
+            os.replace(self.path, f"{self.path}.corrupt")
+            self._rewrite([])
+            return len(MAGIC)
+        
+        pos = len(MAGIC)
+        rows = 0
+        while pos + HEADER.size <= len(data):
+            crc, kind, length = HEADER.unpack_from(data, pos)
+            end = pos + HEADER.size + length
+            if end > len(data) or zlib.crc32(data[pos + 4:end]) != crc:
+                break
+            
+            frame = data[pos:end]
+            payload = data[pos + HEADER.size:end]
+            if kind == ROW_RECORD:
+                seq = ROW.unpack_from(payload)[0]
+                self._tail.append((seq, frame))
+                self.seq = max(self.seq, seq)
+                rows += 1
+            elif kind == CHECKPOINT_RECORD:
+                seq = CHECKPOINT.unpack(payload)[0]
+                self._drop_stored(seq)
+                self._storing_frame = None
+                self.seq = max(self.seq, seq)
+            elif kind == STORING_RECORD:
+                self._storing_frame = frame
+                self.seq = max(self.seq, STORING.unpack(payload)[0])
+            elif kind == PUMP_RECORD:
+                self._pump_frame = frame
+            pos = end
+        
+        if pos < len(data):
+            logger.warning(f"Truncating {len(data) - pos} bytes of torn journal record from {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(pos)
+        
+        if self._storing_frame is not None:
+            self.unfinished_store = STORING.unpack(self._storing_frame[HEADER.size:])
+        
+        if self._pump_frame is not None:
+            on, duration, deadline = PUMP.unpack(self._pump_frame[HEADER.size:])
+            self.pump_state = {
+                "on": bool(on),
+                "duration": duration or None,
+                "deadline": deadline or None
+            }
+        
+        logger.info(
+            f"Journal {self.path}: replayed {rows} rows, {len(self._tail)} not yet in storage"
+        )
+        return pos
+    
+    def _drop_stored(self, seq: int):
+        """Forget rows up to `seq`, which storage now holds (call with `_lock` held)"""
+        keep = 0
+        while keep < len(self._tail) and self._tail[keep][0] <= seq:
+            keep += 1
+        del self._tail[:keep]
+    
+    def _rewrite(self, frames: List[bytes]):
+        """Atomically replace the file with the magic bytes and `frames`"""
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(MAGIC + b"".join(frames))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.path)
+        
+        # Make the rename itself durable
+        directory = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+    
+    def _append(self, frame: bytes):
+        """Queue a frame for the writer thread (call with `_lock` held)"""
+        self._queue += frame
+        self._queued_bytes += len(frame)
+        self._wake.set()
+    
+    def append_row(self, record: Dict) -> int:
+        """
+        Journal a row buffered for storage
+        
+        Returns:
+            The row's sequence number, for storing() and checkpoint()
+        """
+        with self._lock:
+            self.seq += 1
+            frame = _frame(ROW_RECORD, _pack_row(self.seq, record))
+            self._tail.append((self.seq, frame))
+            self._append(frame)
+            return self.seq
+    
+    def storing(self, seq: int, cursor: int, sync: bool = False):
+        """
+        Record that rows up to `seq` are about to be written to storage,
+        whose end cursor is `cursor`, and wait until that is in the file.
+        Should the process die before checkpoint(), recovery tells the rows
+        that landed by counting what storage holds past `cursor`.
+        
+        Args:
+            sync: Also fsync the record, for storage that is fsynced too
+        """
+        frame = _frame(STORING_RECORD, STORING.pack(seq, cursor))
+        with self._lock:
+            self._storing_frame = frame
+            self._urgent = self._urgent or sync
+            self._append(frame)
+            
+            target = self._queued_bytes
+            if not self._written.wait_for(lambda: self._written_bytes >= target, STORING_TIMEOUT):
+                logger.warning(f"Journal {self.path} is not keeping up; writing rows anyway")
+    
+    def checkpoint(self, seq: int):
+        """Record that storage holds every row up to sequence number `seq`"""
+        with self._lock:
+            self._drop_stored(seq)
+            self._storing_frame = None
+            self._append(_frame(CHECKPOINT_RECORD, CHECKPOINT.pack(seq)))
+    
+    def append_pump(self, on: bool, duration: float = None):
+        """Journal a pump command; timed runs also record their wall-clock deadline"""
+        deadline = time.time() + duration if duration else 0.0
+        frame = _frame(PUMP_RECORD, PUMP.pack(1 if on else 0, duration or 0.0, deadline))
+        with self._lock:
+            self._pump_frame = frame
+            self._urgent = True
+            self._append(frame)
+    
+    def _write_loop(self):
+        """Write queued frames and fsync them in groups, compacting once the file is too big"""
+        dirty_since = None  # When the oldest write not yet fsynced was made
+        while True:
+            timeout = None
+            if dirty_since is not None and self.sync_interval > 0:
+                timeout = max(0.0, dirty_since + self.sync_interval - time.monotonic())
+            self._wake.wait(timeout)
+            
+            with self._lock:
+                self._wake.clear()
+                data = bytes(self._queue)
+                self._queue.clear()
+                urgent = self._urgent
+                self._urgent = False
+                closing = self._closing
+                queued = self._queued_bytes
+                
+                # The snapshot covers every frame queued so far, `data` included
+                compact = None
+                if self._size + len(data) > self.max_bytes:
+                    compact = [
+                        frame for frame in (self._pump_frame, self._storing_frame) if frame
+                    ] + [frame for _, frame in self._tail]
+            
+            try:
+                if compact is not None:
+                    self._compact(compact)  # The rewrite is synced
+                    dirty_since = None
+                elif data:
+                    self._file.write(data)
+                    self._file.flush()
+                    self._size += len(data)
+                    if dirty_since is None:
+                        dirty_since = time.monotonic()
+                
+                due = self.fsync or urgent or closing or (
+                    self.sync_interval > 0 and dirty_since is not None
+                    and time.monotonic() - dirty_since >= self.sync_interval
+                )
+                if dirty_since is not None and due:
+                    with self._sync_seconds.time():
+                        os.fsync(self._file.fileno())
+                    dirty_since = None
+                self._bytes.set(self._size)
+                
+                with self._lock:
+                    self._written_bytes = queued
+                    self._written.notify_all()
+            except OSError as e:
+                logger.error(f"Failed to write journal {self.path}: {e}")
+            
+            if closing:
+                break
+    
+    def _compact(self, frames: List[bytes]):
+        """Start the file over with only the records recovery still needs"""
+        self._file.close()
+        self._rewrite(frames)
+        self._file = open(self.path, 'ab')
+        self._size = len(MAGIC) + sum(len(frame) for frame in frames)
+        logger.debug(f"Compacted journal {self.path} to {self._size} bytes")
+    
+    def get_status(self) -> Dict:
+        with self._lock:
+            unstored = len(self._tail)
+        return {
+            "bytes": self._size,
+            "unstored_rows": unstored,
+            "recovered_rows": len(self.rows),
+            "recovery_seconds": round(self.recovery_seconds, 4)
+        }
+    
+    def close(self):
+        """Write and sync everything queued, then stop the writer thread"""
+        with self._lock:
+            self._closing = True
+            self._wake.set()
+        self._thread.join(timeout=5)
+        self._file.close()
@@ -0,0 +1,256 @@
+"""
+In-process counters, gauges and histograms, exported at /metrics in the
+Prometheus text exposition format.
+
+Metrics are declared once at module level. Hot paths resolve their
+labelled series up front (`metric.labels(...)`), so an update costs one
+uncontended lock and, for histograms, a bisect over the bucket bounds.
+"""
+import math
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+WAIT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+DRIFT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if value != value:
+        return "NaN"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class _Timer:
+    """Context manager observing the seconds spent inside it"""
+    
+    __slots__ = ("_series", "_started")
+    
+    def __init__(self, series):
+        self._series = series
+    
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self._series.observe(time.perf_counter() - self._started)
+        return False
+
+class _CounterSeries:
+    __slots__ = ("value", "_lock")
+    
+    def __init__(self):
+        self.value = 0.0
+        self._lock = Lock()
+    
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+class _GaugeSeries:
+    __slots__ = ("value", "_lock")
+    
+    def __init__(self):
+        self.value = 0.0
+        self._lock = Lock()
+    
+    def set(self, value: float):
+        self.value = value
+    
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+    
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+class _HistogramSeries:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+    
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Per bucket, last is +Inf
+        self.sum = 0.0
+        self._lock = Lock()
+    
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+    
+    def time(self) -> _Timer:
+        return _Timer(self)
+    
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+class _Metric:
+    """A named metric holding one series per combination of label values"""
+    
+    kind = ""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = Lock()
+    
+    def _new_series(self):
+        raise NotImplementedError
+    
+    def labels(self, *values):
+        """Series for these label values, created on first use"""
+        key = tuple(str(value) for value in values)
+        series = self._series.get(key)
+        if series is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+    
+    def _items(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return sorted(self._series.items())
+    
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}"
+        ]
+        for values, series in self._items():
+            lines.extend(self._render_series(values, series))
+        return lines
+    
+    def _render_series(self, values: Tuple[str, ...], series) -> List[str]:
+        return [f"{self.name}{_label_text(self.labelnames, values)} {_format_value(series.value)}"]
+
+class Counter(_Metric):
+    kind = "counter"
+    
+    def _new_series(self):
+        return _CounterSeries()
+    
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+class Gauge(_Metric):
+    kind = "gauge"
+    
+    def _new_series(self):
+        return _GaugeSeries()
+    
+    def set(self, value: float):
+        self.labels().set(value)
+
+class Histogram(_Metric):
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+    
+    def observe(self, value: float):
+        self.labels().observe(value)
+    
+    def time(self) -> _Timer:
+        return self.labels().time()
+    
+    def _render_series(self, values: Tuple[str, ...], series) -> List[str]:
+        counts, total = series.snapshot()
+        names = self.labelnames + ("le",)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            labels = _label_text(names, values + (_format_value(bound),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _label_text(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    """Metrics by name, rendered together for /metrics"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = Lock()
+    
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        Add a metric, or return the one already registered under its name
+        
+        Raises:
+            ValueError: The name is taken by a different kind of metric
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+            raise ValueError(f"Metric {metric.name} already registered differently")
+        return existing
+    
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Optional[Sequence[float]] = None
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets or LATENCY_BUCKETS))
+
+def render() -> str:
+    """Every registered metric in the Prometheus text format"""
+    return REGISTRY.render()
@@ -0,0 +1,260 @@
+"""
+Streaming sensor-fault and anomaly detection on the ingest path.
+
+Every raw sample is checked per metric as it arrives from the serial
+reader, with constant memory per metric:
+
+    range    outside the sensor's physical range (e.g. soil 1022 from a
+             disconnected probe)
+    stuck    value unchanged for QUALITY_STUCK_SECONDS (a frozen DHT)
+    rate     changed faster than QUALITY_MAX_RATE units per second
+    outlier  robust z-score above QUALITY_Z_LIMIT against an
+             exponentially weighted mean and mean absolute deviation
+
+The result is a 16-bit quality mask, 4 bits per metric in FIELDS order
+(bit = metric index * 4 + check index), 0 for a clean sample. Flagged
+samples are kept out of logged interval means, and each logged row
+stores the OR of its samples' masks in its `quality` column.
+"""
+import logging
+import time
+from threading import Lock
+from typing import Dict, Iterable, List, Optional
+
+from config.settings import settings
+from hardware.sample_buffer import FIELDS
+
+logger = logging.getLogger(__name__)
+
+CHECKS = ["range", "stuck", "rate", "outlier"]
+
+# Floor on the time between samples for rate checks; readings parsed from
+# one serial chunk share a timestamp
+MIN_RATE_INTERVAL = 1.0
+
+# Rate-flagged samples in a row after which the new level is accepted
+RATE_RESET = 3
+
+# Samples before the outlier check has learned enough to flag
+OUTLIER_WARMUP = 20
+
+# Clean samples in a row before an active alert is cleared
+CLEAR_SAMPLES = 10
+
+# Mean absolute deviation to standard deviation, for normal noise
+MAD_TO_SIGMA = 1.2533
+
+
+def describe(mask: int) -> List[Dict]:
+    """Flags set in a quality mask, as {"metric", "check"} dicts"""
+    return [
+        {"metric": key, "check": check}
+        for i, key in enumerate(FIELDS)
+        for j, check in enumerate(CHECKS)
+        if mask >> (i * 4 + j) & 1
+    ]
+
+
+def episodes(records: Iterable[Dict], limit: int = None) -> List[Dict]:
+    """
+    Runs of consecutive logged rows flagged by the same check
+    
+    Args:
+        records: Typed records, oldest first
+        limit: Keep only the most recent episodes
+    
+    Returns:
+        Dicts with metric, check, start and end timestamps and rows, oldest first
+    """
+    found = []
+    current: Dict[int, Dict] = {}  # Open episode per mask bit
+    previous = 0
+    
+    for record in records:
+        mask = record.get("quality") or 0
+        if mask != previous:
+            for i in [i for i in current if not mask >> i & 1]:
+                del current[i]
+            started = mask & ~previous
+            for i in range(len(FIELDS) * 4):
+                if started >> i & 1:
+                    current[i] = {
+                        "metric": FIELDS[i // 4],
+                        "check": CHECKS[i % 4],
+                        "start": record["timestamp"],
+                        "end": record["timestamp"],
+                        "rows": 0
+                    }
+                    found.append(current[i])
+            previous = mask
+        
+        for episode in current.values():
+            episode["end"] = record["timestamp"]
+            episode["rows"] += 1
+    
+    return found[-limit:] if limit else found
+
+
+class MetricState:
+    """Detector state for one metric: a few numbers, whatever the sample rate"""
+    
+    __slots__ = (
+        "key", "shift", "low", "high", "stuck_after", "max_rate", "z_floor", "z_sigma", "alpha",
+        "last", "changed_at", "ref", "ref_at", "rejects", "center", "mad", "seen", "active"
+    )
+    
+    def __init__(self, key: str, shift: int):
+        self.key = key
+        self.shift = shift  # Position of the metric's flags in the sample mask
+        
+        limits = settings.QUALITY_RANGES.get(key)
+        self.low, self.high = limits if limits else (float("-inf"), float("inf"))
+        self.stuck_after = settings.QUALITY_STUCK_SECONDS.get(key)
+        self.max_rate = settings.QUALITY_MAX_RATE.get(key)
+        
+        # Outlier limit: QUALITY_Z_LIMIT deviations, the deviation floored at QUALITY_MIN_SCALE
+        min_scale = settings.QUALITY_MIN_SCALE.get(key)
+        self.z_floor = None if min_scale is None else settings.QUALITY_Z_LIMIT * min_scale
+        self.z_sigma = settings.QUALITY_Z_LIMIT * MAD_TO_SIGMA
+        self.alpha = 1 / max(1, settings.QUALITY_WINDOW)
+        
+        self.last: Optional[float] = None  # Stuck check: value and when it last changed
+        self.changed_at = 0.0
+        self.ref: Optional[float] = None  # Rate check: last accepted value
+        self.ref_at = 0.0
+        self.rejects = 0
+        self.center: Optional[float] = None  # Outlier check: weighted mean and MAD
+        self.mad = 0.0
+        self.seen = 0
+        
+        self.active: Dict[str, Dict] = {}  # Raised alerts by check
+    
+    def check(self, value: float, now: float) -> int:
+        """Flags (check bits 0-3) for one value"""
+        if value < self.low or value > self.high:
+            return 1  # Out of range: skip the rest and leave the state untouched
+        
+        flags = 0
+        
+        if self.stuck_after is not None:
+            if value != self.last:
+                self.last = value
+                self.changed_at = now
+            elif now - self.changed_at >= self.stuck_after:
+                flags = 2
+        
+        if self.max_rate is not None:
+            if self.ref is not None:
+                elapsed = now - self.ref_at
+                allowed = self.max_rate * (elapsed if elapsed > MIN_RATE_INTERVAL else MIN_RATE_INTERVAL)
+                if abs(value - self.ref) > allowed:
+                    flags |= 4
+                    self.rejects += 1
+            if not flags & 4 or self.rejects >= RATE_RESET:
+                self.ref = value
+                self.ref_at = now
+                self.rejects = 0
+        
+        if self.z_floor is not None:
+            center = value if self.center is None else self.center
+            mad = self.mad
+            limit = mad * self.z_sigma
+            if limit < self.z_floor:
+                limit = self.z_floor
+            
+            # Clipped update: an outlier moves the estimates by a bounded step
+            residual = value - center
+            if residual > limit or residual < -limit:
+                if self.seen >= OUTLIER_WARMUP:
+                    flags |= 8
+                residual = limit if residual > 0 else -limit
+            if self.seen < OUTLIER_WARMUP:
+                self.seen += 1
+            
+            alpha = self.alpha
+            self.center = center + alpha * residual
+            self.mad = mad + alpha * (abs(residual) - mad)
+        
+        return flags
+
+
+class QualityMonitor:
+    """
+    Runs the checks on one device's samples (on its reader thread) and
+    keeps the alerts currently raised. An alert is raised the first time
+    a check flags a metric and cleared after CLEAR_SAMPLES clean readings.
+    """
+    
+    def __init__(self, source: str = "default"):
+        self.source = source
+        self.enabled = settings.QUALITY_ENABLED
+        self.metrics = [MetricState(key, 4 * i) for i, key in enumerate(FIELDS)]
+        self.flagged = 0  # Samples with any flag
+        self._lock = Lock()  # Guards the active alerts against get_active()
+    
+    def check(self, data: Dict, now: float = None) -> int:
+        """
+        Quality mask for one sample
+        
+        Args:
+            data: Dict with temp, hum, soil, light (None values are not checked)
+            now: Unix time of the sample (defaults to now)
+        """
+        if not self.enabled:
+            return 0
+        
+        now = time.time() if now is None else now
+        mask = 0
+        for state in self.metrics:
+            value = data.get(state.key)
+            if value is None:
+                continue
+            flags = state.check(value, now)
+            if flags or state.active:
+                self._track(state, flags, value, now)
+            mask |= flags << state.shift
+        
+        if mask:
+            self.flagged += 1
+        return mask
+    
+    def _track(self, state: MetricState, flags: int, value: float, now: float):
+        """Raise, refresh or clear alerts for one metric"""
+        with self._lock:
+            for j, check in enumerate(CHECKS):
+                alert = state.active.get(check)
+                if flags >> j & 1:
+                    if alert is None:
+                        state.active[check] = {
+                            "since": now, "last": now, "samples": 1, "value": value, "clean": 0
+                        }
+                        logger.warning(
+                            f"Sensor {state.key} on {self.source} failed {check} check (value: {value})"
+                        )
+                    else:
+                        alert.update(last=now, value=value, clean=0)
+                        alert["samples"] += 1
+                elif alert is not None:
+                    alert["clean"] += 1
+                    if alert["clean"] >= CLEAR_SAMPLES:
+                        del state.active[check]
+                        logger.info(f"Sensor {state.key} on {self.source} passes {check} check again")
+    
+    def get_active(self) -> List[Dict]:
+        """Alerts currently raised, as metric, check, since, last_seen, samples and value"""
+        def stamp(t: float) -> str:
+            return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+        
+        with self._lock:
+            return [
+                {
+                    "metric": state.key,
+                    "check": check,
+                    "since": stamp(alert["since"]),
+                    "last_seen": stamp(alert["last"]),
+                    "samples": alert["samples"],
+                    "value": alert["value"]
+                }
+                for state in self.metrics
+                for check, alert in state.active.items()
+            ]
@@ -0,0 +1,404 @@
+import calendar
+import csv
+import os
+import shutil
+import time
+import logging
+from threading import Lock
+from typing import Dict, List, Optional
+
+from services.aggregates import METRICS
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Rollup tiers as (name, bucket width in seconds), finest first
+TIERS = [
+    ("1m", 60),
+    ("15m", 15 * 60),
+    ("1h", 60 * 60),
+    ("1d", 24 * 60 * 60)
+]
+
+ROLLUP_FIELDNAMES = ["timestamp", "count", "pump_duty"] + [
+    f"{metric}_{agg}" for metric in METRICS for agg in ("min", "max", "mean")
+]
+
+
+def to_epoch(timestamp: str) -> int:
+    """
+    Convert a log timestamp to seconds. Log timestamps are local wall
+    clock, so they are treated as UTC to keep buckets on local boundaries.
+    """
+    if len(timestamp) != 19:
+        raise ValueError(f"Bad timestamp: {timestamp!r}")
+    # Slicing is much cheaper than strptime when replaying large logs
+    return calendar.timegm((
+        int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10]),
+        int(timestamp[11:13]), int(timestamp[14:16]), int(timestamp[17:19])
+    ))
+
+
+def from_epoch(seconds: int) -> str:
+    """Inverse of to_epoch"""
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(seconds))
+
+
+def normalize_timestamp(value: str) -> str:
+    """Accept 'YYYY-MM-DD', 'YYYY-MM-DD HH:MM[:SS]' or ISO 'T' separated input"""
+    value = value.strip().replace("T", " ")
+    if len(value) == 10:
+        value += " 00:00:00"
+    elif len(value) == 16:
+        value += ":00"
+    return from_epoch(to_epoch(value[:19]))
+
+
+class Bucket:
+    """Min/max/sum/count per metric for one time bucket"""
+    
+    def __init__(self, start: int):
+        self.start = start
+        self.count = 0
+        self.pump_on = 0
+        self.values: Dict[str, List[float]] = {}  # metric -> [min, max, sum, n]
+    
+    def add(self, record: Dict):
+        self.count += 1
+        if record.get("pump_status") == "ON":
+            self.pump_on += 1
+        
+        for metric in METRICS:
+            value = record.get(metric)
+            if value is None or value == "":
+                continue
+            try:
+                value = float(value)
+            except ValueError:
+                continue
+            
+            agg = self.values.get(metric)
+            if agg is None:
+                self.values[metric] = [value, value, value, 1]
+            else:
+                agg[0] = min(agg[0], value)
+                agg[1] = max(agg[1], value)
+                agg[2] += value
+                agg[3] += 1
+    
+    def to_point(self) -> Dict:
+        """Bucket as a history point dict (see ROLLUP_FIELDNAMES)"""
+        point = {
+            "timestamp": from_epoch(self.start),
+            "count": self.count,
+            "pump_duty": self.pump_on / self.count if self.count else None
+        }
+        for metric in METRICS:
+            agg = self.values.get(metric)
+            point[f"{metric}_min"] = agg[0] if agg else None
+            point[f"{metric}_max"] = agg[1] if agg else None
+            point[f"{metric}_mean"] = agg[2] / agg[3] if agg else None
+        return point
+
+
+def _point_from_row(row: Dict) -> Dict:
+    """Convert a rollup CSV row back to typed values"""
+    point = {"timestamp": row["timestamp"], "count": int(row["count"])}
+    for key in ROLLUP_FIELDNAMES[2:]:
+        point[key] = float(row[key]) if row[key] != "" else None
+    return point
+
+
+def _seek_timestamp(f, target: str, data_start: int):
+    """
+    Binary search a timestamp-sorted CSV opened in binary mode and leave
+    the file positioned at the first row with timestamp >= target
+    """
+    size = os.fstat(f.fileno()).st_size
+    encoded = target.encode('utf-8')
+    
+    def seek_line(pos: int):
+        # Position at the first line starting at or after pos
+        if pos > data_start:
+            f.seek(pos - 1)
+            f.readline()
+        else:
+            f.seek(data_start)
+    
+    lo, hi = data_start, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        seek_line(mid)
+        line = f.readline()
+        if not line or line.split(b",", 1)[0] >= encoded:
+            hi = mid
+        else:
+            lo = mid + 1
+    
+    seek_line(lo)
+
+
+def _last_line(path: str) -> Optional[bytes]:
+    """Last complete line of a file, or None if it has no data rows"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 4096))
+        lines = f.read().split(b"\n")
+    
+    # Drop the empty/torn tail and require something past the header
+    lines.pop()
+    if not lines or (size <= 4096 and len(lines) < 2):
+        return None
+    return lines[-1]
+
+
+class RollupTier:
+    """
+    One rollup resolution, persisted as an append-only CSV of closed
+    buckets. add() only touches memory: closed buckets wait in `_closed`
+    until persist() appends them, so the logging path never writes the
+    file. `lock` guards the open bucket and `_closed`; readers copy them
+    under it and read the file without it.
+    """
+    
+    def __init__(self, name: str, width: int, path: str):
+        self.name = name
+        self.width = width
+        self.path = path
+        self.lock = Lock()
+        self.bucket: Optional[Bucket] = None
+        self.last_closed: Optional[int] = None
+        self._closed: List[Dict] = []  # Closed bucket points not yet in the file
+        self._ensure_file_exists()
+    
+    def _ensure_file_exists(self):
+        if not os.path.isfile(self.path):
+            with open(self.path, 'w', newline='') as f:
+                csv.writer(f).writerow(ROLLUP_FIELDNAMES)
+            return
+        
+        line = _last_line(self.path)
+        if line:
+            self.last_closed = to_epoch(line.split(b",", 1)[0].decode('utf-8'))
+    
+    @property
+    def resume_epoch(self) -> Optional[int]:
+        """Earliest raw timestamp not yet covered by a closed bucket"""
+        if self.last_closed is None:
+            return None
+        return self.last_closed + self.width
+    
+    def add(self, epoch: int, record: Dict):
+        """Fold one raw record into the open bucket, closing it when time moves on"""
+        resume = self.resume_epoch
+        if resume is not None and epoch < resume:
+            return  # Already covered by a closed bucket
+        
+        start = epoch - epoch % self.width
+        
+        with self.lock:
+            if self.bucket is not None and start > self.bucket.start:
+                self._closed.append(self.bucket.to_point())
+                self.last_closed = self.bucket.start
+                self.bucket = None
+            
+            if self.bucket is None:
+                self.bucket = Bucket(start)
+            
+            # Rows from a clock that stepped backwards stay in the open bucket
+            self.bucket.add(record)
+    
+    def persist(self):
+        """Append closed buckets to the file (on the flush thread; one writer at a time)"""
+        with self.lock:
+            points = list(self._closed)
+        if not points:
+            return
+        
+        with open(self.path, 'a', newline='') as f:
+            size = f.tell()
+            try:
+                writer = csv.DictWriter(f, fieldnames=ROLLUP_FIELDNAMES)
+                writer.writerows(points)
+                f.flush()
+            except OSError:
+                f.truncate(size)  # Keep the points for the next attempt, without a partial copy
+                raise
+        
+        with self.lock:
+            del self._closed[:len(points)]
+    
+    def prune(self, cutoff: str):
+        """
+        Drop closed buckets that end at or before `cutoff`, i.e. hold only
+        deleted raw rows (on the flush thread, like persist). The file is
+        rewritten aside and swapped in, so readers see the old or new copy.
+        """
+        keep_from = from_epoch(to_epoch(cutoff) - self.width + 1)
+        with self.lock:
+            self._closed = [point for point in self._closed if point["timestamp"] >= keep_from]
+        
+        tmp_file = f"{self.path}.tmp"
+        with open(self.path, 'rb') as f_in:
+            header = f_in.readline()
+            _seek_timestamp(f_in, keep_from, len(header))
+            if f_in.tell() == len(header):
+                return  # Nothing to drop
+            
+            with open(tmp_file, 'wb') as f_out:
+                f_out.write(header)
+                shutil.copyfileobj(f_in, f_out)
+        os.replace(tmp_file, self.path)
+    
+    def read(self, start: str, end: str) -> List[Dict]:
+        """Closed and open buckets with start timestamp in [start, end]"""
+        # Copy the in-memory buckets first: any of them persisted while
+        # the file is read shows up in both, and is skipped below
+        with self.lock:
+            pending = list(self._closed)
+            if self.bucket is not None:
+                pending.append(self.bucket.to_point())
+        
+        points = []
+        with open(self.path, 'rb') as f:
+            f.readline()  # Skip header
+            data_start = f.tell()
+            _seek_timestamp(f, start, data_start)
+            
+            lines = []
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if line.split(b",", 1)[0].decode('utf-8') > end:
+                    break
+                lines.append(line.decode('utf-8'))
+        
+        for row in csv.DictReader(lines, fieldnames=ROLLUP_FIELDNAMES):
+            points.append(_point_from_row(row))
+        
+        last = points[-1]["timestamp"] if points else ""
+        points += [
+            point for point in pending
+            if start <= point["timestamp"] <= end and point["timestamp"] > last
+        ]
+        return points
+
+
+class RollupStore:
+    """
+    All rollup tiers for one sensor log, in sidecar files named after
+    the backend's full path (like its .stats and .journal), so stores of
+    different backends for the same zone never share tiers
+    """
+    
+    def __init__(self, data_path: str):
+        self.tiers = [
+            RollupTier(name, width, f"{data_path}.rollup_{name}.csv")
+            for name, width in TIERS
+        ]
+    
+    def add(self, record: Dict):
+        """Fold one raw log record into every tier"""
+        try:
+            epoch = to_epoch(record["timestamp"])
+        except (KeyError, ValueError):
+            logger.warning(f"Skipping record with bad timestamp: {record}")
+            return
+        
+        for tier in self.tiers:
+            tier.add(epoch, record)
+    
+    def persist(self):
+        """Write closed buckets of every tier, logging rather than raising on failure"""
+        for tier in self.tiers:
+            try:
+                tier.persist()
+            except OSError as e:
+                logger.error(f"Failed to write rollup tier {tier.name}: {e}")
+    
+    def prune(self, cutoff: str):
+        """Drop buckets of every tier whose raw rows are all older than `cutoff`"""
+        for tier in self.tiers:
+            try:
+                tier.prune(cutoff)
+            except OSError as e:
+                logger.error(f"Failed to prune rollup tier {tier.name}: {e}")
+    
+    def resume_timestamp(self) -> Optional[str]:
+        """
+        Earliest raw timestamp any tier still needs replayed on startup,
+        or None if some tier has never been built
+        """
+        resumes = [tier.resume_epoch for tier in self.tiers]
+        if any(resume is None for resume in resumes):
+            return None
+        return from_epoch(min(resumes))
+    
+    def tier(self, name: str) -> RollupTier:
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        raise ValueError(f"Unknown resolution: {name}")
+    
+    def pick_resolution(self, start: str, end: str, points: int) -> str:
+        """Coarsest tier that still yields at least `points` buckets, else raw"""
+        span = to_epoch(end) - to_epoch(start)
+        resolution = "raw"
+        for name, width in TIERS:
+            if span / width >= points:
+                resolution = name
+        return resolution
+
+
+def raw_to_point(record: Dict) -> Dict:
+    """Express a raw log record in the rollup point layout"""
+    bucket = Bucket(to_epoch(record["timestamp"]))
+    bucket.add(record)
+    point = bucket.to_point()
+    point["timestamp"] = record["timestamp"]
+    return point
+
+
+def downsample_lttb(points: List[Dict], threshold: int, y_key: str = "temp_mean") -> List[Dict]:
+    """
+    Largest-Triangle-Three-Buckets downsampling, keeping the points that
+    best preserve the visual shape of `y_key` over time
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return points
+    
+    xs = [to_epoch(p["timestamp"]) for p in points]
+    ys = [p.get(y_key) or 0.0 for p in points]
+    
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(max(int((i + 2) * every) + 1, next_start + 1), n)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+        
+        # Pick the point in this bucket with the largest triangle area
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs(
+                (xs[a] - avg_x) * (ys[j] - ys[a])
+                - (xs[a] - xs[j]) * (avg_y - ys[a])
+            )
+            if area > best_area:
+                best, best_area = j, area
+        
+        sampled.append(points[best])
+        a = best
+    
+    sampled.append(points[-1])
+    return sampled
@@ -1,92 +1,147 @@
 import logging
-import time
-from threading import Thread, Event
-from typing import Optional, Dict
+from threading import Event, Thread
+from typing import Dict, Optional
 from hardware.arduino_reader import ArduinoReader
 from hardware.pump_controller import PumpController
-from services.data_logger import DataLogger
+from hardware.simulated import SimulatedFarm
+from services.events import EventBroker
+from services.zone import Zone
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
 class SensorService:
-    """Main service coordinating sensors, pump, and logging"""
+    """
+    Main service coordinating sensors, pumps, and logging across zones.
+    Devices and zones come from settings (see Settings.zone_configs); the
+    first zone is the default for requests that do not name one.
+    
+    Construction only wires things up: serial ports connect on the reader
+    threads, GPIO is set up on the pump scheduler and each zone opens its
+    storage on its logging thread, so the API is up before any of them
+    (see get_readiness).
+    """
     
     def __init__(self):
-        self.arduino = ArduinoReader()
-        self.pump = PumpController()
-        self.logger = DataLogger()
+        # Off the Pi, virtual boards on ptys stand in for the configured devices
+        ports = settings.device_ports()
+        self.farm: Optional[SimulatedFarm] = None
+        if settings.hardware_backend() != "real":
+            self.farm = SimulatedFarm(
+                rate=settings.SIM_RATE,
+                device_ids=list(ports),
+                replay=settings.REPLAY_FILE if settings.HARDWARE_BACKEND == "replay" else None,
+                protocol=settings.SIM_PROTOCOL
+            )
+            ports = self.farm.devices()
+            self.farm.start()
         
-        self.current_data: Dict = {
-            "temp": None,
-            "hum": None,
-            "soil": None,
-            "light": None,
-            "timestamp": None
+        # One reader thread per serial port, shared by the zones wired to it
+        self.devices: Dict[str, ArduinoReader] = {
+            device_id: ArduinoReader(port) for device_id, port in ports.items()
         }
         
-        self.running = Event()
-        self.log_thread: Optional[Thread] = None
+        self.zones: Dict[str, Zone] = {}
+        for zone_id, config in settings.zone_configs().items():
+            pin = config.get("pump_pin")
+            self.zones[zone_id] = Zone(
+                zone_id,
+                config["device"],
+                self.devices[config["device"]],
+                PumpController(pin) if pin is not None else None
+            )
         
-    def start_logging_loop(self):
-        """Start background thread for periodic data logging"""
-        self.running.set()
-        self.log_thread = Thread(target=self._logging_loop, daemon=True)
-        self.log_thread.start()
-        logger.info("Started periodic logging loop")
+        # Default zone, kept under the single-zone attribute names
+        self.default_zone = next(iter(self.zones.values()))
+        self.arduino = self.default_zone.arduino
+        self.pump = self.default_zone.pump
+        
+        # Single publisher feeding every /api/stream viewer
+        self.events = EventBroker(settings.STREAM_QUEUE_SIZE)
+        self._stop_publishing = Event()
+        self.publish_thread: Optional[Thread] = None
     
-    def _logging_loop(self):
-        """Background loop that reads and logs data periodically"""
-        while self.running.is_set():
-            # Read current sensor data
-            data = self.arduino.read_sensor_data()
-            
-            if data:
-                self.current_data = {
-                    **data,
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-                }
-                
-                # Log to CSV
-                self.logger.log_data(data, self.pump.is_on)
-                
-                # Check for auto-watering conditions
-                if settings.AUTO_WATER_ENABLED:
-                    self._check_auto_water(data)
-            
-            # Wait for next logging interval
-            time.sleep(settings.LOG_INTERVAL)
+    @property
+    def logger(self):
+        """Default zone's DataLogger (None until its storage is open)"""
+        return self.default_zone.logger
     
-    def _check_auto_water(self, data: Dict):
-        """Check if auto-watering should trigger"""
-        soil = data.get("soil")
+    def zone(self, zone_id: str = None) -> Zone:
+        """
+        Look up a zone
         
-        if soil is None:
-            return
+        Args:
+            zone_id: Zone id, or None for the default zone
         
-        # If soil is dry and pump is not already on
-        if soil < settings.SOIL_DRY_THRESHOLD and not self.pump.is_on:
-            logger.info(f"Auto-watering triggered (soil: {soil})")
-            self.pump.turn_on_for_duration(settings.AUTO_WATER_DURATION)
+        Raises:
+            KeyError: Unknown zone id
+        """
+        if zone_id is None:
+            return self.default_zone
+        if zone_id not in self.zones:
+            raise KeyError(f"Unknown zone: {zone_id}")
+        return self.zones[zone_id]
     
-    def get_current_data(self) -> Dict:
-        """Get latest sensor readings"""
-        # Try to get fresh data
-        fresh_data = self.arduino.read_sensor_data()
-        if fresh_data:
-            self.current_data = {
-                **fresh_data,
-                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-            }
+    def start_logging_loop(self):
+        """Start one logging thread per zone"""
+        for zone in self.zones.values():
+            zone.start()
+        logger.info(f"Started periodic logging for {len(self.zones)} zone(s)")
+        
+        self.publish_thread = Thread(target=self._publish_loop, daemon=True)
+        self.publish_thread.start()
+    
+    def _publish_loop(self):
+        """Push zone changes to stream subscribers, once per STREAM_INTERVAL"""
+        while not self._stop_publishing.wait(settings.STREAM_INTERVAL):
+            for zone in self.zones.values():
+                try:
+                    events = zone.poll_events()
+                    if self.events.has_subscribers(zone.id):
+                        for event, data in events:
+                            self.events.publish(zone.id, event, data)
+                except Exception as e:
+                    logger.error(f"Failed to publish events for zone {zone.id}: {e}")
+    
+    def get_current_data(self, zone_id: str = None) -> Dict:
+        """Get latest sensor readings from the reader cache (never blocks on serial)"""
+        return self.zone(zone_id).get_current_data()
+    
+    def get_live_samples(self, since: int = 0, limit: int = 1000, zone_id: str = None) -> Dict:
+        """Raw samples from a zone's ring buffer (see Zone.get_live_samples)"""
+        return self.zone(zone_id).get_live_samples(since, limit)
+    
+    def get_zones(self) -> Dict:
+        """Wiring and latest readings of every zone"""
+        return {"zones": [zone.get_info() for zone in self.zones.values()]}
+    
+    def get_readiness(self) -> Dict:
+        """
+        Startup progress per subsystem
         
-        return self.current_data
+        Returns:
+            Dict with ready (everything up), devices (serial connection
+            state by device id) and zones (storage and pump by zone id)
+        """
+        devices = {device_id: reader.get_status() for device_id, reader in self.devices.items()}
+        zones = {zone_id: zone.get_readiness() for zone_id, zone in self.zones.items()}
+        ready = all(device["ready"] for device in devices.values()) and all(
+            zone["storage"]["ready"] and (zone["pump"] is None or zone["pump"]["ready"])
+            for zone in zones.values()
+        )
+        return {"ready": ready, "devices": devices, "zones": zones}
     
-    def get_system_status(self) -> Dict:
+    def get_system_status(self, zone_id: str = None) -> Dict:
         """Get complete system status"""
+        zone = self.zone(zone_id)
         return {
-            "sensors": self.current_data,
-            "pump": self.pump.get_status(),
+            "zone": zone.id,
+            "readiness": self.get_readiness(),
+            "sensors": zone.get_current_data(),
+            "pump": zone.pump.get_status() if zone.pump else None,
             "auto_water_enabled": settings.AUTO_WATER_ENABLED,
+            "watering": zone.watering.get_status() if zone.watering else None,
+            "logging": zone.ticker.get_status() if zone.ticker else None,
             "settings": {
                 "soil_dry_threshold": settings.SOIL_DRY_THRESHOLD,
                 "soil_wet_threshold": settings.SOIL_WET_THRESHOLD,
@@ -97,11 +152,22 @@ class SensorService:
     def stop(self):
         """Stop the service and cleanup"""
         logger.info("Stopping sensor service...")
-        self.running.clear()
         
-        if self.log_thread:
-            self.log_thread.join(timeout=2)
+        self._stop_publishing.set()
+        if self.publish_thread:
+            self.publish_thread.join(timeout=settings.STREAM_INTERVAL + 1)
+        self.events.close()
+        
+        for zone in self.zones.values():
+            zone.running.clear()
+            zone.wake.set()
+        for zone in self.zones.values():
+            zone.stop()
+        
+        for reader in self.devices.values():
+            reader.close()
+        
+        if self.farm:
+            self.farm.stop()
         
-        self.pump.cleanup()
-        self.arduino.close()
-        logger.info("Sensor service stopped")
\ No newline at end of file
+        logger.info("Sensor service stopped")
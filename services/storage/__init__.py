@@ -0,0 +1,41 @@
+import os
+from services.storage.base import FIELDNAMES, StorageBackend, decode_row, encode_row
+from services.storage.csv_backend import CsvBackend
+from services.storage.segment_backend import SegmentBackend
+from services.storage.sqlite_backend import SqliteBackend
+from config.settings import settings
+
+
+def zone_path(path: str, zone: str = None) -> str:
+    """Place a zone's data in a subdirectory; the default zone keeps `path`"""
+    if not zone or zone == "default":
+        return path
+    return os.path.join(os.path.dirname(path), zone, os.path.basename(path))
+
+
+def create_backend(name: str = None, zone: str = None, read_only: bool = False) -> StorageBackend:
+    """
+    Build the storage backend selected in settings
+    
+    Args:
+        name: "csv", "sqlite" or "segments" (defaults to settings.STORAGE_BACKEND)
+        zone: Zone id whose data the backend holds (None for the default zone)
+        read_only: Only read the store, e.g. while the service is writing it
+    """
+    name = name or settings.STORAGE_BACKEND
+    
+    if name == "csv":
+        return CsvBackend(
+            zone_path(settings.LOG_FILE, zone),
+            settings.LOG_INDEX_STRIDE,
+            rotation=settings.LOG_ROTATION,
+            rotation_bytes=settings.LOG_ROTATION_SIZE_MB * 1024 * 1024,
+            compress=settings.LOG_COMPRESS_SEGMENTS,
+            read_only=read_only
+        )
+    if name == "sqlite":
+        return SqliteBackend(zone_path(settings.SQLITE_FILE, zone), read_only=read_only)
+    if name == "segments":
+        return SegmentBackend(zone_path(settings.SEGMENT_DIR, zone), read_only=read_only)
+    
+    raise ValueError(f"Unknown storage backend: {name}")
@@ -0,0 +1,122 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+
+FIELDNAMES = [
+    "timestamp",
+    "temp",
+    "humidity",
+    "soil_moisture",
+    "light_level",
+    "pump_status",
+    "quality"
+]
+
+FLOAT_FIELDS = ("temp", "humidity")
+INT_FIELDS = ("soil_moisture", "light_level")
+
+
+def decode_row(values: List[str]) -> Dict:
+    """Convert CSV text values into a typed record (empty cells become None)"""
+    record = dict(zip(FIELDNAMES, values))
+    for name in FLOAT_FIELDS:
+        value = record.get(name)
+        record[name] = float(value) if value else None
+    for name in INT_FIELDS:
+        value = record.get(name)
+        record[name] = int(float(value)) if value else None
+    
+    # Rows logged before the quality column have no flags
+    quality = record.get("quality")
+    record["quality"] = int(quality) if quality else 0
+    return record
+
+
+def encode_row(record: Dict) -> List[str]:
+    """Convert a typed record into CSV text values (None becomes empty)"""
+    return ["" if record.get(name) is None else str(record[name]) for name in FIELDNAMES]
+
+
+class StorageBackend(ABC):
+    """
+    Append-only store of sensor records.
+    
+    Records are dicts keyed by FIELDNAMES with typed values: timestamp
+    as "YYYY-MM-DD HH:MM:SS", temp/humidity as float, soil_moisture and
+    light_level as int (None when missing), pump_status as "ON"/"OFF"
+    and quality as the int mask of failed sensor checks (0 when clean,
+    see services.quality).
+    
+    Cursors are opaque ints marking a position between records, so a
+    consumer can persist one and later resume with iter_from().
+    """
+    
+    # Primary on-disk path, used to place sidecar files next to the data
+    path: str
+    
+    @abstractmethod
+    def append(self, records: List[Dict], sync: bool = False):
+        """
+        Append records in timestamp order
+        
+        Args:
+            records: Typed records to append
+            sync: fsync before returning (group commit for the whole batch)
+        """
+    
+    @abstractmethod
+    def tail(self, limit: int) -> List[Dict]:
+        """Most recent `limit` records, oldest first"""
+    
+    @abstractmethod
+    def read_rows(self, start: int, limit: int) -> List[Dict]:
+        """Up to `limit` records starting at zero-based row number `start`"""
+    
+    @abstractmethod
+    def iter_from(self, cursor: Optional[int] = None) -> Iterator[Tuple[Dict, int]]:
+        """
+        Stream records from `cursor` (the first record if None)
+        
+        Yields:
+            Tuples of (record, cursor just past the record)
+        """
+    
+    @abstractmethod
+    def cursor_for_timestamp(self, timestamp: str) -> Optional[int]:
+        """
+        A cursor from which iter_from() reaches every record with
+        timestamp >= `timestamp` (it may also yield a few earlier ones)
+        """
+    
+    @abstractmethod
+    def end_cursor(self) -> int:
+        """Cursor just past the last record"""
+    
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored records"""
+    
+    @abstractmethod
+    def keep_last(self, n: int):
+        """Drop all but the most recent `n` records"""
+    
+    @abstractmethod
+    def drop_before(self, timestamp: str) -> int:
+        """
+        Retention: drop records older than `timestamp`. Backends may keep
+        a few older ones to avoid splitting a file.
+        
+        Returns:
+            Number of records dropped
+        """
+    
+    def close(self):
+        """Release file handles or connections"""
+    
+    def iter_range(self, start: str, end: str) -> Iterator[Dict]:
+        """Stream records with timestamps in [start, end]"""
+        for record, _ in self.iter_from(self.cursor_for_timestamp(start)):
+            timestamp = record["timestamp"]
+            if timestamp > end:
+                break
+            if timestamp >= start:
+                yield record
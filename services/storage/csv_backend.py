@@ -0,0 +1,742 @@
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import logging
+from bisect import bisect_left
+from collections import deque
+from threading import Lock, Thread
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+
+from services.storage.base import FIELDNAMES, StorageBackend, decode_row, encode_row
+
+logger = logging.getLogger(__name__)
+
+# Block size used when seeking backwards from the end of the log
+TAIL_BLOCK_SIZE = 8192
+
+# Read size hint when streaming rows forward through the log
+SCAN_BATCH_BYTES = 64 * 1024
+
+
+class CsvBackend(StorageBackend):
+    """
+    Append-only CSV log with a sparse byte-offset index. The active file
+    is rotated by day or size into immutable segments named
+    sensor_log.<date>.csv (gzipped in the background when enabled), and
+    retention deletes whole segments.
+    
+    Cursors are byte positions in the concatenated uncompressed log: a
+    segment's base plus an offset into it. Bases only grow, so cursors
+    survive rotation and compaction.
+    
+    With `read_only` the log is only read, e.g. to migrate or analyse a
+    log another process may be writing: nothing is created, repaired,
+    upgraded, indexed to disk or compressed, and writes raise.
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        index_stride: int = 1000,
+        rotation: str = "none",
+        rotation_bytes: int = 16 * 1024 * 1024,
+        compress: bool = False,
+        read_only: bool = False
+    ):
+        if rotation not in ("none", "daily", "size"):
+            raise ValueError(f"Unknown log rotation: {rotation}")
+        
+        self.path = path
+        self.index_file = f"{path}.idx"
+        self.index_stride = index_stride
+        self.rotation = rotation
+        self.rotation_bytes = rotation_bytes
+        self.compress = compress and not read_only
+        self.read_only = read_only
+        
+        self._dir = os.path.dirname(path) or "."
+        self._stem = os.path.splitext(os.path.basename(path))[0]
+        self.manifest_file = os.path.join(self._dir, f"{self._stem}.segments.json")
+        
+        # Rotated segments, oldest first, as dicts of file, base, size, rows,
+        # first and last timestamp. `_manifest_lock` guards them against the
+        # compression thread.
+        self._segments: List[Dict] = []
+        self._base = 0
+        self._manifest_lock = Lock()
+        
+        # Sparse index of (row, byte offset, timestamp), one entry per stride rows
+        self._index: List[Tuple[int, int, str]] = []
+        self._row_count = 0
+        self._end = 0
+        self._last_timestamp: Optional[str] = None
+        
+        self._ensure_file_exists()
+        self._load_manifest()
+        self._load_index()
+        
+        if self._row_count:
+            self._last_timestamp = self._tail_active(1)[-1]["timestamp"]
+        if not self.read_only:
+            self._upgrade_header()
+        
+        if self.compress:
+            for segment in self._segments:
+                if not segment["file"].endswith(".gz"):
+                    self._compress_async(segment)
+    
+    def _ensure_file_exists(self):
+        """Create CSV file with headers if it doesn't exist"""
+        if self.read_only:
+            if not os.path.isfile(self.path):
+                raise FileNotFoundError(f"No such log: {self.path}")
+            return
+        
+        os.makedirs(self._dir, exist_ok=True)
+        
+        if not os.path.isfile(self.path):
+            with open(self.path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(FIELDNAMES)
+            logger.info(f"Created log file: {self.path}")
+    
+    def _upgrade_header(self):
+        """
+        Give the active file the current header when columns were added
+        since it was created. Rows already written are rotated out as
+        they are (readers decode by position, so old rows stay readable);
+        an empty file is simply recreated.
+        """
+        with open(self.path, 'rb') as f:
+            header = f.readline().decode('utf-8').strip().split(",")
+        if header == FIELDNAMES:
+            return
+        
+        if self._row_count:
+            logger.info(f"Log columns changed, rotating {self.path}")
+            self._rotate()
+        else:
+            os.remove(self.path)
+            self._ensure_file_exists()
+            self._index = []
+            self._rescan_index(rewrite=True)
+    
+    # ===== Segment manifest =====
+    
+    def _segment_path(self, segment: Dict) -> str:
+        return os.path.join(self._dir, segment["file"])
+    
+    def _load_manifest(self):
+        """
+        Load the segment list and reconcile it with the files on disk,
+        finishing or discarding work interrupted by a crash
+        """
+        segments = []
+        base = 0
+        try:
+            if os.path.isfile(self.manifest_file):
+                with open(self.manifest_file, 'r') as f:
+                    state = json.load(f)
+                segments = state["segments"]
+                base = state["active_base"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Rebuilding unreadable segment manifest: {e}")
+            segments, base = [], 0
+        
+        pattern = re.compile(
+            re.escape(self._stem) + r"\.\d{4}-\d{2}-\d{2}(_\d{6})?(-\d+)?\.csv(\.gz)?$"
+        )
+        on_disk = set()
+        for name in os.listdir(self._dir):
+            if name.endswith(".tmp") and pattern.match(name[:-4]):
+                if not self.read_only:
+                    os.remove(os.path.join(self._dir, name))
+            elif pattern.match(name):
+                on_disk.add(name)
+        
+        known = []
+        for segment in segments:
+            name = segment["file"]
+            if not name.endswith(".gz") and f"{name}.gz" in on_disk:
+                # Compressed copy was renamed in but the manifest not updated
+                if not self.read_only:
+                    os.remove(os.path.join(self._dir, name))
+                on_disk.discard(name)
+                segment["file"] = name = f"{name}.gz"
+            if name in on_disk:
+                known.append(segment)
+                on_disk.discard(name)
+        
+        # Segments rotated just before a crash are missing from the manifest
+        for name in sorted(on_disk):
+            if name.endswith(".gz") or f"{name}.gz" not in on_disk:
+                segment = self._scan_segment(name)
+                segment["base"] = max([base] + [s["base"] + s["size"] for s in known])
+                known.append(segment)
+        
+        self._segments = sorted(known, key=lambda s: s["base"])
+        self._base = max([base] + [s["base"] + s["size"] for s in self._segments])
+        if not self.read_only:
+            self._save_manifest()
+    
+    def _save_manifest(self):
+        """Persist the segment list atomically"""
+        state = {"active_base": self._base, "segments": self._segments}
+        tmp_file = f"{self.manifest_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp_file, self.manifest_file)
+    
+    def _scan_segment(self, name: str) -> Dict:
+        """Measure a segment file that is missing from the manifest"""
+        segment = {"file": name, "base": 0, "size": 0, "rows": 0, "first": "", "last": ""}
+        with self._open(segment) as f:
+            size = len(f.readline())
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                timestamp = line.split(b",", 1)[0].decode('utf-8')
+                if not segment["rows"]:
+                    segment["first"] = timestamp
+                segment["last"] = timestamp
+                segment["rows"] += 1
+                size += len(line)
+        segment["size"] = size
+        return segment
+    
+    def _segments_snapshot(self) -> Tuple[List[Dict], int]:
+        with self._manifest_lock:
+            return [dict(s) for s in self._segments], self._base
+    
+    def _open(self, segment: Dict) -> IO[bytes]:
+        """Open a segment for reading, following a concurrent compression"""
+        path = self._segment_path(segment)
+        if not os.path.isfile(path) and os.path.isfile(f"{path}.gz"):
+            path = f"{path}.gz"
+        if path.endswith(".gz"):
+            return gzip.open(path, 'rb')
+        return open(path, 'rb')
+    
+    # ===== Active file index =====
+    
+    def _load_index(self):
+        """
+        Load the persisted offset index and catch up with rows written
+        after its last entry. Rebuilds the index if it is missing or stale.
+        """
+        entries = []
+        try:
+            if os.path.isfile(self.index_file):
+                with open(self.index_file, 'r') as f:
+                    for line in f:
+                        row, offset, timestamp = line.rstrip("\n").split(",", 2)
+                        entries.append((int(row), int(offset), timestamp))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable log index: {e}")
+            entries = []
+        
+        size = os.path.getsize(self.path)
+        valid = all(
+            row == i * self.index_stride and offset < size
+            for i, (row, offset, _) in enumerate(entries)
+        )
+        
+        if not valid:
+            entries = []
+        
+        self._index = entries
+        self._rescan_index(rewrite=not valid)
+        
+        # A torn trailing row would corrupt the next append (or is still
+        # being written by the process that owns the log)
+        if size > self._end and not self.read_only:
+            logger.warning(f"Truncating {size - self._end} bytes of torn row from {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(self._end)
+    
+    def _rescan_index(self, rewrite: bool = False):
+        """
+        Count rows from the last indexed offset to end of file, adding
+        index entries as stride boundaries are crossed.
+        
+        Args:
+            rewrite: Replace the index file instead of appending to it
+        """
+        if self._index:
+            row, offset, _ = self._index[-1]
+        else:
+            row, offset = 0, None
+        
+        new_entries = []
+        with open(self.path, 'rb') as f:
+            if offset is None:
+                f.readline()  # Skip header
+                offset = f.tell()
+            else:
+                f.seek(offset)
+            
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # EOF or torn trailing row
+                
+                if row % self.index_stride == 0 and (
+                    not self._index or row > self._index[-1][0]
+                ):
+                    timestamp = line.split(b",", 1)[0].decode('utf-8')
+                    new_entries.append((row, offset, timestamp))
+                
+                row += 1
+                offset += len(line)
+        
+        self._index.extend(new_entries)
+        self._row_count = row
+        self._end = offset
+        
+        if (rewrite or new_entries) and not self.read_only:
+            mode = 'w' if rewrite else 'a'
+            with open(self.index_file, mode) as f:
+                for entry in (self._index if rewrite else new_entries):
+                    f.write("%d,%d,%s\n" % entry)
+        
+        logger.debug(
+            f"Log index ready: {self._row_count} rows, {len(self._index)} entries"
+        )
+    
+    def _parse_lines(self, lines: List[bytes]) -> List[Dict]:
+        """Decode raw CSV lines into typed records"""
+        text = [line.decode('utf-8') for line in lines]
+        return [decode_row(row) for row in csv.reader(text)]
+    
+    # ===== Writing and rotation =====
+    
+    def _check_writable(self):
+        if self.read_only:
+            raise PermissionError(f"{self.path} is open read-only")
+    
+    def append(self, records: List[Dict], sync: bool = False):
+        self._check_writable()
+        batch = []
+        for record in records:
+            if self._needs_rotation(record["timestamp"], batch):
+                self._write(batch, sync)
+                batch = []
+                self._rotate()
+            batch.append(record)
+        
+        self._write(batch, sync)
+    
+    def _needs_rotation(self, timestamp: str, batch: List[Dict]) -> bool:
+        """Whether the record at `timestamp` belongs in a new active file"""
+        if self.rotation == "none":
+            return False
+        
+        if self._index:
+            first = self._index[0][2]
+        elif batch:
+            first = batch[0]["timestamp"]
+        else:
+            return False  # Active file is empty
+        
+        if self.rotation == "daily":
+            return timestamp[:10] != first[:10]
+        return self._end >= self.rotation_bytes
+    
+    def _write(self, records: List[Dict], sync: bool):
+        """Append rows to the active file in one write and extend the index"""
+        if not records:
+            return
+        
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        lines = []
+        new_entries = []
+        offset = self._end
+        
+        for record in records:
+            row = encode_row(record)
+            
+            # Record a sparse index entry every `index_stride` rows
+            if self._row_count % self.index_stride == 0:
+                new_entries.append((self._row_count, offset, row[0]))
+            
+            writer.writerow(row)
+            line = buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+            
+            lines.append(line)
+            offset += len(line)
+            self._row_count += 1
+        
+        with open(self.path, 'ab') as f:
+            f.write(b"".join(lines))
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        self._end = offset
+        self._last_timestamp = records[-1]["timestamp"]
+        
+        if new_entries:
+            with open(self.index_file, 'a') as f:
+                for entry in new_entries:
+                    f.write("%d,%d,%s\n" % entry)
+            self._index.extend(new_entries)
+    
+    def _rotate(self):
+        """Rename the active file into a segment and start a new one"""
+        first = self._index[0][2]
+        label = first[:10]
+        if self.rotation == "size":
+            label += "_" + first[11:].replace(":", "")
+        
+        name = f"{self._stem}.{label}.csv"
+        suffix = 1
+        while os.path.exists(os.path.join(self._dir, name)) or os.path.exists(
+            os.path.join(self._dir, f"{name}.gz")
+        ):
+            name = f"{self._stem}.{label}-{suffix}.csv"
+            suffix += 1
+        
+        segment = {
+            "file": name,
+            "base": self._base,
+            "size": self._end,
+            "rows": self._row_count,
+            "first": first,
+            "last": self._last_timestamp
+        }
+        
+        os.replace(self.path, os.path.join(self._dir, name))
+        with self._manifest_lock:
+            self._segments.append(segment)
+            self._base += self._end
+            self._save_manifest()
+        
+        os.remove(self.index_file)
+        self._ensure_file_exists()
+        self._index = []
+        self._rescan_index(rewrite=True)
+        logger.info(f"Rotated log segment {name} ({segment['rows']} rows)")
+        
+        if self.compress:
+            self._compress_async(dict(segment))
+    
+    def _compress_async(self, segment: Dict):
+        Thread(target=self._compress, args=(segment,), daemon=True).start()
+    
+    def _compress(self, segment: Dict):
+        """gzip a rotated segment off the write path, then swap it in"""
+        src = self._segment_path(segment)
+        dst = f"{src}.gz"
+        try:
+            with open(src, 'rb') as f_in, gzip.open(f"{dst}.tmp", 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            
+            with self._manifest_lock:
+                # Retention may have deleted or compacted the segment meanwhile
+                current = [
+                    s for s in self._segments
+                    if s["file"] == segment["file"] and s["size"] == segment["size"]
+                ]
+                if not current:
+                    os.remove(f"{dst}.tmp")
+                    return
+                
+                os.replace(f"{dst}.tmp", dst)
+                current[0]["file"] = os.path.basename(dst)
+                self._save_manifest()
+                
+                # Readers that already opened the plain file keep their handle
+                os.remove(src)
+        except FileNotFoundError:
+            pass  # Deleted by retention before compression started
+        except OSError as e:
+            logger.error(f"Failed to compress {src}: {e}")
+    
+    # ===== Reading =====
+    
+    def _tail_active(self, limit: int) -> List[Dict]:
+        """
+        Last `limit` rows of the active file, read in blocks backwards
+        from its end so cost depends on `limit` rather than file size
+        """
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            blocks = []
+            newlines = 0
+            
+            # One extra newline marks the start of the oldest wanted row
+            while pos > 0 and newlines <= limit:
+                step = min(TAIL_BLOCK_SIZE, pos)
+                pos -= step
+                f.seek(pos)
+                block = f.read(step)
+                newlines += block.count(b"\n")
+                blocks.append(block)
+        
+        lines = b"".join(reversed(blocks)).split(b"\n")
+        
+        # The last element is empty, or a torn row still being written
+        lines.pop()
+        if pos == 0:
+            lines = lines[1:]  # Skip header
+        
+        return self._parse_lines([line + b"\n" for line in lines[-limit:]])
+    
+    def tail(self, limit: int) -> List[Dict]:
+        records = self._tail_active(limit)
+        segments, _ = self._segments_snapshot()
+        
+        # Older rows come from rotated segments, newest segment first
+        for segment in reversed(segments):
+            need = limit - len(records)
+            if need <= 0:
+                break
+            with self._open(segment) as f:
+                f.readline()  # Skip header
+                lines = deque(f, maxlen=need)
+            records = self._parse_lines(list(lines)) + records
+        
+        return records
+    
+    def read_rows(self, start: int, limit: int) -> List[Dict]:
+        if start < 0 or limit <= 0:
+            return []
+        
+        data = []
+        segments, _ = self._segments_snapshot()
+        for segment in segments:
+            if start >= segment["rows"]:
+                start -= segment["rows"]
+                continue
+            
+            lines = []
+            with self._open(segment) as f:
+                f.readline()  # Skip header
+                for row, line in enumerate(f):
+                    if row >= start:
+                        lines.append(line)
+                        if len(data) + len(lines) >= limit:
+                            break
+            data.extend(self._parse_lines(lines))
+            start = 0
+            if len(data) >= limit:
+                return data
+        
+        return data + self._read_active_rows(start, limit - len(data))
+    
+    def _read_active_rows(self, start: int, limit: int) -> List[Dict]:
+        """Rows of the active file, seeking via the sparse index"""
+        if limit <= 0 or not self._index:
+            return []
+        
+        # Entries sit at multiples of the stride: nearest one at or before `start`
+        i = min(start // self.index_stride, len(self._index) - 1)
+        row, offset, _ = self._index[i]
+        
+        lines = []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            while len(lines) < limit:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                if row >= start:
+                    lines.append(line)
+                row += 1
+        
+        return self._parse_lines(lines)
+    
+    def _iter_file(self, f: IO[bytes], base: int, offset: int) -> Iterator[Tuple[Dict, int]]:
+        """Stream rows of one file from a local byte offset"""
+        header = len(f.readline())
+        if offset > header:
+            f.seek(offset)
+        else:
+            offset = header  # Start of the file, or a cursor into compacted rows
+        
+        while True:
+            lines = f.readlines(SCAN_BATCH_BYTES)
+            if not lines:
+                break
+            
+            torn = not lines[-1].endswith(b"\n")
+            if torn:
+                lines.pop()
+            
+            ends = []
+            for line in lines:
+                offset += len(line)
+                ends.append(base + offset)
+            
+            yield from zip(self._parse_lines(lines), ends)
+            
+            if torn:
+                break
+    
+    def iter_from(self, cursor: Optional[int] = None) -> Iterator[Tuple[Dict, int]]:
+        segments, base = self._segments_snapshot()
+        cursor = cursor or 0
+        
+        for segment in segments:
+            end = segment["base"] + segment["size"]
+            if cursor >= end:
+                continue
+            with self._open(segment) as f:
+                yield from self._iter_file(f, segment["base"], max(0, cursor - segment["base"]))
+            cursor = end
+        
+        with open(self.path, 'rb') as f:
+            yield from self._iter_file(f, base, max(0, cursor - base))
+    
+    def cursor_for_timestamp(self, timestamp: str) -> Optional[int]:
+        # Segments are skipped whole; within the active file use the index
+        segments, base = self._segments_snapshot()
+        for segment in segments:
+            if segment["last"] >= timestamp:
+                return segment["base"]
+        
+        timestamps = [entry[2] for entry in self._index]
+        i = bisect_left(timestamps, timestamp) - 1
+        if i < 0:
+            return base
+        return base + self._index[i][1]
+    
+    def end_cursor(self) -> int:
+        return self._base + self._end
+    
+    def count(self) -> int:
+        segments, _ = self._segments_snapshot()
+        return sum(segment["rows"] for segment in segments) + self._row_count
+    
+    # ===== Retention and compaction =====
+    
+    def _delete_oldest_segment(self) -> int:
+        """
+        Remove the oldest segment file
+        
+        Returns:
+            Number of rows deleted
+        """
+        with self._manifest_lock:
+            segment = self._segments.pop(0)
+            self._save_manifest()
+            os.remove(self._segment_path(segment))
+        
+        logger.info(f"Deleted log segment {segment['file']} ({segment['rows']} rows)")
+        return segment["rows"]
+    
+    def drop_before(self, timestamp: str) -> int:
+        """
+        Delete whole segments whose newest row is older than `timestamp`.
+        Without segments (rotation "none") the active file is compacted
+        instead, or it would never shrink.
+        """
+        self._check_writable()
+        dropped = 0
+        while self._segments and self._segments[0]["last"] < timestamp:
+            dropped += self._delete_oldest_segment()
+        
+        if not self._segments:
+            drop = self._active_rows_before(timestamp)
+            if drop:
+                self._compact_active(drop)
+                dropped += drop
+        return dropped
+    
+    def _active_rows_before(self, timestamp: str) -> int:
+        """Number of leading rows of the active file older than `timestamp`"""
+        timestamps = [entry[2] for entry in self._index]
+        i = bisect_left(timestamps, timestamp) - 1
+        if i < 0:
+            return 0
+        
+        # Scan on from the last index entry that is still too old
+        row, offset, _ = self._index[i]
+        encoded = timestamp.encode('utf-8')
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n") or line.split(b",", 1)[0] >= encoded:
+                    break
+                row += 1
+        return row
+    
+    def keep_last(self, n: int):
+        """Delete whole old segments, then compact the oldest remaining file"""
+        self._check_writable()
+        drop = self.count() - n
+        
+        while drop > 0 and self._segments and self._segments[0]["rows"] <= drop:
+            drop -= self._delete_oldest_segment()
+        
+        if drop <= 0:
+            return
+        
+        if self._segments:
+            self._compact_segment(drop)
+        else:
+            self._compact_active(drop)
+    
+    def _copy_skipping(self, f_in: IO[bytes], f_out: IO[bytes], skip: int) -> Tuple[int, int, str]:
+        """
+        Stream the header and every row after the first `skip` rows
+        
+        Returns:
+            Tuple of (rows kept, bytes written, first kept timestamp)
+        """
+        header = f_in.readline()
+        f_out.write(header)
+        size = len(header)
+        for _ in range(skip):
+            f_in.readline()
+        
+        rows = 0
+        first = ""
+        for line in f_in:
+            if not line.endswith(b"\n"):
+                break
+            if not rows:
+                first = line.split(b",", 1)[0].decode('utf-8')
+            f_out.write(line)
+            rows += 1
+            size += len(line)
+        return rows, size, first
+    
+    def _compact_segment(self, drop: int):
+        """Rewrite the oldest segment without its first `drop` rows"""
+        with self._manifest_lock:
+            segment = self._segments[0]
+            path = self._segment_path(segment)
+            tmp_file = f"{path}.tmp"
+            opener = gzip.open if path.endswith(".gz") else open
+            
+            with self._open(segment) as f_in, opener(tmp_file, 'wb') as f_out:
+                rows, size, first = self._copy_skipping(f_in, f_out, drop)
+            os.replace(tmp_file, path)
+            
+            # Shift the base by the dropped bytes so kept rows keep their cursors
+            segment["base"] += segment["size"] - size
+            segment.update(size=size, rows=rows, first=first)
+            self._save_manifest()
+    
+    def _compact_active(self, drop: int):
+        """Rewrite the active file without its first `drop` rows"""
+        tmp_file = f"{self.path}.tmp"
+        with open(self.path, 'rb') as f_in, open(tmp_file, 'wb') as f_out:
+            _, size, _ = self._copy_skipping(f_in, f_out, drop)
+        os.replace(tmp_file, self.path)
+        
+        # Shift the base by the dropped bytes so kept rows keep their cursors
+        with self._manifest_lock:
+            self._base += self._end - size
+            self._save_manifest()
+        
+        self._index = []
+        self._rescan_index(rewrite=True)
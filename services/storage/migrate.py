@@ -0,0 +1,128 @@
+"""
+One-shot migration between the CSV log format and a storage backend.
+    
+    python -m services.storage.migrate import --to sqlite
+    python -m services.storage.migrate export --from segments --csv export.csv
+"""
+import argparse
+import csv
+import logging
+import os
+import sys
+import zlib
+
+from config.settings import settings
+from services.storage import FIELDNAMES, create_backend, encode_row
+from services.storage.csv_backend import CsvBackend
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+
+
+def import_csv(csv_path: str, backend_name: str, force: bool = False) -> int:
+    """
+    Stream a CSV log into a backend, its rotated segments included
+    
+    Returns:
+        Number of records imported
+    
+    Raises:
+        ValueError: The target is not empty, or part of the log could not be read
+    """
+    if backend_name == "csv" and os.path.abspath(csv_path) == os.path.abspath(settings.LOG_FILE):
+        raise ValueError("Source CSV is the CSV backend's own log file")
+    
+    if not os.path.isfile(csv_path):
+        raise ValueError(f"No CSV log at {csv_path}")
+    
+    # Opened as a log, so segments rotated out of it (gzipped or not) are
+    # read too, and read-only, so the source is left exactly as it was
+    source = CsvBackend(csv_path, settings.LOG_INDEX_STRIDE, read_only=True)
+    backend = create_backend(backend_name)
+    try:
+        if backend.count() and not force:
+            raise ValueError(
+                f"{backend_name} store at {backend.path} is not empty (use --force to append)"
+            )
+        
+        total = 0
+        batch = []
+        try:
+            for record, _ in source.iter_from(None):
+                batch.append(record)
+                if len(batch) >= BATCH_SIZE:
+                    backend.append(batch)
+                    total += len(batch)
+                    batch = []
+        except (OSError, EOFError, zlib.error) as e:
+            raise ValueError(f"Failed to read {csv_path} after {total + len(batch)} records: {e}")
+        
+        if batch:
+            backend.append(batch)
+            total += len(batch)
+        
+        expected = source.count()
+        if total != expected:
+            raise ValueError(
+                f"Read {total} of the {expected} records in {csv_path} and its segments"
+            )
+        return total
+    finally:
+        backend.close()
+        source.close()
+
+
+def export_csv(backend_name: str, csv_path: str) -> int:
+    """
+    Stream every record of a backend into a CSV file
+    
+    Returns:
+        Number of records exported
+    """
+    backend = create_backend(backend_name)
+    try:
+        total = 0
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDNAMES)
+            for record, _ in backend.iter_from(None):
+                writer.writerow(encode_row(record))
+                total += 1
+        return total
+    finally:
+        backend.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import/export sensor logs as CSV")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    import_parser = commands.add_parser("import", help="Load a CSV log into a backend")
+    import_parser.add_argument("--csv", default=settings.LOG_FILE, help="Source CSV file")
+    import_parser.add_argument("--to", default=settings.STORAGE_BACKEND, help="Target backend")
+    import_parser.add_argument("--force", action="store_true", help="Append to a non-empty store")
+    
+    export_parser = commands.add_parser("export", help="Write a backend out as CSV")
+    export_parser.add_argument("--from", dest="source", default=settings.STORAGE_BACKEND, help="Source backend")
+    export_parser.add_argument("--csv", required=True, help="Destination CSV file")
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    
+    try:
+        if args.command == "import":
+            total = import_csv(args.csv, args.to, args.force)
+            logger.info(f"Imported {total} records from {args.csv} into {args.to}")
+        else:
+            total = export_csv(args.source, args.csv)
+            logger.info(f"Exported {total} records from {args.source} to {args.csv}")
+    except (OSError, ValueError) as e:
+        logger.error(f"Migration failed: {e}")
+        return 1
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
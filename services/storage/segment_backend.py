@@ -0,0 +1,308 @@
+import mmap
+import os
+import shutil
+import logging
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from services.rollups import from_epoch, to_epoch
+from services.storage.base import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Fixed-width column files written for each day, as (field, array typecode)
+COLUMNS = [
+    ("timestamp", "I"),      # seconds, wall clock treated as UTC
+    ("temp", "f"),
+    ("humidity", "f"),
+    ("soil_moisture", "h"),
+    ("light_level", "h"),
+    ("pump_status", "b"),
+    ("quality", "H")         # added later; days written before are padded with 0
+]
+
+INT16_NULL = -32768
+
+# Cursor layout: day number in the high bits, row within the day in the low bits
+DAY_SHIFT = 32
+ROW_MASK = (1 << DAY_SHIFT) - 1
+
+
+def _day_number(day: str) -> int:
+    return to_epoch(f"{day} 00:00:00") // 86400
+
+
+def _encode(name: str, value):
+    if name == "timestamp":
+        return to_epoch(value)
+    if name == "pump_status":
+        return 1 if value == "ON" else 0
+    if name == "quality":
+        return value or 0
+    if name in ("temp", "humidity"):
+        return float("nan") if value is None else value
+    return INT16_NULL if value is None else value
+
+
+class SegmentBackend(StorageBackend):
+    """
+    Columnar store with one directory per day holding a fixed-width
+    binary file per column (float32 / int16). Segments are read through
+    mmap. Cursors encode (day number, row within day). `read_only` leaves
+    the files as they are, repairs and interrupted trims included.
+    """
+    
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+            self._recover_trim()
+        
+        self._days: List[str] = []
+        self._counts: Dict[str, int] = {}
+        
+        for day in sorted(os.listdir(path)):
+            if os.path.isdir(os.path.join(path, day)) and not day.endswith((".tmp", ".old")):
+                self._days.append(day)
+                self._counts[day] = self._repair_day(day)
+        
+        logger.info(f"Opened segment store: {path} ({len(self._days)} days)")
+    
+    def _recover_trim(self):
+        """
+        Finish a keep_last() day swap interrupted by a crash: a complete
+        trimmed copy (<day>.tmp) replaces a day already moved aside
+        (<day>.old); an unfinished copy is discarded.
+        """
+        for name in os.listdir(self.path):
+            if not name.endswith(".old"):
+                continue
+            day_dir = os.path.join(self.path, name[:-4])
+            if not os.path.isdir(day_dir):
+                os.rename(f"{day_dir}.tmp", day_dir)
+            shutil.rmtree(os.path.join(self.path, name))
+        
+        for name in os.listdir(self.path):
+            if name.endswith(".tmp"):
+                shutil.rmtree(os.path.join(self.path, name))
+    
+    def _column_file(self, day: str, name: str) -> str:
+        return os.path.join(self.path, day, f"{name}.bin")
+    
+    def _repair_day(self, day: str) -> int:
+        """
+        Trim columns to the shortest one, dropping a torn trailing row.
+        The quality column is padded with 0 instead, so days written
+        before it existed (or torn just before it) keep their rows.
+        Read-only, the day just ends at its shortest column.
+        """
+        counts = []
+        for name, code in COLUMNS:
+            column_file = self._column_file(day, name)
+            size = os.path.getsize(column_file) if os.path.isfile(column_file) else 0
+            counts.append(size // array(code).itemsize)
+        
+        if self.read_only:
+            return min(counts)
+        
+        count = min(c for (name, _), c in zip(COLUMNS, counts) if name != "quality")
+        for (name, code), column_count in zip(COLUMNS, counts):
+            if column_count != count or not os.path.isfile(self._column_file(day, name)):
+                with open(self._column_file(day, name), 'ab') as f:
+                    f.truncate(count * array(code).itemsize)  # Extends with zero bytes
+        
+        return count
+    
+    def _check_writable(self):
+        if self.read_only:
+            raise PermissionError(f"{self.path} is open read-only")
+    
+    def append(self, records: List[Dict], sync: bool = False):
+        self._check_writable()
+        # Group consecutive records by day
+        groups: List[Tuple[str, List[Dict]]] = []
+        for record in records:
+            day = record["timestamp"][:10]
+            if groups and groups[-1][0] == day:
+                groups[-1][1].append(record)
+            else:
+                groups.append((day, [record]))
+        
+        for day, group in groups:
+            if day not in self._counts:
+                os.makedirs(os.path.join(self.path, day), exist_ok=True)
+                self._days.append(day)
+                self._counts[day] = 0
+            
+            for name, code in COLUMNS:
+                values = array(code, [_encode(name, r.get(name)) for r in group])
+                with open(self._column_file(day, name), 'ab') as f:
+                    f.write(values.tobytes())
+                    if sync:
+                        f.flush()
+                        os.fsync(f.fileno())
+            
+            # Publish the new rows only once every column holds them
+            self._counts[day] += len(group)
+    
+    @contextmanager
+    def _open_day(self, day: str, count: int):
+        """Map a day's column files read-only as typed memoryviews"""
+        maps = []
+        views = {}
+        try:
+            for name, code in COLUMNS:
+                with open(self._column_file(day, name), 'rb') as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                maps.append(mm)
+                view = memoryview(mm)[:count * array(code).itemsize].cast(code)
+                views[name] = view
+            yield views
+        finally:
+            for view in views.values():
+                view.release()
+            for mm in maps:
+                mm.close()
+    
+    def _records(self, day: str, start: int, end: int) -> List[Dict]:
+        """Decode rows [start, end) of one day"""
+        if end <= start:
+            return []
+        
+        with self._open_day(day, end) as views:
+            columns = {name: views[name][start:end].tolist() for name, _ in COLUMNS}
+        
+        records = []
+        for i in range(end - start):
+            temp = columns["temp"][i]
+            humidity = columns["humidity"][i]
+            soil = columns["soil_moisture"][i]
+            light = columns["light_level"][i]
+            records.append({
+                "timestamp": from_epoch(columns["timestamp"][i]),
+                # float32 holds ~7 significant digits; drop the noise
+                "temp": None if temp != temp else round(temp, 4),
+                "humidity": None if humidity != humidity else round(humidity, 4),
+                "soil_moisture": None if soil == INT16_NULL else soil,
+                "light_level": None if light == INT16_NULL else light,
+                "pump_status": "ON" if columns["pump_status"][i] else "OFF",
+                "quality": columns["quality"][i]
+            })
+        return records
+    
+    def tail(self, limit: int) -> List[Dict]:
+        chunks = []
+        remaining = limit
+        for day in reversed(list(self._days)):
+            if remaining <= 0:
+                break
+            count = self._counts[day]
+            start = max(0, count - remaining)
+            chunks.append(self._records(day, start, count))
+            remaining -= count - start
+        
+        return [record for chunk in reversed(chunks) for record in chunk]
+    
+    def read_rows(self, start: int, limit: int) -> List[Dict]:
+        if start < 0 or limit <= 0:
+            return []
+        
+        data = []
+        for day in list(self._days):
+            count = self._counts[day]
+            if start >= count:
+                start -= count
+                continue
+            end = min(count, start + limit - len(data))
+            data.extend(self._records(day, start, end))
+            start = 0
+            if len(data) >= limit:
+                break
+        return data
+    
+    def iter_from(self, cursor: Optional[int] = None) -> Iterator[Tuple[Dict, int]]:
+        day_number, row = (0, 0) if cursor is None else (cursor >> DAY_SHIFT, cursor & ROW_MASK)
+        
+        for day in list(self._days):
+            number = _day_number(day)
+            if number < day_number:
+                continue
+            start = row if number == day_number else 0
+            
+            # Decode in slices to bound memory on large days
+            while start < self._counts[day]:
+                end = min(self._counts[day], start + 1000)
+                for i, record in enumerate(self._records(day, start, end), start + 1):
+                    yield record, (number << DAY_SHIFT) | i
+                start = end
+    
+    def cursor_for_timestamp(self, timestamp: str) -> Optional[int]:
+        day = timestamp[:10]
+        i = bisect_left(self._days, day)
+        if i == len(self._days):
+            return self.end_cursor()
+        
+        found = self._days[i]
+        row = 0
+        if found == day and self._counts[day]:
+            with self._open_day(day, self._counts[day]) as views:
+                row = bisect_left(views["timestamp"], to_epoch(timestamp))
+        return (_day_number(found) << DAY_SHIFT) | row
+    
+    def end_cursor(self) -> int:
+        if not self._days:
+            return 0
+        day = self._days[-1]
+        return (_day_number(day) << DAY_SHIFT) | self._counts[day]
+    
+    def count(self) -> int:
+        return sum(self._counts.values())
+    
+    def keep_last(self, n: int):
+        """Delete whole old days, then trim the oldest retained day"""
+        self._check_writable()
+        total = self.count()
+        
+        while self._days and total - self._counts[self._days[0]] >= n:
+            day = self._days.pop(0)
+            total -= self._counts.pop(day)
+            shutil.rmtree(os.path.join(self.path, day))
+        
+        if not self._days or total <= n:
+            return
+        
+        day = self._days[0]
+        drop = total - n
+        day_dir = os.path.join(self.path, day)
+        
+        # Trim every column into a fresh directory and swap the day as a
+        # whole: columns trimmed one by one could be left misaligned by a
+        # crash, pairing timestamps with other rows' values
+        os.makedirs(f"{day_dir}.tmp")
+        for name, code in COLUMNS:
+            itemsize = array(code).itemsize
+            with open(self._column_file(day, name), 'rb') as f:
+                f.seek(drop * itemsize)
+                data = f.read((self._counts[day] - drop) * itemsize)
+            with open(os.path.join(f"{day_dir}.tmp", f"{name}.bin"), 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        
+        os.rename(day_dir, f"{day_dir}.old")
+        os.rename(f"{day_dir}.tmp", day_dir)
+        shutil.rmtree(f"{day_dir}.old")
+        self._counts[day] -= drop
+    
+    def drop_before(self, timestamp: str) -> int:
+        """Delete whole days before the day of `timestamp`"""
+        self._check_writable()
+        dropped = 0
+        while self._days and self._days[0] < timestamp[:10]:
+            day = self._days.pop(0)
+            dropped += self._counts.pop(day)
+            shutil.rmtree(os.path.join(self.path, day))
+        return dropped
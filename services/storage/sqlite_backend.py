@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import logging
+from threading import Lock, local
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from services.storage.base import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per query when streaming
+FETCH_BATCH = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    temp REAL,
+    humidity REAL,
+    soil_moisture INTEGER,
+    light_level INTEGER,
+    pump INTEGER NOT NULL,
+    quality INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS readings_timestamp ON readings (timestamp);
+"""
+
+COLUMNS = "id, timestamp, temp, humidity, soil_moisture, light_level, pump, quality"
+
+
+def _to_record(row: Tuple) -> Dict:
+    return {
+        "timestamp": row[1],
+        "temp": row[2],
+        "humidity": row[3],
+        "soil_moisture": row[4],
+        "light_level": row[5],
+        "pump_status": "ON" if row[6] else "OFF",
+        "quality": row[7]
+    }
+
+
+class SqliteBackend(StorageBackend):
+    """
+    SQLite store in WAL mode, indexed on timestamp. Cursors are the id
+    of the next row to read; ids only ever grow, but deletions and failed
+    inserts leave gaps, so nothing is derived from id arithmetic.
+    `read_only` opens the database read-only and leaves the schema alone.
+    """
+    
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        
+        # One connection per thread; WAL lets readers run beside the writer
+        self._local = local()
+        self._connections = set()
+        self._connections_lock = Lock()
+        
+        # (row number, id) just past the last read_rows page, so paging
+        # forward continues from that id instead of counting rows again
+        self._page_end: Optional[Tuple[int, int]] = None
+        
+        conn = self._conn()
+        if not read_only:
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+        logger.info(f"Opened SQLite store: {path}")
+    
+    def _migrate(self, conn: sqlite3.Connection):
+        """Add columns introduced after the table was created"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(readings)")}
+        if "quality" not in columns:
+            with conn:
+                conn.execute("ALTER TABLE readings ADD COLUMN quality INTEGER NOT NULL DEFAULT 0")
+            logger.info(f"Added quality column to {self.path}")
+    
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.read_only:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.add(conn)
+        return conn
+    
+    def append(self, records: List[Dict], sync: bool = False):
+        conn = self._conn()
+        
+        # FULL syncs the WAL on commit; NORMAL leaves it to checkpoints
+        conn.execute(f"PRAGMA synchronous={'FULL' if sync else 'NORMAL'}")
+        with conn:
+            conn.executemany(
+                "INSERT INTO readings "
+                "(timestamp, temp, humidity, soil_moisture, light_level, pump, quality) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        r["timestamp"], r["temp"], r["humidity"],
+                        r["soil_moisture"], r["light_level"],
+                        1 if r["pump_status"] == "ON" else 0,
+                        r.get("quality") or 0
+                    )
+                    for r in records
+                ]
+            )
+    
+    def tail(self, limit: int) -> List[Dict]:
+        rows = self._conn().execute(
+            f"SELECT {COLUMNS} FROM readings ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [_to_record(row) for row in reversed(rows)]
+    
+    def read_rows(self, start: int, limit: int) -> List[Dict]:
+        if start < 0 or limit <= 0:
+            return []
+        
+        page_end = self._page_end
+        if page_end is not None and page_end[0] == start:
+            rows = self._conn().execute(
+                f"SELECT {COLUMNS} FROM readings WHERE id > ? ORDER BY id LIMIT ?",
+                (page_end[1], limit)
+            ).fetchall()
+        else:
+            rows = self._conn().execute(
+                f"SELECT {COLUMNS} FROM readings ORDER BY id LIMIT ? OFFSET ?",
+                (limit, start)
+            ).fetchall()
+        
+        if rows:
+            self._page_end = (start + len(rows), rows[-1][0])
+        return [_to_record(row) for row in rows]
+    
+    def iter_from(self, cursor: Optional[int] = None) -> Iterator[Tuple[Dict, int]]:
+        cursor = cursor or 0
+        while True:
+            rows = self._conn().execute(
+                f"SELECT {COLUMNS} FROM readings WHERE id >= ? ORDER BY id LIMIT ?",
+                (cursor, FETCH_BATCH)
+            ).fetchall()
+            if not rows:
+                break
+            
+            for row in rows:
+                cursor = row[0] + 1
+                yield _to_record(row), cursor
+    
+    def cursor_for_timestamp(self, timestamp: str) -> Optional[int]:
+        row = self._conn().execute(
+            "SELECT MIN(id) FROM readings WHERE timestamp >= ?", (timestamp,)
+        ).fetchone()
+        if row[0] is None:
+            return self.end_cursor()
+        return row[0]
+    
+    def end_cursor(self) -> int:
+        row = self._conn().execute("SELECT MAX(id) FROM readings").fetchone()
+        return (row[0] or 0) + 1
+    
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+    
+    def keep_last(self, n: int):
+        conn = self._conn()
+        with conn:
+            if n <= 0:
+                conn.execute("DELETE FROM readings")
+            else:
+                conn.execute(
+                    "DELETE FROM readings WHERE id < ("
+                    "SELECT id FROM readings ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (n - 1,)
+                )
+            self._page_end = None  # Row numbers shift
+    
+    def drop_before(self, timestamp: str) -> int:
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute("DELETE FROM readings WHERE timestamp < ?", (timestamp,))
+            self._page_end = None
+        return cursor.rowcount
+    
+    def close(self):
+        """Close the connections of every thread that used the store"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, set()
+        for conn in connections:
+            conn.close()
+        self._local.conn = None
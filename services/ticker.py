@@ -0,0 +1,62 @@
+import math
+import time
+from threading import Event
+from typing import Optional, Tuple
+
+# Re-align to the wall clock when it steps by more than this (NTP sync, manual change)
+CLOCK_STEP_TOLERANCE = 1.0
+
+class Ticker:
+    """
+    Fixed-cadence ticks at wall-clock multiples of `interval` (e.g. :00,
+    :05, :10 for 5 s), waited for on the monotonic clock. Each tick is
+    scheduled from the previous tick rather than from when work ended,
+    so time spent working never accumulates into drift. Ticks that pass
+    entirely while a step overruns are skipped and counted, not run back
+    to back.
+    """
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.ticks = 0
+        self.missed = 0  # Ticks skipped because the previous step overran
+        self._align()
+    
+    def _align(self):
+        """Schedule the next wall-clock multiple of the interval"""
+        wall = time.time()
+        self._offset = wall - time.monotonic()  # Wall clock minus monotonic clock
+        self._next = (math.floor(wall / self.interval) + 1) * self.interval - self._offset
+    
+    def wait(self, stop: Event) -> Optional[Tuple[float, float, int]]:
+        """
+        Block until the next tick
+        
+        Args:
+            stop: Returns early with None once this is set
+        
+        Returns:
+            (wall-clock time the tick was due, seconds late, ticks skipped
+            before it), or None if `stop` was set
+        """
+        if stop.wait(max(0.0, self._next - time.monotonic())):
+            return None
+        
+        lateness = time.monotonic() - self._next
+        skipped = int(lateness // self.interval)
+        tick = self._next + skipped * self.interval
+        lateness -= skipped * self.interval
+        due_at = tick + self._offset
+        
+        self.ticks += 1
+        self.missed += skipped
+        self._next = tick + self.interval
+        
+        # A stepped wall clock moves the grid; later ticks follow it
+        if abs(time.time() - time.monotonic() - self._offset) > CLOCK_STEP_TOLERANCE:
+            self._align()
+        
+        return due_at, lateness, skipped
+    
+    def get_status(self) -> dict:
+        return {"interval": self.interval, "ticks": self.ticks, "missed_ticks": self.missed}
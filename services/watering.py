@@ -0,0 +1,352 @@
+"""
+Auto-watering policies and an offline replay harness.
+
+The predictive scheduler smooths soil readings, learns how fast the soil
+dries and how much a second of pumping raises it, and waters in cycles
+that start at (or shortly before) SOIL_DRY_THRESHOLD and end once the
+soil is back above SOIL_WET_THRESHOLD, with a soak gap between runs.
+
+Replay a log against both policies to compare water use:
+    
+    python -m services.watering --csv data/sensor_log.csv
+"""
+import argparse
+import csv
+import gzip
+import json
+import logging
+import statistics
+import sys
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from config.settings import settings
+from services.rollups import to_epoch
+from services.storage import create_backend, decode_row
+
+logger = logging.getLogger(__name__)
+
+# Soil sensor range (10-bit ADC)
+SOIL_MIN = 0
+SOIL_MAX = 1023
+
+
+class SoilFilter:
+    """Median of the last `window` readings, then an exponential moving average"""
+    
+    def __init__(self, window: int = 5, alpha: float = 0.3):
+        self.readings = deque(maxlen=window)
+        self.alpha = alpha
+        self.value: Optional[float] = None
+    
+    def update(self, reading: float) -> float:
+        self.readings.append(reading)
+        median = statistics.median(self.readings)
+        if self.value is None:
+            self.value = median
+        else:
+            self.value += self.alpha * (median - self.value)
+        return self.value
+
+
+class DryingModel:
+    """
+    Drying rate (soil units per second, negative while drying) from a
+    least-squares fit over the last `window` seconds of smoothed readings,
+    blended into a running estimate. Samples taken while the pump runs
+    or the soil is soaking are left out by the caller via reset().
+    """
+    
+    def __init__(self, window: float = 3600, alpha: float = 0.2):
+        self.window = window
+        self.alpha = alpha
+        self.samples = deque()
+        self.rate: Optional[float] = None
+    
+    def seed(self, rate_per_hour: Optional[float]):
+        """Start from a rate fitted over stored history"""
+        if rate_per_hour is not None:
+            self.rate = rate_per_hour / 3600
+    
+    def reset(self):
+        """Forget the current run of samples (keeps the learned rate)"""
+        self.samples.clear()
+    
+    def add(self, timestamp: float, soil: float):
+        self.samples.append((timestamp, soil))
+        while timestamp - self.samples[0][0] > self.window:
+            self.samples.popleft()
+        
+        span = timestamp - self.samples[0][0]
+        if len(self.samples) < 3 or span < self.window / 2:
+            return
+        
+        n = len(self.samples)
+        mean_t = sum(t for t, _ in self.samples) / n
+        mean_s = sum(s for _, s in self.samples) / n
+        var = sum((t - mean_t) ** 2 for t, _ in self.samples)
+        slope = sum((t - mean_t) * (s - mean_s) for t, s in self.samples) / var
+        
+        self.rate = slope if self.rate is None else self.rate + self.alpha * (slope - self.rate)
+    
+    def time_to(self, soil: float, threshold: float) -> Optional[float]:
+        """Seconds until `soil` dries down to `threshold` (None if it is not drying)"""
+        if self.rate is None or self.rate >= 0:
+            return None
+        return max(0.0, (soil - threshold) / -self.rate)
+
+
+class ThresholdPolicy:
+    """The original rule: a fixed pulse whenever a reading is below the dry threshold"""
+    
+    name = "threshold"
+    
+    def update(self, timestamp: float, soil: float, pump_on: bool) -> Optional[float]:
+        if soil < settings.SOIL_DRY_THRESHOLD and not pump_on:
+            return settings.AUTO_WATER_DURATION
+        return None
+    
+    def get_status(self) -> Dict:
+        return {"policy": self.name}
+
+
+class WateringScheduler:
+    """
+    Predictive auto-watering for one zone.
+    
+    A cycle starts when the smoothed soil value reaches SOIL_DRY_THRESHOLD,
+    or is predicted to within WATER_LEAD_TIME seconds. Each run is sized
+    from the learned pump gain to reach SOIL_WET_THRESHOLD (a fixed
+    AUTO_WATER_DURATION pulse until the gain is known), and further
+    runs wait WATER_MIN_GAP seconds for the water to soak in. The cycle
+    ends once the soil is back above SOIL_WET_THRESHOLD (hysteresis), so
+    noise around the dry threshold cannot retrigger it.
+    """
+    
+    name = "predictive"
+    
+    def __init__(self):
+        self.filter = SoilFilter(settings.SOIL_FILTER_WINDOW, settings.SOIL_FILTER_ALPHA)
+        self.model = DryingModel(settings.WATER_RATE_WINDOW)
+        
+        self.gain: Optional[float] = None  # Soil units per second of pumping
+        self.in_cycle = False
+        self.last_run: Optional[float] = None  # When the last run started
+        self.last_run_seconds = 0.0
+        self.soil_before_run: Optional[float] = None
+        self.next_run: Optional[float] = None  # Planned start of the next cycle
+    
+    def update(self, timestamp: float, soil: float, pump_on: bool) -> Optional[float]:
+        """
+        Feed one reading
+        
+        Args:
+            timestamp: Reading time in seconds
+            soil: Raw soil moisture reading
+            pump_on: Whether the pump is running
+        
+        Returns:
+            Seconds to run the pump for, 0 to stop it now, or None for no change
+        """
+        smoothed = self.filter.update(soil)
+        dry = settings.SOIL_DRY_THRESHOLD
+        wet = settings.SOIL_WET_THRESHOLD
+        
+        if pump_on:
+            self.model.reset()
+            # Stop early once the target is reached
+            if self.in_cycle and smoothed >= wet:
+                return 0
+            return None
+        
+        soaking = self.last_run is not None and timestamp - self.last_run < settings.WATER_MIN_GAP
+        if soaking:
+            return None
+        
+        if self.soil_before_run is not None:
+            # First reading after the soak: learn how much the last run added
+            added = smoothed - self.soil_before_run
+            if added > 0 and self.last_run_seconds:
+                observed = added / self.last_run_seconds
+                self.gain = observed if self.gain is None else (self.gain + observed) / 2
+            self.soil_before_run = None
+        
+        self.model.add(timestamp, smoothed)
+        
+        # Done at the wet threshold, or when even a minimum run would overshoot it
+        if self.in_cycle and (
+            smoothed >= wet
+            or (self.gain and wet - smoothed < self.gain * settings.WATER_MIN_DURATION)
+        ):
+            self.in_cycle = False
+            logger.debug(f"Watering cycle complete (soil {smoothed:.0f})")
+        
+        time_to_dry = self.model.time_to(smoothed, dry)
+        self.next_run = None if time_to_dry is None else timestamp + max(
+            0.0, time_to_dry - settings.WATER_LEAD_TIME
+        )
+        
+        if not self.in_cycle:
+            due = smoothed <= dry or (
+                time_to_dry is not None and time_to_dry <= settings.WATER_LEAD_TIME
+            )
+            if not due:
+                return None
+            self.in_cycle = True
+        
+        return self._start_run(timestamp, smoothed, wet)
+    
+    def _start_run(self, timestamp: float, smoothed: float, target: float) -> float:
+        if self.gain:
+            seconds = (target - smoothed) / self.gain
+            seconds = min(max(seconds, settings.WATER_MIN_DURATION), settings.WATER_MAX_DURATION)
+        else:
+            seconds = settings.AUTO_WATER_DURATION  # Gain not learned yet
+        
+        self.last_run = timestamp
+        self.last_run_seconds = seconds
+        self.soil_before_run = smoothed
+        self.model.reset()
+        return seconds
+    
+    def get_status(self) -> Dict:
+        rate = self.model.rate
+        return {
+            "policy": self.name,
+            "smoothed_soil": None if self.filter.value is None else round(self.filter.value, 1),
+            "drying_rate_per_hour": None if rate is None else round(rate * 3600, 2),
+            "pump_gain_per_second": None if self.gain is None else round(self.gain, 3),
+            "in_cycle": self.in_cycle,
+            "last_run": self.last_run,
+            "next_run": self.next_run
+        }
+
+
+def create_policy():
+    """Policy selected by settings.AUTO_WATER_MODE"""
+    if settings.AUTO_WATER_MODE == "threshold":
+        return ThresholdPolicy()
+    if settings.AUTO_WATER_MODE == "predictive":
+        return WateringScheduler()
+    raise ValueError(f"Unknown auto-water mode: {settings.AUTO_WATER_MODE}")
+
+
+def read_csv_log(paths: List[str]) -> Iterator[Dict]:
+    """Typed records from log-format CSV files (gzip segments included), in order"""
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, 'rt', newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Header
+            for values in reader:
+                if values:
+                    yield decode_row(values)
+
+
+def estimate_gain(records: List[Dict]) -> Optional[float]:
+    """Soil rise per pump-second over steps where the log shows the pump on"""
+    rise = 0.0
+    seconds = 0.0
+    for previous, record in zip(records, records[1:]):
+        pumping = "ON" in (previous["pump_status"], record["pump_status"])
+        if pumping and None not in (previous["soil_moisture"], record["soil_moisture"]):
+            rise += record["soil_moisture"] - previous["soil_moisture"]
+            seconds += to_epoch(record["timestamp"]) - to_epoch(previous["timestamp"])
+    return rise / seconds if rise > 0 and seconds else None
+
+
+def replay(records: List[Dict], policy, gain: float) -> Dict:
+    """
+    Run a policy against a log. The soil follows the log's own changes
+    while its pump was off (drying plus sensor noise), and rises by `gain`
+    per simulated pump-second.
+    
+    Returns:
+        Water used (pump seconds), number of runs and time below the dry threshold
+    """
+    soil = None
+    pump_until = 0.0
+    pump_seconds = 0.0
+    runs = 0
+    dry_seconds = 0.0
+    lowest = None
+    previous = None
+    
+    for record in records:
+        reading = record["soil_moisture"]
+        if reading is None:
+            continue
+        now = to_epoch(record["timestamp"])
+        
+        if previous is None:
+            soil = float(reading)
+        else:
+            prev_time, prev_reading, prev_pump = previous
+            step = now - prev_time
+            # Logged drying and noise, but not the log's own watering
+            if "ON" not in (prev_pump, record["pump_status"]):
+                soil += reading - prev_reading
+            # Simulated pumping over the step
+            pumped = max(0.0, min(now, pump_until) - prev_time)
+            soil += gain * pumped
+            pump_seconds += pumped
+            soil = min(max(soil, SOIL_MIN), SOIL_MAX)
+            if soil < settings.SOIL_DRY_THRESHOLD:
+                dry_seconds += step
+        previous = (now, reading, record["pump_status"])
+        lowest = soil if lowest is None else min(lowest, soil)
+        
+        pump_on = now < pump_until
+        action = policy.update(now, soil, pump_on)
+        if action is None:
+            continue
+        if action > 0 and not pump_on:
+            pump_until = now + action
+            runs += 1
+        elif action == 0:
+            pump_until = now
+    
+    return {
+        "policy": policy.name,
+        "water_seconds": round(pump_seconds, 1),
+        "runs": runs,
+        "hours_below_dry": round(dry_seconds / 3600, 2),
+        "lowest_soil": None if lowest is None else round(lowest, 1)
+    }
+
+
+def main(argv: Iterable[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a sensor log against the watering policies")
+    parser.add_argument("--csv", nargs="+", help="Log CSV files in time order (default: the configured backend)")
+    parser.add_argument("--zone", help="Zone whose log to read from the configured backend")
+    parser.add_argument("--gain", type=float, help="Soil units added per pump-second (default: estimated from the log)")
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    
+    if args.csv:
+        records = list(read_csv_log(args.csv))
+    else:
+        # Read-only: the service may be writing this log right now
+        backend = create_backend(zone=args.zone, read_only=True)
+        try:
+            records = [record for record, _ in backend.iter_from(None)]
+        finally:
+            backend.close()
+    
+    if len(records) < 2:
+        logger.error("Not enough records to replay")
+        return 1
+    
+    gain = args.gain or estimate_gain(records)
+    if not gain:
+        logger.error("Could not estimate pump gain from the log; pass --gain")
+        return 1
+    
+    results = [replay(records, policy, gain) for policy in (ThresholdPolicy(), WateringScheduler())]
+    print(json.dumps({"records": len(records), "gain": round(gain, 3), "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,367 @@
+import logging
+import queue
+import time
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from typing import Optional, Dict, List, Tuple
+from hardware.arduino_reader import ArduinoReader
+from hardware.pump_controller import PumpController
+from hardware.sample_buffer import FIELDS
+from services import metrics
+from services.data_logger import DataLogger
+from services.storage import create_backend
+from services.ticker import Ticker
+from services.watering import WateringScheduler, create_policy
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Logged readings waiting for the watering thread; older ones are dropped when full
+WATERING_QUEUE_SIZE = 100
+
+# Seconds between attempts to open a zone's storage after a failure
+STORAGE_RETRY_INTERVAL = 30.0
+
+LOOP_DRIFT_SECONDS = metrics.histogram(
+    "agri_logging_loop_drift_seconds", "How late each logging tick ran past its wall-clock slot",
+    ["zone"], buckets=metrics.DRIFT_BUCKETS
+)
+LOOP_WORK_SECONDS = metrics.histogram(
+    "agri_logging_loop_work_seconds", "Time spent aggregating and buffering the row per tick", ["zone"]
+)
+STORAGE_OPEN_SECONDS = metrics.histogram(
+    "agri_storage_open_seconds", "Time to open a zone's storage and restore its aggregates", ["zone"]
+)
+TICKS_MISSED = metrics.counter(
+    "agri_logging_ticks_missed_total", "Logging ticks skipped because a tick overran its interval", ["zone"]
+)
+
+class Zone:
+    """
+    One irrigated plot: the device it reads, an optional pump and its own
+    log. Each zone runs its own logging thread, so a slow zone never
+    delays the others.
+    
+    The log is opened on that thread (restoring aggregates and rollups
+    can take a while on a long history), so the API serves at once;
+    `logger` is None until `storage_ready` is set.
+    """
+    
+    def __init__(
+        self,
+        zone_id: str,
+        device_id: str,
+        reader: ArduinoReader,
+        pump: Optional[PumpController] = None
+    ):
+        self.id = zone_id
+        self.device_id = device_id
+        self.arduino = reader
+        self.pump = pump
+        self.watering = create_policy() if pump is not None else None
+        
+        # Storage, opened by the logging thread; `_open_lock` orders it against stop()
+        self.logger: Optional[DataLogger] = None
+        self.storage_state = "pending"  # pending, loading, ready or failed
+        self.storage_error: Optional[str] = None
+        self.storage_seconds: Optional[float] = None
+        self.storage_ready = Event()
+        self._open_lock = Lock()
+        
+        self.current_data: Dict = {
+            "temp": None,
+            "hum": None,
+            "soil": None,
+            "light": None,
+            "quality": 0,
+            "timestamp": None
+        }
+        
+        self.running = Event()
+        self.wake = Event()  # Set by stop() to cut the interval wait short
+        self.log_thread: Optional[Thread] = None
+        self.ticker: Optional[Ticker] = None
+        
+        # Auto-watering runs on its own thread, fed each logged row
+        self._watering_queue: "queue.Queue[Optional[Tuple[float, Dict]]]" = queue.Queue(WATERING_QUEUE_SIZE)
+        self.watering_thread: Optional[Thread] = None
+        
+        # What the stream publisher last sent: sample seq, pump state, row count
+        self._published = (None, None, None)
+    
+    @property
+    def pump_on(self) -> bool:
+        return self.pump is not None and self.pump.is_on
+    
+    def start(self):
+        """Start the logging thread, which opens storage and then starts auto-watering"""
+        self.running.set()
+        self.log_thread = Thread(
+            target=self._run, name=f"zone-{self.id}", daemon=True
+        )
+        self.log_thread.start()
+    
+    def _run(self):
+        """Open storage (retrying on failure), then log until stopped"""
+        while not self._open_storage():
+            if self.wake.wait(STORAGE_RETRY_INTERVAL) or not self.running.is_set():
+                return
+        
+        with self._open_lock:
+            if not self.running.is_set():
+                return
+            if settings.AUTO_WATER_ENABLED and self.watering is not None:
+                self.watering_thread = Thread(
+                    target=self._watering_loop, name=f"zone-{self.id}-watering", daemon=True
+                )
+                self.watering_thread.start()
+        
+        self._logging_loop()
+    
+    def _open_storage(self) -> bool:
+        """
+        Open the zone's log, restoring aggregates, rollups and journaled
+        rows, and attach the pump to its journal
+        
+        Returns:
+            False if opening failed
+        """
+        self.storage_state = "loading"
+        started = time.monotonic()
+        try:
+            data_logger = DataLogger(create_backend(zone=self.id), zone=self.id)
+        except Exception as e:
+            self.storage_state = "failed"
+            self.storage_error = str(e)
+            logger.error(f"Failed to open storage for zone {self.id}: {e}")
+            return False
+        
+        with self._open_lock:
+            if not self.running.is_set():
+                data_logger.close()  # Stopped while loading
+                return True
+            self.logger = data_logger
+        
+        # Journal pump commands next to the rows, and finish what a crash interrupted
+        if self.pump is not None and data_logger.journal is not None:
+            self.pump.attach_journal(data_logger.journal)
+        
+        self.storage_seconds = time.monotonic() - started
+        STORAGE_OPEN_SECONDS.labels(self.id).observe(self.storage_seconds)
+        self.storage_state = "ready"
+        self.storage_error = None
+        self.storage_ready.set()
+        logger.info(f"Zone {self.id} storage ready in {self.storage_seconds:.2f}s")
+        return True
+    
+    def _logging_loop(self):
+        """
+        Log one aggregate of the samples read per interval, on ticks at
+        wall-clock multiples of LOG_INTERVAL. Rows are stamped with their
+        tick, so they stay evenly spaced; storage writes and watering
+        decisions happen on other threads, so I/O stalls never shift ticks.
+        """
+        seq = self.arduino.buffer.seq
+        self.ticker = Ticker(settings.LOG_INTERVAL)
+        
+        drift = LOOP_DRIFT_SECONDS.labels(self.id)
+        work = LOOP_WORK_SECONDS.labels(self.id)
+        missed = TICKS_MISSED.labels(self.id)
+        
+        while self.running.is_set():
+            tick = self.ticker.wait(self.wake)
+            if not self.running.is_set():
+                break
+            if tick is None:
+                continue
+            
+            due_at, lateness, skipped = tick
+            started = time.monotonic()
+            drift.observe(lateness)
+            if skipped:
+                missed.inc(skipped)
+                logger.warning(f"Zone {self.id} skipped {skipped} logging tick(s)")
+            
+            # Every sample captured by the serial reader since the last row
+            summary, seq = self.arduino.buffer.aggregate(seq)
+            
+            if summary:
+                data = self._interval_means(summary)
+                
+                # Buffer the row; the logger's flush thread writes it
+                timestamp = datetime.fromtimestamp(round(due_at)).strftime("%Y-%m-%d %H:%M:%S")
+                self.logger.log_data(data, self.pump_on, timestamp, summary["quality"])
+                
+                # Hand the reading to the watering thread, without means of flagged samples only
+                if self.watering_thread is not None:
+                    trusted = {
+                        key: value for key, value in data.items()
+                        if value is not None and summary[key]["clean"]
+                    }
+                    self._queue_watering((due_at, trusted))
+            
+            work.observe(time.monotonic() - started)
+    
+    def _queue_watering(self, item: Optional[Tuple[float, Dict]]):
+        """Queue a (time, reading) for the watering policy, dropping the oldest if it has fallen behind"""
+        while True:
+            try:
+                self._watering_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._watering_queue.get_nowait()
+                    logger.warning(f"Watering for zone {self.id} is behind, dropped a reading")
+                except queue.Empty:
+                    pass
+    
+    def _watering_loop(self):
+        """Feed logged readings to the watering policy, off the logging thread"""
+        self._seed_watering()
+        
+        while True:
+            item = self._watering_queue.get()
+            if item is None:
+                break
+            
+            ts, data = item
+            try:
+                self._check_auto_water(ts, data)
+            except Exception as e:
+                logger.error(f"Auto-watering failed for zone {self.id}: {e}")
+    
+    def _interval_means(self, summary: Dict) -> Dict:
+        """Per-interval means in sensor units (soil and light as integers), flagged samples excluded"""
+        data = {}
+        for key in FIELDS:
+            stat = summary[key]
+            if stat is None:
+                data[key] = None
+            elif key in ("soil", "light"):
+                data[key] = round(stat["mean"])
+            else:
+                data[key] = round(stat["mean"], 2)
+        return data
+    
+    def _seed_watering(self):
+        """Start the drying-rate model from recent stored history"""
+        if not isinstance(self.watering, WateringScheduler):
+            return
+        
+        start = datetime.now() - timedelta(days=settings.WATER_RATE_HISTORY_DAYS)
+        try:
+            result = self.logger.analytics.drying_rate(start.strftime("%Y-%m-%d %H:%M:%S"))
+            self.watering.model.seed(result["rate_per_hour"])
+        except Exception as e:
+            logger.error(f"Failed to seed drying rate for zone {self.id}: {e}")
+    
+    def _check_auto_water(self, ts: float, data: Dict):
+        """Let the watering policy start or stop the pump"""
+        soil = data.get("soil")
+        
+        if soil is None or self.watering is None:
+            return
+        
+        action = self.watering.update(ts, soil, self.pump.is_on)
+        if action is None:
+            return
+        
+        if action > 0 and not self.pump.is_on:
+            logger.info(f"Auto-watering zone {self.id} for {action:.0f}s (soil: {soil})")
+            self.pump.turn_on_for_duration(action)
+        elif action == 0 and self.pump.is_on:
+            logger.info(f"Auto-watering zone {self.id} reached target, stopping (soil: {soil})")
+            self.pump.turn_off()
+    
+    def get_current_data(self) -> Dict:
+        """Get latest sensor readings from the reader cache (never blocks on serial)"""
+        latest = self.arduino.get_latest()
+        if latest:
+            self.current_data = latest
+        
+        return self.current_data
+    
+    def get_live_samples(self, since: int = 0, limit: int = 1000) -> Dict:
+        """
+        Raw samples from the reader's ring buffer
+        
+        Args:
+            since: First sequence number wanted
+            limit: Maximum number of samples
+        
+        Returns:
+            Dict with the samples and the sequence number to poll from next
+        """
+        samples, next_seq = self.arduino.buffer.since(since, limit)
+        return {"next_seq": next_seq, "samples": samples}
+    
+    def poll_events(self) -> List[Tuple[str, Dict]]:
+        """
+        Changes since the previous call, as (event, data) pairs for the
+        stream: "sample", "pump", and "record" plus "stats" per logged row
+        """
+        seq = self.arduino.buffer.seq
+        pump_on = self.pump_on
+        rows = self.logger.stats.rows if self.logger else None
+        last_seq, last_pump, last_rows = self._published
+        self._published = (seq, pump_on, rows)
+        
+        events = []
+        if seq != last_seq:
+            events.append(("sample", self.get_current_data()))
+        if pump_on != last_pump:
+            events.append(("pump", {"is_on": pump_on}))
+        if rows != last_rows and self.logger and self.logger.last_record:
+            events.append(("record", self.logger.last_record))
+            events.append(("stats", self.logger.get_summary_stats()))
+        return events
+    
+    def get_readiness(self) -> Dict:
+        """Storage and pump readiness, for /api/status"""
+        pump = None
+        if self.pump is not None:
+            pump = {"ready": self.pump.ready, "error": self.pump.error}
+        return {
+            "storage": {
+                "state": self.storage_state,
+                "ready": self.storage_ready.is_set(),
+                "error": self.storage_error,
+                "load_seconds": None if self.storage_seconds is None else round(self.storage_seconds, 3),
+                "journal": self.logger.journal.get_status() if self.logger and self.logger.journal else None
+            },
+            "pump": pump
+        }
+    
+    def get_info(self) -> Dict:
+        """Zone wiring and latest readings"""
+        return {
+            "id": self.id,
+            "device": self.device_id,
+            "serial_port": self.arduino.port,
+            "protocol": self.arduino.parser.mode,
+            "pump_pin": self.pump.pin if self.pump else None,
+            "pump_on": self.pump_on,
+            "sensors": self.get_current_data()
+        }
+    
+    def stop(self):
+        """Stop logging, switch the pump off and flush the log"""
+        self.running.clear()
+        self.wake.set()
+        
+        if self.log_thread:
+            self.log_thread.join(timeout=2)
+        
+        with self._open_lock:
+            watering_thread = self.watering_thread
+        if watering_thread:
+            self._queue_watering(None)  # Stop after the queued readings
+            watering_thread.join(timeout=2)
+        
+        if self.pump:
+            self.pump.cleanup()
+        
+        # Flush buffered rows to storage (a zone still loading closes its own)
+        with self._open_lock:
+            if self.logger:
+                self.logger.close()
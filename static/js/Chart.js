@@ -5,10 +5,15 @@ let soilChart = null;
 
 // Load historical data and render charts
 async function loadHistory() {
-    const limit = document.getElementById('data-range').value;
+    const range = document.getElementById('data-range').value;
+    
+    if (range.startsWith('days:')) {
+        return loadHistoryRange(parseInt(range.slice(5)));
+    }
     
     try {
-        const response = await fetch(`/api/history?limit=${limit}`);
+        // Columnar layout: one typed array per field
+        const response = await fetch(withZone(`/api/history?limit=${range}&format=columnar`));
         
         if (!response.ok) {
             throw new Error('Failed to fetch history');
@@ -16,17 +21,17 @@ async function loadHistory() {
         
         const data = await response.json();
         
-        if (data.length === 0) {
+        if (!data.timestamp) {
             console.log('No historical data available');
             return;
         }
         
         // Extract data for charts
-        const labels = data.map(d => formatTimestamp(d.timestamp));
-        const temperatures = data.map(d => parseFloat(d.temp) || 0);
-        const humidity = data.map(d => parseFloat(d.humidity) || 0);
-        const soilMoisture = data.map(d => parseInt(d.soil_moisture) || 0);
-        const lightLevels = data.map(d => parseInt(d.light_level) || 0);
+        const labels = data.timestamp.map(formatTimestamp);
+        const temperatures = data.temp.map(v => v ?? 0);
+        const humidity = data.humidity.map(v => v ?? 0);
+        const soilMoisture = data.soil_moisture.map(v => v ?? 0);
+        const lightLevels = data.light_level.map(v => v ?? 0);
         
         // Render charts
         renderTemperatureChart(labels, temperatures, humidity);
@@ -37,6 +42,49 @@ async function loadHistory() {
     }
 }
 
+// Load a time range as server-side rollup buckets
+async function loadHistoryRange(days) {
+    const to = new Date();
+    const from = new Date(to.getTime() - days * 24 * 60 * 60 * 1000);
+    
+    try {
+        const response = await fetch(
+            withZone(`/api/history?from=${toLocalTimestamp(from)}&to=${toLocalTimestamp(to)}&points=500`)
+        );
+        
+        if (!response.ok) {
+            throw new Error('Failed to fetch history');
+        }
+        
+        const result = await response.json();
+        const points = result.points;
+        
+        if (points.length === 0) {
+            console.log('No historical data available');
+            return;
+        }
+        
+        const labels = points.map(p => formatTimestamp(p.timestamp));
+        const temperatures = points.map(p => p.temp_mean ?? 0);
+        const humidity = points.map(p => p.humidity_mean ?? 0);
+        const soilMoisture = points.map(p => p.soil_moisture_mean ?? 0);
+        const lightLevels = points.map(p => p.light_level_mean ?? 0);
+        
+        renderTemperatureChart(labels, temperatures, humidity);
+        renderSoilChart(labels, soilMoisture, lightLevels);
+        
+    } catch (error) {
+        console.error('Error loading history range:', error);
+    }
+}
+
+// Local wall-clock timestamp matching the log format
+function toLocalTimestamp(date) {
+    const pad = n => String(n).padStart(2, '0');
+    return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}` +
+        `T${pad(date.getHours())}:${pad(date.getMinutes())}:${pad(date.getSeconds())}`;
+}
+
 // Format timestamp for chart labels
 function formatTimestamp(timestamp) {
     const date = new Date(timestamp);
@@ -236,7 +284,38 @@ function renderSoilChart(labels, soilMoisture, lightLevels) {
     document.getElementById('soilChart').parentElement.style.height = '400px';
 }
 
-// Auto-refresh charts every 5 minutes
+// Append a record pushed by /api/stream instead of reloading history
+function appendHistoryRecord(record) {
+    const range = document.getElementById('data-range').value;
+    
+    // Rollup ranges are bucketed server-side; they refresh on the timer below
+    if (range.startsWith('days:') || !tempChart || !soilChart) {
+        return;
+    }
+    
+    const label = formatTimestamp(record.timestamp);
+    const limit = parseInt(range);
+    appendChartPoint(tempChart, label, [record.temp ?? 0, record.humidity ?? 0], limit);
+    appendChartPoint(soilChart, label, [record.soil_moisture ?? 0, record.light_level ?? 0], limit);
+}
+
+// Add one point per dataset, dropping the oldest beyond `limit`
+function appendChartPoint(chart, label, values, limit) {
+    chart.data.labels.push(label);
+    chart.data.datasets.forEach((dataset, i) => dataset.data.push(values[i]));
+    
+    while (chart.data.labels.length > limit) {
+        chart.data.labels.shift();
+        chart.data.datasets.forEach(dataset => dataset.data.shift());
+    }
+    
+    chart.update('none');
+}
+
+// Refresh rollup ranges (and everything, without stream support) every 5 minutes
 setInterval(() => {
-    loadHistory();
+    const range = document.getElementById('data-range').value;
+    if (!window.EventSource || range.startsWith('days:')) {
+        loadHistory();
+    }
 }, 300000);
\ No newline at end of file
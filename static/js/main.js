@@ -1,27 +1,105 @@
 // Main JavaScript for dashboard functionality
 
 let updateInterval;
-const UPDATE_RATE = 120000; // 2 minutes
+const UPDATE_RATE = 120000; // 2 minutes, only without stream support
+let eventSource = null;
+let currentZone = null; // null = server's default zone
 
 // Initialize dashboard
 document.addEventListener('DOMContentLoaded', () => {
     console.log('Dashboard initialized');
     updateConnectionStatus(false);
+    loadZones();
     startDataUpdates();
     loadStatistics();
     loadHistory();
 });
 
-// Start periodic data updates
+// Append the selected zone to an API URL
+function withZone(url) {
+    if (!currentZone) {
+        return url;
+    }
+    const sep = url.includes('?') ? '&' : '?';
+    return `${url}${sep}zone=${encodeURIComponent(currentZone)}`;
+}
+
+// Fill the zone picker; it stays hidden for single-zone setups
+async function loadZones() {
+    try {
+        const response = await fetch('/api/zones');
+        const result = await response.json();
+        const select = document.getElementById('zone-select');
+        
+        if (result.zones.length < 2) {
+            return;
+        }
+        
+        select.innerHTML = result.zones
+            .map(z => `<option value="${z.id}">${z.id}</option>`)
+            .join('');
+        select.hidden = false;
+        currentZone = result.zones[0].id;
+        
+    } catch (error) {
+        console.error('Error loading zones:', error);
+    }
+}
+
+// Switch every panel to another zone
+function changeZone() {
+    currentZone = document.getElementById('zone-select').value;
+    updateData();
+    loadStatistics();
+    loadHistory();
+    openStream();
+}
+
+// Start live updates: pushed over /api/stream, or polled as a fallback
 function startDataUpdates() {
     updateData(); // Initial update
-    updateInterval = setInterval(updateData, UPDATE_RATE);
+    
+    if (window.EventSource) {
+        openStream();
+    } else {
+        updateInterval = setInterval(updateData, UPDATE_RATE);
+    }
+}
+
+// Subscribe to server-pushed samples, pump changes, records and stats
+function openStream() {
+    if (!window.EventSource) {
+        return;
+    }
+    if (eventSource) {
+        eventSource.close();
+    }
+    
+    eventSource = new EventSource(withZone('/api/stream'));
+    eventSource.onopen = () => updateConnectionStatus(true);
+    eventSource.onerror = () => updateConnectionStatus(false);  // Browser retries
+    
+    eventSource.addEventListener('sample', event => {
+        showSensorData(JSON.parse(event.data));
+    });
+    eventSource.addEventListener('pump', event => {
+        showPumpState(JSON.parse(event.data).is_on);
+    });
+    eventSource.addEventListener('record', event => {
+        appendHistoryRecord(JSON.parse(event.data));
+    });
+    eventSource.addEventListener('stats', event => {
+        const stats = JSON.parse(event.data);
+        if (stats.total_records) {
+            displayStatistics(stats);
+        }
+    });
 }
 
 // Fetch and update current sensor data
 async function updateData() {
     try {
-        const response = await fetch('/api/data');
+        const response = await fetch(withZone('/api/data'));
         
         if (!response.ok) {
             throw new Error('Failed to fetch data');
@@ -30,10 +108,7 @@ async function updateData() {
         const data = await response.json();
         
         // Update sensor displays
-        updateSensorDisplay('temp', data.temp, '°C');
-        updateSensorDisplay('hum', data.hum, '%');
-        updateSensorDisplay('soil', data.soil, '');
-        updateSensorDisplay('light', data.light, '');
+        showSensorData(data);
         
         // Update pump status
         await updatePumpStatus();
@@ -47,6 +122,14 @@ async function updateData() {
     }
 }
 
+// Update all sensor displays
+function showSensorData(data) {
+    updateSensorDisplay('temp', data.temp, '°C');
+    updateSensorDisplay('hum', data.hum, '%');
+    updateSensorDisplay('soil', data.soil, '');
+    updateSensorDisplay('light', data.light, '');
+}
+
 // Update individual sensor display
 function updateSensorDisplay(sensor, value, unit) {
     const element = document.getElementById(`${sensor}-value`);
@@ -60,34 +143,39 @@ function updateSensorDisplay(sensor, value, unit) {
 // Update pump status indicator
 async function updatePumpStatus() {
     try {
-        const response = await fetch('/api/pump/status');
+        const response = await fetch(withZone('/api/pump/status'));
         const data = await response.json();
         
-        const indicator = document.getElementById('pump-indicator');
-        const statusText = document.getElementById('pump-status-text');
-        
-        if (data.is_on) {
-            indicator.classList.add('on');
-            statusText.textContent = 'ON';
-            statusText.style.color = '#10b981';
-        } else {
-            indicator.classList.remove('on');
-            statusText.textContent = 'OFF';
-            statusText.style.color = '#6b7280';
-        }
+        showPumpState(data.is_on);
         
     } catch (error) {
         console.error('Error updating pump status:', error);
     }
 }
 
+// Show pump on/off state
+function showPumpState(isOn) {
+    const indicator = document.getElementById('pump-indicator');
+    const statusText = document.getElementById('pump-status-text');
+    
+    if (isOn) {
+        indicator.classList.add('on');
+        statusText.textContent = 'ON';
+        statusText.style.color = '#10b981';
+    } else {
+        indicator.classList.remove('on');
+        statusText.textContent = 'OFF';
+        statusText.style.color = '#6b7280';
+    }
+}
+
 // Control pump
 async function pumpControl(action, duration = null) {
     try {
         const endpoint = action === 'on' ? '/api/pump/on' : '/api/pump/off';
         const body = duration ? { duration: duration } : {};
         
-        const response = await fetch(endpoint, {
+        const response = await fetch(withZone(endpoint), {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -117,7 +205,7 @@ async function pumpControl(action, duration = null) {
 // Load and display statistics
 async function loadStatistics() {
     try {
-        const response = await fetch('/api/stats');
+        const response = await fetch(withZone('/api/stats'));
         const result = await response.json();
         
         if (result.success && result.data) {
@@ -132,6 +220,7 @@ async function loadStatistics() {
 // Display statistics
 function displayStatistics(stats) {
     const statsContent = document.getElementById('stats-content');
+    const metrics = stats.metrics || {};
     
     statsContent.innerHTML = `
         <div class="stat-item">
@@ -154,6 +243,18 @@ function displayStatistics(stats) {
             <div class="stat-label">Max Temp</div>
             <div class="stat-value">${(stats.max_temperature || 0).toFixed(1)}°C</div>
         </div>
+        <div class="stat-item">
+            <div class="stat-label">Avg Humidity</div>
+            <div class="stat-value">${(metrics.humidity?.mean || 0).toFixed(1)}%</div>
+        </div>
+        <div class="stat-item">
+            <div class="stat-label">Avg Light Level</div>
+            <div class="stat-value">${(metrics.light_level?.mean || 0).toFixed(0)}</div>
+        </div>
+        <div class="stat-item">
+            <div class="stat-label">Pump Duty Cycle</div>
+            <div class="stat-value">${((stats.pump_duty_cycle || 0) * 100).toFixed(1)}%</div>
+        </div>
     `;
 }
 
@@ -185,4 +286,7 @@ window.addEventListener('beforeunload', () => {
     if (updateInterval) {
         clearInterval(updateInterval);
     }
+    if (eventSource) {
+        eventSource.close();
+    }
 });
\ No newline at end of file